@@ -0,0 +1,76 @@
+"""Standalone benchmarks, run from the project root as ``python -m benchmarks.<name>``.
+
+Every benchmark works on a throwaway test database created from the current
+settings, so ``db.sqlite3`` is never touched.
+"""
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+
+import django
+
+
+@contextlib.contextmanager
+def test_database(on_disk=False):
+    """Run the body against a fresh test database.
+
+    SQLite test databases live in memory with a shared cache, where writers
+    fail immediately instead of waiting for each other; pass ``on_disk=True``
+    for benchmarks that measure concurrent writes.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+    django.setup()
+    from django.conf import settings
+    from django.test.utils import (
+        setup_databases,
+        setup_test_environment,
+        teardown_databases,
+        teardown_test_environment,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if on_disk:
+            for alias, database in settings.DATABASES.items():
+                if database["ENGINE"].endswith("sqlite3"):
+                    database.setdefault("TEST", {})["NAME"] = os.path.join(
+                        tmp, f"{alias}.sqlite3"
+                    )
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            yield
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+
+def measure(fn, repeat):
+    """Call ``fn`` ``repeat`` times and return the wall time of each call in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+    }
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in (headers, *rows):
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,96 @@
+"""Batched GraphQL operations against one HTTP request per operation.
+
+A storefront page needs several operations: the category menu, a product
+grid, ``--rows`` category rows and the latest orders, with the menu requested a
+second time by another widget. The page is loaded ``--pages`` times through
+the Django test client (so every request runs the full middleware stack),
+once as one POST per operation and once as a single batched POST,
+with the response cache disabled. Reports time per page and SQL queries
+per page.
+
+    python -m benchmarks.batching [--pages 200] [--rows 2]
+"""
+import argparse
+import json
+
+from . import measure, print_table, summarize, test_database
+from .dashboards import Counter
+from .load_async import seed
+
+MENU = "{ categories(first: 20) { edges { node { id name } } } }"
+GRID = "{ products(first: 20) { edges { node { name price category { name } } } } }"
+ROW = "query Row($category: ID) { products(first: 8, categoryId: $category) { edges { node { name price } } } }"
+ORDERS = (
+    "{ orders(first: 10) { edges { node { orderNumber status "
+    "orderitemSet { quantity product { name category { name } } } } } } }"
+)
+
+
+def page(categories):
+    """The operations of one page: one product row per category of ``categories``."""
+    rows = [{"query": ROW, "variables": {"category": str(pk)}} for pk in categories]
+    return [{"query": MENU}, {"query": GRID}, *rows, {"query": ORDERS}, {"query": MENU}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=2, help="category rows per page")
+    args = parser.parse_args()
+
+    with test_database():
+        from django.conf import settings
+        from django.test import Client
+
+        from products.models import Category
+
+        settings.GRAPHQL_RESPONSE_CACHE_ALIAS = None
+        seed()
+        operations = page(Category.objects.values_list("pk", flat=True)[: args.rows])
+        settings.GRAPHQL_BATCH_MAX_OPERATIONS = max(
+            settings.GRAPHQL_BATCH_MAX_OPERATIONS, len(operations)
+        )
+        client = Client()
+        counter = Counter()
+        counter.install()
+
+        def post(body):
+            response = client.post("/graphql/", body, content_type="application/json")
+            assert response.status_code == 200, response.content
+            return response.json()
+
+        def separate():
+            return [post(json.dumps(operation)) for operation in operations]
+
+        batch = json.dumps(operations)
+
+        def batched():
+            return post(batch)
+
+        assert [result["data"] for result in batched()] == [
+            result["data"] for result in separate()
+        ]
+        results = []
+        for name, load in (("separate requests", separate), ("one batch", batched)):
+            before = counter.queries
+            timings = measure(load, args.pages)
+            results.append((name, (counter.queries - before) / args.pages, summarize(timings)))
+
+    print_table(
+        ["mode", "requests/page", "SQL/page", "mean ms", "p50 ms", "p95 ms"],
+        [
+            [
+                name,
+                len(operations) if name == "separate requests" else 1,
+                f"{queries:.0f}",
+                f"{stats['mean_ms']:.2f}",
+                f"{stats['p50_ms']:.2f}",
+                f"{stats['p95_ms']:.2f}",
+            ]
+            for name, queries, stats in results
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
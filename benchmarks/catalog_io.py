@@ -0,0 +1,99 @@
+"""Catalog import and export throughput and memory for a large supplier feed.
+
+Writes ``--rows`` products as JSON Lines, then loads them one ``CreateProduct``
+at a time (a sample of ``--sample`` rows, the old path) and with the chunked
+upsert of ``products.catalog``, re-imports the same file as an update, and
+finally exports the table. Peak RSS is reported after each step.
+
+    python -m benchmarks.catalog_io [--rows 200000] [--chunk-size 1000]
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+from . import print_table, test_database
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_feed(path, rows, categories):
+    with open(path, "w") as f:
+        for i in range(rows):
+            f.write(
+                json.dumps(
+                    {
+                        "sku": f"SKU-{i:07d}",
+                        "name": f"Product {i}",
+                        "description": "Supplier description",
+                        "price": f"{(i % 5000) / 100 + 1:.2f}",
+                        "quantity": i % 100,
+                        "category": f"Category {i % categories}",
+                    }
+                )
+                + "\n"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--categories", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True), tempfile.TemporaryDirectory() as tmp:
+        from django.db import transaction
+
+        from products import catalog
+        from products.models import Category, Product
+        from products.schema import CreateProduct
+
+        feed = os.path.join(tmp, "feed.jsonl")
+        write_feed(feed, args.rows, args.categories)
+        rows = []
+
+        with open(feed) as f:
+            sample = [json.loads(next(f)) for _ in range(min(args.sample, args.rows))]
+        start = time.perf_counter()
+        with transaction.atomic():
+            for row in sample:
+                category, _ = Category.objects.get_or_create(name=row["category"])
+                CreateProduct.mutate(
+                    None, None,
+                    name=row["name"],
+                    description=row["description"],
+                    price=row["price"],
+                    quantity=row["quantity"],
+                    category_id=category.pk,
+                )
+        elapsed = time.perf_counter() - start
+        rows.append(["CreateProduct per row", len(sample), f"{len(sample) / elapsed:.0f}", f"{peak_rss_mb():.0f}"])
+        Product.objects.all().delete()
+        Category.objects.all().delete()
+
+        for label in ("bulk upsert (insert)", "bulk upsert (update)"):
+            start = time.perf_counter()
+            with open(feed) as f:
+                result = catalog.import_products(
+                    catalog.read_rows(f, "jsonl"), chunk_size=args.chunk_size, atomic=False,
+                )
+            elapsed = time.perf_counter() - start
+            rows.append([label, result.products, f"{result.products / elapsed:.0f}", f"{peak_rss_mb():.0f}"])
+
+        start = time.perf_counter()
+        with open(os.path.join(tmp, "export.csv"), "w", newline="") as f:
+            count = catalog.write_rows(f, catalog.export_rows(args.chunk_size), "csv")
+        elapsed = time.perf_counter() - start
+        rows.append(["export", count, f"{count / elapsed:.0f}", f"{peak_rss_mb():.0f}"])
+
+    print_table(["step", "rows", "rows/s", "peak RSS MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
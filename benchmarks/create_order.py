@@ -0,0 +1,85 @@
+"""CreateOrder latency for 1, 10 and 100-line orders.
+
+Compares the original per-line path (one ``Product.objects.get`` and one
+``OrderItem.save()`` per line, no transaction) with the current atomic
+``in_bulk`` / ``bulk_create`` implementation of ``CreateOrder.mutate``.
+
+    python -m benchmarks.create_order [--repeat 50]
+"""
+import argparse
+
+from . import measure, print_table, summarize, test_database
+
+CUSTOMER = dict(
+    name="Ivan",
+    surname="Ivanov",
+    phone_number="+70000000000",
+    address="Moscow",
+    email="ivan@example.com",
+)
+
+
+def per_line_create_order(product_ids, quantities):
+    from products.models import Order, OrderItem, Product
+
+    order = Order(**CUSTOMER)
+    order.save()
+    for product_id, quantity in zip(product_ids, quantities):
+        product = Product.objects.get(pk=product_id)
+        OrderItem(order=order, product=product, quantity=quantity).save()
+    return order
+
+
+def bulk_create_order(product_ids, quantities):
+    from products.schema import CreateOrder
+
+    return CreateOrder.mutate(
+        None, None, product_ids=product_ids, quantities=quantities, **CUSTOMER
+    ).order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        from products.models import Category, Product
+
+        category = Category.objects.create(name="Benchmark")
+        Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price="1.00",
+                quantity=1000,
+                category=category,
+            )
+            for i in range(100)
+        )
+        ids = [str(pk) for pk in Product.objects.values_list("pk", flat=True)]
+
+        rows = []
+        for lines in (1, 10, 100):
+            product_ids, quantities = ids[:lines], [1] * lines
+            for label, create in (
+                ("per-line", per_line_create_order),
+                ("bulk", bulk_create_order),
+            ):
+                stats = summarize(
+                    measure(lambda: create(product_ids, quantities), args.repeat)
+                )
+                rows.append(
+                    (
+                        lines,
+                        label,
+                        f"{stats['mean_ms']:.2f}",
+                        f"{stats['p50_ms']:.2f}",
+                        f"{stats['p95_ms']:.2f}",
+                    )
+                )
+        print_table(("lines", "path", "mean ms", "p50 ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
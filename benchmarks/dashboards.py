@@ -0,0 +1,185 @@
+"""Database load of order dashboards: polling ``orders`` against subscriptions.
+
+Polling: every dashboard re-reads the latest orders every ``--interval``
+seconds. A sample of polls is sent through the Django test client to
+measure the SQL queries and time per poll, which are scaled to
+``--dashboards`` dashboards per minute.
+
+Subscriptions: ``--dashboards`` in-process WebSocket clients subscribe to
+``orderCreated`` and ``orderStatusChanged`` on the ASGI application of
+``server/asgi.py``, then ``--events`` order status changes are made and
+every dashboard waits for each one. Reads made to deliver the events are
+scaled to ``--events-per-minute``. Writes are the same in both modes and
+are reported separately.
+
+    python -m benchmarks.dashboards [--dashboards 1000] [--interval 5] [--events-per-minute 60]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from . import print_table, summarize, test_database
+from .load_async import seed
+
+FIELDS = "orderNumber status createdAt orderitemSet { quantity product { name } }"
+POLL = "{ orders(first: 20) { edges { node { %s } } } }" % FIELDS
+SUBSCRIPTIONS = {
+    "created": "subscription { orderCreated { %s } }" % FIELDS,
+    "status": "subscription { orderStatusChanged { %s } }" % FIELDS,
+}
+
+
+class Counter:
+    """Counts the SQL statements of every connection opened after it is installed."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+        connection_created.connect(self.connected, weak=False)
+
+    def connected(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Dashboard:
+    def __init__(self, app):
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        scope = {"type": "websocket", "path": "/graphql/", "subprotocols": ["graphql-transport-ws"]}
+        self.task = asyncio.ensure_future(app(scope, self.inbox.get, self.outbox.put))
+
+    async def send(self, message):
+        await self.inbox.put({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive(self):
+        return json.loads((await self.outbox.get())["text"])
+
+    async def open(self):
+        await self.inbox.put({"type": "websocket.connect"})
+        await self.outbox.get()
+        await self.send({"type": "connection_init"})
+        await self.receive()
+        for id, query in SUBSCRIPTIONS.items():
+            await self.send({"type": "subscribe", "id": id, "payload": {"query": query}})
+
+    async def close(self):
+        await self.inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+def poll(counter, samples):
+    from django.test import Client
+
+    client = Client()
+    body = json.dumps({"query": POLL})
+    client.post("/graphql/", body, content_type="application/json")  # warm up
+    before = counter.queries
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        client.post("/graphql/", body, content_type="application/json")
+        timings.append(time.perf_counter() - start)
+    return (counter.queries - before) / samples, timings
+
+
+async def subscribe(counter, dashboards, events):
+    from asgiref.sync import sync_to_async
+    from django.db import transaction
+
+    from products import events as channels
+    from products import workflow
+    from products.models import Order
+    from products.pubsub import get_broker
+    from server.asgi import websocket_application
+
+    clients = [Dashboard(websocket_application) for _ in range(dashboards)]
+    for client in clients:
+        await client.open()
+    while get_broker().subscriber_count(channels.ORDER_STATUS) < dashboards:
+        await asyncio.sleep(0.01)
+
+    def change_status(pk):
+        with transaction.atomic():
+            workflow.change_status([Order.objects.get(pk=pk)], "accepted")
+
+    pending = await sync_to_async(list)(
+        Order.objects.filter(status="pending").values_list("pk", flat=True)[:events]
+    )
+    writes = reads = 0
+    latencies = []
+    for pk in pending:
+        before = counter.queries
+        start = time.perf_counter()
+        await sync_to_async(change_status)(pk)
+        written = counter.queries
+        await asyncio.gather(*(client.receive() for client in clients))
+        latencies.append(time.perf_counter() - start)
+        writes += written - before
+        reads += counter.queries - written
+    for client in clients:
+        await client.close()
+    return writes / len(pending), reads / len(pending), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dashboards", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=5, help="seconds between polls")
+    parser.add_argument("--events-per-minute", type=float, default=60)
+    parser.add_argument("--events", type=int, default=50, help="status changes to deliver")
+    parser.add_argument("--polls", type=int, default=200, help="polls to sample")
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        seed(orders=max(200, args.events))
+        counter = Counter()
+        counter.install()
+
+        per_poll, poll_timings = poll(counter, args.polls)
+        polls_per_minute = args.dashboards * 60 / args.interval
+        write_queries, read_queries, latencies = asyncio.run(
+            subscribe(counter, args.dashboards, args.events)
+        )
+
+    poll_stats = summarize(poll_timings)
+    delivery = summarize(latencies)
+    print_table(
+        ["mode", "dashboards", "reads/event or poll", "read queries/min", "server s/min", "latency p50 ms"],
+        [
+            [
+                f"polling every {args.interval:g} s",
+                args.dashboards,
+                f"{per_poll:.1f}",
+                f"{per_poll * polls_per_minute:,.0f}",
+                f"{sum(poll_timings) / len(poll_timings) * polls_per_minute:.1f}",
+                f"{poll_stats['p50_ms']:.1f}",
+            ],
+            [
+                f"subscriptions, {args.events_per_minute:g} events/min",
+                args.dashboards,
+                f"{read_queries:.1f}",
+                f"{read_queries * args.events_per_minute:,.0f}",
+                f"{sum(latencies) / len(latencies) * args.events_per_minute:.1f}",
+                f"{delivery['p50_ms']:.1f}",
+            ],
+        ],
+    )
+    print(
+        f"\nEach status change also writes {write_queries:.1f} queries in both modes; "
+        "subscription latency is from the write until every dashboard has the event."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Throughput and tail latency of the WSGI and ASGI servers under many concurrent clients.
+
+Starts gunicorn with sync workers, with threaded workers and with uvicorn
+workers running ``AsyncGraphQLView`` on a seeded copy of the catalog, then
+keeps ``--concurrency`` clients sending a mix of catalog and order queries
+for ``--duration`` seconds against each.
+
+    python -m benchmarks.load_async [--concurrency 200] [--duration 10] [--workers 1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from . import print_table, summarize, test_database
+
+QUERIES = [
+    "{ products(first: 20) { edges { node { name price category { name } } } } }",
+    "{ categories(first: 10) { edges { node { name productSet { name } } } } }",
+    "{ orders(first: 10) { edges { node { orderNumber status products { name } } } } }",
+]
+
+SERVERS = {
+    "wsgi sync": ["server.wsgi", "-k", "sync"],
+    "wsgi gthread": ["server.wsgi", "-k", "gthread", "--threads", "8"],
+    "asgi uvicorn": ["server.asgi:application", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+
+def seed(categories=20, products_per_category=50, orders=200):
+    from products.models import Category, Order, OrderItem, Product
+
+    category_rows = Category.objects.bulk_create(
+        Category(name=f"Category {i}") for i in range(categories)
+    )
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Product {c.pk}-{i}",
+            description="",
+            price="9.99",
+            quantity=1000,
+            category=c,
+        )
+        for c in category_rows
+        for i in range(products_per_category)
+    )
+    for i in range(orders):
+        order = Order.objects.create(
+            name="Ivan",
+            surname="Ivanov",
+            phone_number="+70000000000",
+            address="Moscow",
+            email="ivan@example.com",
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=products[(i + j) % len(products)], quantity=1).priced()
+            for j in range(3)
+        )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workers, database):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE="benchmarks.load_settings",
+        BENCHMARK_DATABASE=database,
+        GRAPHQL_ASYNC="1" if "uvicorn" in " ".join(args) else "0",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", *args, "-w", str(workers)]
+        + ["-b", f"127.0.0.1:{port}", "--backlog", "4096", "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server did not start: " + " ".join(args))
+
+
+async def request(port, body):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(
+            b"POST /graphql/ HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            b"Content-Type: application/json\r\nAccept: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return response.split(b" ", 2)[1] == b"200"
+
+
+async def client(port, bodies, stop_at, timings, errors):
+    i = 0
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            ok = await request(port, bodies[i % len(bodies)])
+        except OSError:
+            ok = False
+        if ok:
+            timings.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+        i += 1
+
+
+async def load(port, concurrency, duration):
+    bodies = [json.dumps({"query": query}).encode() for query in QUERIES]
+    timings, errors = [], []
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(
+        *(
+            client(port, bodies[i % len(bodies):] + bodies[:i % len(bodies)], stop_at, timings, errors)
+            for i in range(concurrency)
+        )
+    )
+    return timings, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--servers", nargs="+", choices=SERVERS, default=list(SERVERS))
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        from django.db import connection
+
+        seed()
+        database = connection.settings_dict["NAME"]
+        connection.close()
+
+        rows = []
+        for name in args.servers:
+            process, port = start_server(SERVERS[name], args.workers, database)
+            try:
+                asyncio.run(load(port, 10, 1))  # warm up
+                timings, errors = asyncio.run(load(port, args.concurrency, args.duration))
+            finally:
+                process.terminate()
+                process.wait()
+            stats = summarize(timings)
+            rows.append(
+                [
+                    name,
+                    f"{len(timings) / args.duration:.0f}",
+                    f"{stats['p50_ms']:.1f}",
+                    f"{stats['p95_ms']:.1f}",
+                    f"{stats['p99_ms']:.1f}",
+                    errors,
+                ]
+            )
+
+    print_table(["server", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"], rows)
+
+
+if __name__ == "__main__":
+    main()
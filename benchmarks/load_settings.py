@@ -0,0 +1,12 @@
+"""Settings for servers started by the load benchmarks.
+
+Same as ``server.settings`` but on the database named by ``BENCHMARK_DATABASE``,
+without DEBUG (which keeps every query in memory) and without the response cache.
+"""
+import os
+
+from server.settings import *  # noqa: F401,F403
+
+DEBUG = False
+DATABASES["default"]["NAME"] = os.environ["BENCHMARK_DATABASE"]  # noqa: F405
+GRAPHQL_RESPONSE_CACHE_ALIAS = None
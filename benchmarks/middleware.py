@@ -0,0 +1,157 @@
+"""Per-request overhead and worker memory of the settings profiles.
+
+Each profile runs in its own process, which calls Django's WSGI handler
+(so every request runs the full middleware stack) with ``--requests``
+GraphQL queries, the response cache and rate limiting disabled. The fixed
+cost of a request is measured on ``/graphql/stats/``, which does next to
+nothing. Profiles:
+
+``full stack, DEBUG``
+    every middleware on every path, as ``server/settings.py`` had it, with
+    ``DEBUG = True``;
+``lean /graphql/, DEBUG``
+    the current ``server/settings.py``: the admin's middleware is skipped
+    for API paths;
+``production``
+    ``server/settings_production.py`` (``DEBUG = False``, WhiteNoise).
+
+Profiles take turns for ``--rounds`` rounds; the round with the median
+latency of each is reported, with the growth of the resident set size from
+the first tenth of the round to its end.
+
+    python -m benchmarks.middleware [--requests 20000] [--rounds 3]
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import warnings
+from wsgiref.util import setup_testing_defaults
+
+from . import measure, print_table, summarize, test_database
+from .load_async import seed
+
+QUERY = "{ products(first: 20) { edges { node { name price category { name } } } } }"
+FULL_STACK = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+PROFILES = {
+    "full stack, DEBUG": ("server.settings", FULL_STACK, True),
+    "lean /graphql/, DEBUG": ("server.settings", None, True),
+    "production": ("server.settings_production", None, False),
+}
+
+
+def rss_kb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+
+def wsgi_request(handler, path, body=b""):
+    environ = {
+        "REQUEST_METHOD": "POST" if body else "GET",
+        "PATH_INFO": path,
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    b"".join(response)
+    response.close()
+    assert statuses[0].startswith("200"), statuses
+
+
+def run(profile, requests):
+    """Soak one profile in this process; returns its timings and RSS samples."""
+    _, middleware, debug = PROFILES[profile]
+    # WhiteNoise warns about STATIC_ROOT until collectstatic has run.
+    warnings.filterwarnings("ignore", message="No directory at")
+    with test_database():
+        from django.conf import settings
+        from django.core.handlers.wsgi import WSGIHandler
+
+        settings.GRAPHQL_RESPONSE_CACHE_ALIAS = None
+        # One client sends every request; the production profile would throttle it.
+        settings.GRAPHQL_RATE_LIMIT = {**settings.GRAPHQL_RATE_LIMIT, "RATE": None}
+        settings.DEBUG = debug
+        if middleware is not None:
+            settings.MIDDLEWARE = middleware
+        seed(orders=0)
+        # The WSGI application itself: the test client leaves a signal
+        # receiver behind per request, which would swamp the RSS figures.
+        handler = WSGIHandler()
+        body = json.dumps({"query": QUERY}).encode()
+
+        overhead = measure(lambda: wsgi_request(handler, "/graphql/stats/"), requests // 10)
+        warmup = max(1, requests // 10)
+        measure(lambda: wsgi_request(handler, "/graphql/", body), warmup)
+        start_rss = rss_kb()
+        timings = measure(lambda: wsgi_request(handler, "/graphql/", body), requests - warmup)
+        return {
+            "overhead": overhead,
+            "timings": timings,
+            "start_rss": start_rss,
+            "end_rss": rss_kb(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000, help="requests per round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run(args.profile, args.requests)))
+        return
+
+    results = {profile: [] for profile in PROFILES}
+    # Profiles take turns so that a noisy neighbour or a change of CPU clock
+    # does not favour one of them.
+    for _ in range(args.rounds):
+        for profile, (settings_module, _, _) in PROFILES.items():
+            environ = {
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": settings_module,
+                "DJANGO_SECRET_KEY": os.environ.get("DJANGO_SECRET_KEY", "benchmark"),
+                "DJANGO_ALLOWED_HOSTS": os.environ.get("DJANGO_ALLOWED_HOSTS", "127.0.0.1"),
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.middleware", "--profile", profile,
+                 "--requests", str(args.requests)],
+                env=environ, check=True, capture_output=True, text=True,
+            ).stdout
+            results[profile].append(json.loads(output.splitlines()[-1]))
+    rows = []
+    for profile, rounds in results.items():
+        # The round with the median mean latency.
+        result = sorted(rounds, key=lambda result: sum(result["timings"]))[len(rounds) // 2]
+        stats = summarize(result["timings"])
+        rows.append([
+            profile,
+            f"{summarize(result['overhead'])['p50_ms']:.3f}",
+            f"{stats['mean_ms']:.3f}",
+            f"{stats['p50_ms']:.3f}",
+            f"{stats['p99_ms']:.3f}",
+            f"{result['start_rss'] / 1024:.1f}",
+            f"{(result['end_rss'] - result['start_rss']) / 1024:+.1f}",
+        ])
+    print_table(["profile", "overhead p50 ms", "query mean ms", "p50 ms", "p99 ms", "RSS MB", "RSS growth MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Order numbering at scale: receipt number collision rate and insert throughput.
+
+The collision part draws ``--orders`` receipt numbers from the configured
+generator and counts how many a plain insert would have rejected, i.e. how
+often ``Order.save()`` has to retry. The insert part bulk-loads ``--orders``
+rows keyed by ``uuid4()`` and then by ``uuid7()`` into an on-disk database and
+reports rows per second overall and over the last tenth of the load, where
+random keys start splitting pages all over the unique index.
+
+    python -m benchmarks.order_numbers [--orders 1000000] [--batch 10000]
+"""
+import argparse
+import time
+import uuid
+
+from . import print_table, test_database
+
+
+def receipt_collisions(count):
+    from products.numbering import new_receipt_number
+
+    seen = set()
+    collisions = 0
+    for _ in range(count):
+        number = new_receipt_number()
+        if number in seen:
+            collisions += 1
+        seen.add(number)
+    return collisions
+
+
+def insert_orders(order_number, count, batch_size):
+    from django.db import transaction
+
+    from products.models import Order
+
+    Order.objects.all().delete()
+    timings = []
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        orders = [
+            Order(
+                order_number=order_number(),
+                receipt_number=f"{start + i:07X}"[-7:],
+                name="Ivan",
+                surname="Ivanov",
+                phone_number="+70000000000",
+                address="Moscow",
+            )
+            for i in range(size)
+        ]
+        began = time.perf_counter()
+        with transaction.atomic():
+            Order.objects.bulk_create(orders, batch_size=1000)
+        timings.append((size, time.perf_counter() - began))
+    return timings
+
+
+def rate(timings):
+    return sum(size for size, _ in timings) / sum(elapsed for _, elapsed in timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        from products.numbering import RECEIPT_ALPHABET, RECEIPT_LENGTH, uuid7
+
+        collisions = receipt_collisions(args.orders)
+        space = len(RECEIPT_ALPHABET) ** RECEIPT_LENGTH
+        print_table(
+            ("receipts", "collisions", "expected", "retry rate"),
+            [
+                (
+                    args.orders,
+                    collisions,
+                    f"{args.orders ** 2 / (2 * space):.1f}",
+                    f"{collisions / args.orders:.2e}",
+                )
+            ],
+        )
+        print()
+
+        rows = []
+        for label, order_number in (("uuid4", uuid.uuid4), ("uuid7", uuid7)):
+            timings = insert_orders(order_number, args.orders, args.batch)
+            tail = timings[-max(1, len(timings) // 10) :]
+            rows.append(
+                (label, args.orders, f"{rate(timings):.0f}", f"{rate(tail):.0f}")
+            )
+        print_table(("order_number", "rows", "rows/s", "last 10% rows/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
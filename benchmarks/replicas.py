@@ -0,0 +1,144 @@
+"""Catalog read and CreateOrder throughput with and without read replicas.
+
+Seeds a catalog on disk and copies it to ``--replicas`` SQLite files, which
+stand in for replicas (they are not kept up to date, which catalog reads do
+not notice). Then starts gunicorn with threaded workers, first on the
+primary alone, then with ``DATABASE_REPLICAS`` pointing at the copies, and
+keeps ``--readers`` clients sending a heavy catalog query and ``--writers``
+clients placing orders for ``--duration`` seconds against each. Every client
+has its own ``X-Api-Key``, so only writers stick to the primary.
+
+    python -m benchmarks.replicas [--readers 16] [--writers 4] [--duration 10] [--replicas 1]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from . import print_table, summarize, test_database
+from .load_async import seed, start_server
+
+READ_QUERY = "{ products(first: 100) { edges { node { name description price quantity category { name productSet { name } } } } } }"
+CREATE_ORDER = """
+    mutation($productIds: [ID]!, $quantities: [Int]!) {
+        createOrder(name: "Ivan", surname: "Ivanov", phoneNumber: "+70000000000",
+                    address: "Moscow", email: "ivan@example.com",
+                    productIds: $productIds, quantities: $quantities) { order { id } }
+    }
+"""
+SERVER = ["server.wsgi", "-k", "gthread", "--threads", "8"]
+
+
+async def request(port, body, api_key):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(
+            b"POST /graphql/ HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            b"Content-Type: application/json\r\nX-Api-Key: %s\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (api_key.encode(), len(body), body)
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return response.split(b" ", 2)[1] == b"200" and b'"errors"' not in response
+
+
+async def client(port, bodies, api_key, stop_at, timings, errors):
+    i = 0
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            ok = await request(port, bodies[i % len(bodies)], api_key)
+        except OSError:
+            ok = False
+        if ok:
+            timings.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+        i += 1
+
+
+async def load(port, readers, writers, duration, product_ids):
+    reads = [json.dumps({"query": READ_QUERY}).encode()]
+    orders = [
+        json.dumps({
+            "query": CREATE_ORDER,
+            "variables": {"productIds": product_ids[i:i + 3], "quantities": [1, 1, 1]},
+        }).encode()
+        for i in range(0, len(product_ids) - 3, 3)
+    ]
+    read_timings, write_timings, errors = [], [], []
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(
+        *(client(port, reads, f"reader-{i}", stop_at, read_timings, errors) for i in range(readers)),
+        *(client(port, orders[i::writers], f"writer-{i}", stop_at, write_timings, errors) for i in range(writers)),
+    )
+    return read_timings, write_timings, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True), tempfile.TemporaryDirectory() as tmp:
+        from django.db import connection
+
+        from products.models import Product
+
+        seed(orders=0)
+        product_ids = [str(pk) for pk in Product.objects.values_list("pk", flat=True)]
+        database = connection.settings_dict["NAME"]
+        connection.close()
+
+        replica_files = []
+        for i in range(args.replicas):
+            replica_files.append(os.path.join(tmp, f"replica_{i}.sqlite3"))
+            with contextlib.closing(sqlite3.connect(database)) as source, \
+                    contextlib.closing(sqlite3.connect(replica_files[-1])) as replica:
+                source.backup(replica)
+
+        rows = []
+        for name, replicas in (("primary only", ""), (f"{args.replicas} replica(s)", ",".join(replica_files))):
+            os.environ["DATABASE_REPLICAS"] = replicas
+            try:
+                process, port = start_server(SERVER, args.workers, database)
+            finally:
+                del os.environ["DATABASE_REPLICAS"]
+            try:
+                asyncio.run(load(port, 2, 1, 1, product_ids))  # warm up
+                reads, writes, errors = asyncio.run(
+                    load(port, args.readers, args.writers, args.duration, product_ids)
+                )
+            finally:
+                process.terminate()
+                process.wait()
+            read_stats, write_stats = summarize(reads), summarize(writes)
+            rows.append([
+                name,
+                f"{len(reads) / args.duration:.0f}",
+                f"{read_stats['p50_ms']:.1f}",
+                f"{read_stats['p99_ms']:.1f}",
+                f"{len(writes) / args.duration:.1f}",
+                f"{write_stats['p50_ms']:.1f}",
+                f"{write_stats['p99_ms']:.1f}",
+                errors,
+            ])
+
+    print_table(
+        ["database", "reads/s", "read p50 ms", "read p99 ms", "orders/s", "order p50 ms", "order p99 ms", "errors"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
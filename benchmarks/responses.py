@@ -0,0 +1,180 @@
+"""Size, serialisation time and peak memory of a very large GraphQL response.
+
+Seeds ``--products`` products and asks for all of them in one query, through
+Django's WSGI handler (middleware included), in four modes:
+
+* one response encoded by ``json``, the page limit raised to fit it all;
+* the same encoded by orjson (``GRAPHQL_FAST_JSON``);
+* streamed in pages of ``--page-size`` (``GRAPHQL_STREAM_PAGE_SIZE``), with
+  ``json`` and with orjson.
+
+Every mode runs in its own process. Reports the time to produce the whole
+body, the part of it spent encoding JSON, the peak resident memory of the
+request above the process's size before it, and the bytes sent with no
+compression, gzip and brotli.
+
+    python -m benchmarks.responses [--products 100000] [--page-size 500]
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+from . import print_table, test_database
+
+SEED_BATCH = 10_000
+QUERY = "query ($first: Int) { products(first: $first) { edges { node { id name description price quantity category { name } } } } }"
+MODES = {
+    "json": (False, False),
+    "orjson": (True, False),
+    "json, streamed": (False, True),
+    "orjson, streamed": (True, True),
+}
+
+
+def seed(products):
+    from django.db import transaction
+
+    from products.models import Category, Product
+
+    categories = Category.objects.bulk_create(Category(name=f"Category {i}") for i in range(100))
+    for start in range(0, products, SEED_BATCH):
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                Product(
+                    name=f"Product {i}",
+                    description=f"Description of product {i}, with enough words to look like one.",
+                    price="19.99",
+                    quantity=i % 1000,
+                    category=categories[i % len(categories)],
+                )
+                for i in range(start, min(start + SEED_BATCH, products))
+            )
+
+
+def status_kb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+def request(handler, body, accept_encoding=""):
+    """``(headers, body)`` of a POST to /graphql/."""
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/graphql/",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "HTTP_ACCEPT_ENCODING": accept_encoding,
+        "wsgi.input": io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    started = []
+    response = handler(environ, lambda status, headers: started.append((status, dict(headers))))
+    size = 0
+    for chunk in response:
+        # Sent and dropped, like a server would.
+        size += len(chunk)
+    response.close()
+    status, headers = started[0]
+    assert status.startswith("200"), status
+    return headers, size
+
+
+def run(mode, products, page_size):
+    fast_json, streamed = MODES[mode]
+    with test_database():
+        import gc
+
+        from django.conf import settings
+        from django.core.handlers.wsgi import WSGIHandler
+        from graphene_django.settings import graphene_settings
+
+        from products import encoding
+
+        seed(products)
+        settings.GRAPHQL_RESPONSE_CACHE_ALIAS = None
+        settings.GRAPHQL_QUERY_COST = {"MAX_COST": None, "MAX_DEPTH": None}
+        settings.GRAPHQL_FAST_JSON = fast_json
+        settings.GRAPHQL_STREAM_PAGE_SIZE = page_size if streamed else None
+        settings.GRAPHQL_STREAM_MAX_ITEMS = None
+        graphene_settings.RELAY_CONNECTION_MAX_LIMIT = page_size if streamed else products
+
+        encoding_time = [0.0]
+        dumps = encoding.dumps
+
+        def timed_dumps(value):
+            start = time.perf_counter()
+            try:
+                return dumps(value)
+            finally:
+                encoding_time[0] += time.perf_counter() - start
+
+        encoding.dumps = timed_dumps
+        handler = WSGIHandler()
+        body = json.dumps({"query": QUERY, "variables": {"first": products}}).encode()
+        request(handler, json.dumps({"query": QUERY, "variables": {"first": 10}}).encode())
+
+        gc.collect()
+        before = status_kb("VmRSS")
+        reset_peak_rss()
+        encoding_time[0] = 0.0
+        start = time.perf_counter()
+        headers, identity = request(handler, body)
+        elapsed = time.perf_counter() - start
+        peak = status_kb("VmHWM") - before
+        encode = encoding_time[0]
+
+        sizes = {"identity": identity}
+        for name in ("gzip", "br"):
+            headers, sizes[name] = request(handler, body, name)
+            assert headers.get("Content-Encoding") == name, headers
+        return {"elapsed": elapsed, "encode": encode, "peak_kb": peak, "sizes": sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run(args.mode, args.products, args.page_size)))
+        return
+
+    rows = []
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.responses", "--mode", mode,
+             "--products", str(args.products), "--page-size", str(args.page_size)],
+            env=os.environ, check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        sizes = result["sizes"]
+        rows.append([
+            mode,
+            f"{result['elapsed']:.2f}",
+            f"{result['encode']:.2f}",
+            f"{result['peak_kb'] / 1024:.1f}",
+            f"{sizes['identity'] / 1e6:.1f}",
+            f"{sizes['gzip'] / 1e6:.2f}",
+            f"{sizes['br'] / 1e6:.2f}",
+        ])
+    print_table(
+        ["mode", "body s", "encoding s", "peak RSS MB", "identity MB", "gzip MB", "br MB"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Revenue aggregates in the database against summing order lines in Python.
+
+Seeds orders with ``benchmarks.suite.seed`` spread over a year, then times
+``products.sales`` over the whole history and over the last 30 days, next to
+what clients did before orders had totals: fetch every line with its product
+price and add them up.
+
+    python -m benchmarks.sales [--order-items 1000000] [--repeat 5]
+"""
+import argparse
+import datetime
+import random
+import time
+from collections import defaultdict
+
+from . import measure, print_table, summarize, test_database
+from .suite import seed
+
+
+def python_revenue_by_day(start):
+    from products.models import OrderItem
+    from products.stock import RELEASED_STATUSES
+
+    revenue = defaultdict(int)
+    lines = (
+        OrderItem.objects.filter(order__created_at__gte=start)
+        .exclude(order__status__in=RELEASED_STATUSES)
+        .values_list("order__created_at", "quantity", "product__price")
+    )
+    for created_at, quantity, price in lines.iterator(chunk_size=10_000):
+        revenue[created_at.date()] += quantity * price
+    return revenue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--order-items", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        from django.db.models import F
+        from django.utils import timezone
+
+        from products import sales
+        from products.models import Order
+
+        began = time.perf_counter()
+        seed(args.categories, args.products, args.order_items, random.Random(args.seed))
+        now = timezone.now()
+        # One day further back for every 1/365th of the orders.
+        per_day = max(1, Order.objects.count() // 365)
+        for day in range(365):
+            Order.objects.filter(pk__gt=day * per_day, pk__lte=(day + 1) * per_day).update(
+                created_at=F("created_at") - datetime.timedelta(days=day)
+            )
+        print(f"Seeded {args.order_items} order items in {time.perf_counter() - began:.1f} s\n")
+
+        month = now - datetime.timedelta(days=30)
+        cases = [
+            ("revenue by day, all", lambda: sales.revenue_by_day()),
+            ("revenue by day, 30 days", lambda: sales.revenue_by_day(month)),
+            ("revenue by category, 30 days", lambda: sales.revenue_by_category(month)),
+            ("revenue by status, 30 days", lambda: sales.revenue_by_status(month)),
+            ("python sum by day, 30 days", lambda: python_revenue_by_day(month)),
+        ]
+        rows = []
+        for name, run in cases:
+            run()
+            stats = summarize(measure(run, args.repeat))
+            rows.append([name, f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}"])
+
+    print_table(["aggregate", "p50 ms", "p95 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
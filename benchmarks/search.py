@@ -0,0 +1,111 @@
+"""Full-text product search against a naive ``icontains`` scan.
+
+Seeds ``--products`` products whose names and descriptions are drawn from a
+synthetic vocabulary with a skewed (Zipf-like) word frequency, then runs the
+same queries through ``products.search`` (FTS5 on SQLite) and through
+``name__icontains OR description__icontains`` per word, each reading the
+first page of 20 results, and reports latency percentiles per query kind.
+
+    python -m benchmarks.search [--products 1000000] [--queries 200]
+"""
+import argparse
+import itertools
+import random
+import time
+
+from . import measure, print_table, summarize, test_database
+
+SEED_BATCH = 10_000
+PAGE_SIZE = 20
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "bo", "da", "fe", "gu", "pi", "xo"]
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(products, words, rng):
+    from django.db import transaction
+
+    from products.models import Category, Product
+
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    category = Category.objects.create(name="Search")
+    for start in range(0, products, SEED_BATCH):
+        size = min(SEED_BATCH, products - start)
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                Product(
+                    name=" ".join(rng.choices(words, cum_weights=weights, k=3)).capitalize(),
+                    description=" ".join(rng.choices(words, cum_weights=weights, k=15)),
+                    price="1.00",
+                    quantity=1,
+                    category=category,
+                )
+                for _ in range(size)
+            )
+
+
+def kinds(words, rng):
+    """``{kind: [query, ...]}`` with common and rare words, prefixes and pairs."""
+    common, rare = words[:50], words[-2000:]
+    return {
+        "common word": lambda: rng.choice(common),
+        "rare word": lambda: rng.choice(rare),
+        "prefix": lambda: rng.choice(rare)[:3],
+        "two words": lambda: f"{rng.choice(common)} {rng.choice(rare)[:4]}",
+    }
+
+
+def icontains(query):
+    from django.db.models import Q
+
+    from products.models import Product
+    from products.search import terms
+
+    condition = Q()
+    for word in terms(query):
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return Product.objects.filter(condition).order_by("name", "id")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind for the index")
+    parser.add_argument("--scan-queries", type=int, default=10, help="queries per kind for the scan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.words, rng)
+    with test_database(on_disk=True):
+        from products.search import ORDERING, search_products
+
+        began = time.perf_counter()
+        seed(args.products, words, rng)
+        print(f"Seeded {args.products} products in {time.perf_counter() - began:.1f} s\n")
+
+        rows = []
+        for kind, draw in kinds(words, rng).items():
+            queries = [draw() for _ in range(args.queries)]
+            matches = search_products(queries[0]).count()
+            for method, build, sample in [
+                ("fts", lambda q: search_products(q).order_by(*ORDERING), queries),
+                ("icontains", icontains, queries[: args.scan_queries]),
+            ]:
+                pending = itertools.cycle(sample)
+                stats = summarize(measure(lambda: list(build(next(pending))[:PAGE_SIZE]), len(sample)))
+                rows.append([
+                    kind, method, len(sample), matches,
+                    f"{stats['p50_ms']:.2f}", f"{stats['p95_ms']:.2f}", f"{stats['p99_ms']:.2f}",
+                ])
+        print_table(["query", "method", "runs", "matches (first)", "p50 ms", "p95 ms", "p99 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Checkout throughput when many threads buy the same few products.
+
+Every thread places single-line orders through ``CreateOrder.mutate`` until the
+stock runs out. The run fails if more units were sold than were in stock.
+
+    python -m benchmarks.stock_contention [--threads 8] [--stock 500] [--products 1]
+"""
+import argparse
+import random
+import threading
+import time
+
+from . import print_table, test_database
+from .create_order import CUSTOMER
+
+
+def checkout_worker(product_ids, counters, lock):
+    from django.db import OperationalError, connection
+    from graphql import GraphQLError
+
+    from products.schema import CreateOrder
+
+    try:
+        while True:
+            product_id = random.choice(product_ids)
+            try:
+                CreateOrder.mutate(
+                    None, None, product_ids=[product_id], quantities=[1], **CUSTOMER
+                )
+                outcome = "sold"
+            except GraphQLError:
+                outcome = "rejected"
+            except OperationalError:
+                # SQLite allows one writer at a time.
+                outcome = "retried"
+                time.sleep(0.001)
+            with lock:
+                counters[outcome] += 1
+                if counters["rejected"] >= len(product_ids) * 10:
+                    return
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--products", type=int, default=1)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        from products.models import Category, OrderItem, Product
+
+        category = Category.objects.create(name="Benchmark")
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price="1.00",
+                quantity=args.stock,
+                category=category,
+            )
+            for i in range(args.products)
+        )
+        product_ids = [str(product.pk) for product in products]
+        counters = {"sold": 0, "rejected": 0, "retried": 0}
+        lock = threading.Lock()
+        workers = [
+            threading.Thread(target=checkout_worker, args=(product_ids, counters, lock))
+            for _ in range(args.threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        in_stock = args.stock * args.products
+        remaining = sum(Product.objects.values_list("quantity", flat=True))
+        sold_lines = OrderItem.objects.count()
+        print_table(
+            ("threads", "sold", "rejected", "retried", "remaining", "orders/s"),
+            [
+                (
+                    args.threads,
+                    counters["sold"],
+                    counters["rejected"],
+                    counters["retried"],
+                    remaining,
+                    f"{counters['sold'] / elapsed:.0f}",
+                )
+            ],
+        )
+        if sold_lines != in_stock - remaining or remaining < 0 or sold_lines > in_stock:
+            raise SystemExit(f"Oversold: {sold_lines} lines for {in_stock} units")
+
+
+if __name__ == "__main__":
+    main()
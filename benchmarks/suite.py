@@ -0,0 +1,373 @@
+"""Replay a representative mix of GraphQL operations against a seeded catalog.
+
+Seeds categories, products and orders at the chosen scale, then sends
+``--operations`` requests drawn from ``MIX`` through the Django test client
+and reports throughput, latency percentiles and SQL queries per operation.
+The run is reproducible for a given ``--seed``.
+
+Results can be saved with ``--output`` and compared with an earlier run with
+``--baseline``: the command exits with status 1 when an operation got slower
+(p95), lost throughput or issues more queries than the baseline allows.
+
+    python -m benchmarks.suite [--scale small|medium|large] [--operations 2000]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+
+``large`` is 10k categories, 1M products and 5M order items and takes a
+while to seed; ``--categories``, ``--products`` and ``--order-items``
+override the preset.
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+
+from . import print_table, summarize, test_database
+
+SCALES = {
+    "small": (100, 10_000, 50_000),
+    "medium": (1_000, 100_000, 500_000),
+    "large": (10_000, 1_000_000, 5_000_000),
+}
+ITEMS_PER_ORDER = 5
+SEED_BATCH = 10_000
+
+PRODUCTS = """
+query($first: Int, $after: String) {
+    products(first: $first, after: $after) {
+        edges { node { id name price quantity category { name } } }
+        pageInfo { endCursor hasNextPage }
+    }
+}"""
+PRODUCTS_BY_CATEGORY = """
+query($categoryId: ID, $maxPrice: Decimal) {
+    products(first: 20, categoryId: $categoryId, maxPrice: $maxPrice) {
+        edges { node { id name price } }
+    }
+}"""
+CATEGORIES = """
+query($after: String) {
+    categories(first: 10, after: $after) {
+        edges { node { id name productSet { id name price } } }
+    }
+}"""
+ORDERS = """
+query($status: String) {
+    orders(first: 20, status: $status) {
+        edges { node {
+            orderNumber receiptNumber status createdAt
+            orderitemSet { quantity product { name price } }
+        } }
+    }
+}"""
+CREATE_ORDER = """
+mutation($productIds: [ID]!, $quantities: [Int]!) {
+    createOrder(name: "Ivan", surname: "Ivanov", phoneNumber: "+70000000000",
+                address: "Moscow", email: "ivan@example.com",
+                productIds: $productIds, quantities: $quantities) {
+        order { id orderNumber orderitemSet { quantity } }
+    }
+}"""
+UPDATE_ORDER = """
+mutation($orderId: ID!, $address: String) {
+    updateOrder(orderId: $orderId, address: $address) { order { id address status } }
+}"""
+
+
+class Dataset:
+    """Primary keys of the seeded rows, used to draw realistic variables."""
+
+    def __init__(self, category_ids, product_ids, order_ids, cursors):
+        self.category_ids = category_ids
+        self.product_ids = product_ids
+        self.order_ids = order_ids
+        self.cursors = cursors
+
+
+def products_page(rng, data):
+    return PRODUCTS, {"first": rng.choice((10, 20, 50))}
+
+
+def products_deep_page(rng, data):
+    return PRODUCTS, {"first": 20, "after": rng.choice(data.cursors)}
+
+
+def products_by_category(rng, data):
+    return PRODUCTS_BY_CATEGORY, {
+        "categoryId": str(rng.choice(data.category_ids)),
+        "maxPrice": str(rng.choice((10, 50, 100))),
+    }
+
+
+def categories(rng, data):
+    return CATEGORIES, {}
+
+
+def orders(rng, data):
+    return ORDERS, {"status": rng.choice((None, "pending", "accepted", "completed"))}
+
+
+def create_order(rng, data):
+    product_ids = rng.sample(data.product_ids, rng.randint(1, 5))
+    return CREATE_ORDER, {
+        "productIds": [str(pk) for pk in product_ids],
+        "quantities": [rng.randint(1, 3) for _ in product_ids],
+    }
+
+
+def update_order(rng, data):
+    return UPDATE_ORDER, {
+        "orderId": str(rng.choice(data.order_ids)),
+        "address": f"Street {rng.randint(1, 1000)}",
+    }
+
+
+# name: (weight, build(rng, dataset) -> (query, variables))
+MIX = {
+    "products": (25, products_page),
+    "productsDeepPage": (10, products_deep_page),
+    "productsByCategory": (15, products_by_category),
+    "categories": (10, categories),
+    "orders": (15, orders),
+    "createOrder": (15, create_order),
+    "updateOrder": (10, update_order),
+}
+
+
+def seed(categories, products, order_items, rng):
+    from django.db import transaction
+
+    from products.models import Category, Order, OrderItem, Product
+    from products.numbering import uuid7
+    from products.pagination import encode_cursor
+
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+
+    def batches(total):
+        for start in range(0, total, SEED_BATCH):
+            yield start, min(SEED_BATCH, total - start)
+
+    for start, size in batches(categories):
+        with transaction.atomic():
+            Category.objects.bulk_create(
+                Category(name=f"Category {start + i:06d}") for i in range(size)
+            )
+    category_ids = list(Category.objects.values_list("pk", flat=True))
+
+    for start, size in batches(products):
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                Product(
+                    name=f"Product {rng.randrange(products):07d}",
+                    description="Description",
+                    price=f"{rng.randint(100, 20000) / 100:.2f}",
+                    quantity=10**9,
+                    category_id=category_ids[(start + i) % len(category_ids)],
+                )
+                for i in range(size)
+            )
+    prices = dict(Product.objects.values_list("pk", "price"))
+    product_ids = list(prices)
+
+    orders = order_items // ITEMS_PER_ORDER
+    for start, size in batches(orders):
+        lines = []
+        for _ in range(size):
+            items = []
+            for _ in range(ITEMS_PER_ORDER):
+                product_id = rng.choice(product_ids)
+                items.append(
+                    OrderItem(
+                        product_id=product_id,
+                        quantity=rng.randint(1, 3),
+                        unit_price=prices[product_id],
+                    ).priced()
+                )
+            lines.append(items)
+        with transaction.atomic():
+            created = Order.objects.bulk_create(
+                Order(
+                    order_number=uuid7(),
+                    receipt_number=f"{start + i:07X}",
+                    name="Ivan",
+                    surname="Ivanov",
+                    phone_number="+70000000000",
+                    address="Moscow",
+                    email="ivan@example.com",
+                    status=rng.choice(statuses),
+                    total=sum(item.total for item in lines[i]),
+                )
+                for i in range(size)
+            )
+            for order, items in zip(created, lines):
+                for item in items:
+                    item.order = order
+            OrderItem.objects.bulk_create(item for items in lines for item in items)
+    order_ids = list(Order.objects.values_list("pk", flat=True))
+
+    sample = Product.objects.filter(pk__in=rng.sample(product_ids, min(len(product_ids), 1000)))
+    cursors = [encode_cursor(product, ("name", "id")) for product in sample.only("name")]
+    return Dataset(category_ids, product_ids, order_ids, cursors)
+
+
+def replay(data, operations, rng):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    names = list(MIX)
+    weights = [MIX[name][0] for name in names]
+    results = {name: {"timings": [], "queries": 0, "errors": 0} for name in names}
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count_queries):
+        for name in rng.choices(names, weights, k=operations):
+            query, variables = MIX[name][1](rng, data)
+            body = json.dumps({"query": query, "variables": variables})
+            before = queries
+            begin = time.perf_counter()
+            response = client.post("/graphql/", body, content_type="application/json")
+            elapsed = time.perf_counter() - begin
+            result = results[name]
+            result["timings"].append(elapsed)
+            result["queries"] += queries - before
+            if response.status_code != 200 or "errors" in response.json():
+                result["errors"] += 1
+    wall = time.perf_counter() - started
+
+    report = {}
+    for name, result in results.items():
+        timings = result["timings"]
+        if not timings:
+            continue
+        report[name] = {
+            "count": len(timings),
+            "errors": result["errors"],
+            "ops_per_s": len(timings) / sum(timings),
+            **summarize(timings),
+            "queries_per_op": result["queries"] / len(timings),
+        }
+    total = sum(len(result["timings"]) for result in results.values())
+    report["overall"] = {
+        "count": total,
+        "errors": sum(result["errors"] for result in results.values()),
+        "ops_per_s": total / wall,
+        **summarize([t for result in results.values() for t in result["timings"]]),
+        "queries_per_op": queries / total,
+    }
+    return report
+
+
+def regressions(results, baseline, threshold):
+    """Human-readable list of operations that regressed beyond ``threshold`` (a fraction)."""
+    found = []
+    for name, current in results["operations"].items():
+        previous = baseline["operations"].get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["ops_per_s"] < previous["ops_per_s"] * (1 - threshold):
+            found.append(f"{name}: throughput {previous['ops_per_s']:.1f} -> {current['ops_per_s']:.1f} ops/s")
+        # Query counts are deterministic for a seed, allow only rounding noise.
+        if current["queries_per_op"] > previous["queries_per_op"] + 0.01:
+            found.append(
+                f"{name}: queries/op {previous['queries_per_op']:.2f} -> {current['queries_per_op']:.2f}"
+            )
+        if current["errors"] > previous["errors"]:
+            found.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--categories", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--order-items", type=int)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--in-memory", action="store_true", help="use an in-memory test database")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    categories, products, order_items = SCALES[args.scale]
+    scale = {
+        "categories": args.categories or categories,
+        "products": args.products or products,
+        "order_items": args.order_items or order_items,
+    }
+
+    with test_database(on_disk=not args.in_memory):
+        import django
+        from django.test import override_settings
+
+        rng = random.Random(args.seed)
+        began = time.perf_counter()
+        data = seed(scale["categories"], scale["products"], scale["order_items"], rng)
+        seed_seconds = time.perf_counter() - began
+        # Measure the resolvers, not the response cache or the tracer.
+        with override_settings(GRAPHQL_RESPONSE_CACHE_ALIAS=None, GRAPHQL_TRACE_SAMPLE_RATE=0):
+            replay(data, min(200, args.operations), random.Random(args.seed + 1))  # warm up
+            operations = replay(data, args.operations, random.Random(args.seed))
+
+    results = {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "scale": scale,
+            "operations": args.operations,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 1),
+        },
+        "operations": operations,
+    }
+
+    print_table(
+        ["operation", "count", "ops/s", "p50 ms", "p95 ms", "p99 ms", "queries/op", "errors"],
+        [
+            [
+                name,
+                stats["count"],
+                f"{stats['ops_per_s']:.1f}",
+                f"{stats['p50_ms']:.2f}",
+                f"{stats['p95_ms']:.2f}",
+                f"{stats['p99_ms']:.2f}",
+                f"{stats['queries_per_op']:.2f}",
+                stats["errors"],
+            ]
+            for name, stats in operations.items()
+        ],
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.threshold)
+        if found:
+            print("\nRegressions against", args.baseline)
+            for line in found:
+                print("  " + line)
+            sys.exit(1)
+        print("\nNo regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
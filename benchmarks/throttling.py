@@ -0,0 +1,129 @@
+"""Latency of a well-behaved client while another one floods the endpoint.
+
+``--flooders`` threads send the order query from one address as fast as
+they can, while one client from another address sends the catalog query
+every ``--interval`` seconds, for ``--duration`` seconds, through Django's
+WSGI handler. Modes:
+
+``unlimited``
+    no rate limit and no concurrency limit;
+``rate limited``
+    ``GRAPHQL_RATE_LIMIT`` of ``--rate`` requests a second per client;
+``shedding``
+    ``GRAPHQL_MAX_CONCURRENT_REQUESTS`` of half ``--flooders``, no rate
+    limit; the well-behaved client may be shed too.
+
+Reports the latency of the well-behaved client's executed requests and the
+share of them rejected, the requests of the flood executed and rejected,
+and how long a rejection takes.
+
+    python -m benchmarks.throttling [--flooders 8] [--duration 10] [--rate 20]
+"""
+import argparse
+import io
+import json
+import threading
+import time
+from wsgiref.util import setup_testing_defaults
+
+from . import print_table, summarize, test_database
+from .load_async import seed
+
+FLOOD_QUERY = "{ orders(first: 50) { edges { node { orderNumber status products { name category { name } } } } } }"
+QUERY = "{ products(first: 20) { edges { node { name price category { name } } } } }"
+MODES = ("unlimited", "rate limited", "shedding")
+
+
+def wsgi_post(handler, body, address):
+    """``(status code, seconds)`` of a POST to /graphql/ from ``address``."""
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/graphql/",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "REMOTE_ADDR": address,
+        "wsgi.input": io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    start = time.perf_counter()
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return int(statuses[0].split()[0]), time.perf_counter() - start
+
+
+def run(handler, flooders, duration, interval):
+    from django.db import connections
+
+    flood_body = json.dumps({"query": FLOOD_QUERY}).encode()
+    body = json.dumps({"query": QUERY}).encode()
+    stop = threading.Event()
+    flood = []
+
+    def flooder():
+        try:
+            while not stop.is_set():
+                flood.append(wsgi_post(handler, flood_body, "10.0.0.1"))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=flooder) for _ in range(flooders)]
+    for thread in threads:
+        thread.start()
+    timings = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        timings.append(wsgi_post(handler, body, "10.0.0.2"))
+        time.sleep(interval)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return timings, flood
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flooders", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=20)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        from django.conf import settings
+        from django.core.handlers.wsgi import WSGIHandler
+
+        from products import throttling
+
+        seed()
+        settings.GRAPHQL_RESPONSE_CACHE_ALIAS = None
+        handler = WSGIHandler()
+        rows = []
+        for mode in MODES:
+            settings.GRAPHQL_RATE_LIMIT = {"RATE": args.rate if mode == "rate limited" else None, "BURST": args.rate}
+            settings.GRAPHQL_MAX_CONCURRENT_REQUESTS = max(1, args.flooders // 2) if mode == "shedding" else None
+            throttling.get_store().clear()
+            requests, flood = run(handler, args.flooders, args.duration, args.interval)
+            executed = [elapsed for status, elapsed in requests if status == 200]
+            shed = sum(status != 200 for status, _ in requests) / len(requests)
+            stats = summarize(executed) if executed else {"p50_ms": float("nan"), "p99_ms": float("nan")}
+            flood_executed = sum(status == 200 for status, _ in flood)
+            rejected = [elapsed for status, elapsed in flood if status in (429, 503)]
+            rows.append([
+                mode,
+                f"{stats['p50_ms']:.1f}",
+                f"{stats['p99_ms']:.1f}",
+                f"{shed:.0%}",
+                f"{flood_executed / args.duration:.0f}",
+                f"{len(rejected) / args.duration:.0f}",
+                f"{summarize(rejected)['p50_ms']:.2f}" if rejected else "-",
+            ])
+    print_table(
+        ["mode", "client p50 ms", "client p99 ms", "client rejected", "flood executed/s", "flood rejected/s", "rejection p50 ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Cost of resolver tracing per request, with tracing off, sampled, always on and reported.
+
+    python -m benchmarks.tracing_overhead [--repeat 300] [--orders 50]
+"""
+import argparse
+import json
+
+from . import measure, print_table, summarize, test_database
+from .create_order import CUSTOMER
+
+QUERY = """{ orders(first: 50) { edges { node {
+    orderNumber status orderitemSet { quantity product { name price category { name } } }
+} } } }"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        from django.test import Client, override_settings
+
+        from products.models import Category, Order, OrderItem, Product
+
+        category = Category.objects.create(name="Benchmark")
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price="1.00", quantity=10, category=category)
+            for i in range(20)
+        )
+        for i in range(args.orders):
+            order = Order.objects.create(**CUSTOMER)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=products[(i + j) % 20], quantity=1).priced() for j in range(5)
+            )
+
+        client = Client()
+        body = json.dumps({"query": QUERY})
+        modes = [
+            ("off", 0, {}),
+            ("sampled 1%", 0.01, {}),
+            ("every request", 1, {}),
+            ("header", 0, {"HTTP_X_GRAPHQL_TRACE": "1"}),
+        ]
+        rows = []
+        baseline = None
+        for name, rate, headers in modes:
+            with override_settings(GRAPHQL_TRACE_SAMPLE_RATE=rate, GRAPHQL_RESPONSE_CACHE_ALIAS=None):
+                def request():
+                    client.post("/graphql/", body, content_type="application/json", **headers)
+
+                measure(request, 20)
+                stats = summarize(measure(request, args.repeat))
+            baseline = baseline or stats["mean_ms"]
+            rows.append(
+                [
+                    name,
+                    f"{stats['mean_ms']:.2f}",
+                    f"{stats['p50_ms']:.2f}",
+                    f"{stats['p95_ms']:.2f}",
+                    f"{(stats['mean_ms'] / baseline - 1) * 100:+.1f}%",
+                ]
+            )
+
+    print_table(["tracing", "mean ms", "p50 ms", "p95 ms", "vs off"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""CreateOrder throughput with several worker processes writing at once, per database profile.
+
+Each process stands in for a gunicorn worker and places orders through
+``CreateOrder.mutate`` for ``--duration`` seconds. Profiles:
+
+``sqlite-default``
+    What ``django.db.backends.sqlite3`` does out of the box: rollback
+    journal, ``synchronous=FULL``, deferred transactions, a new connection
+    per request.
+``sqlite-tuned``
+    The defaults of ``server.database``: WAL, ``synchronous=NORMAL``,
+    ``BEGIN IMMEDIATE``, persistent connections.
+``postgresql``
+    The ``DATABASE_*`` environment variables with ``DATABASE_ENGINE=postgresql``;
+    runs only when they point at a server (orders are left in that database).
+
+    python -m benchmarks.write_concurrency [--processes 4] [--duration 5] [--profiles ...]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from . import print_table
+from .create_order import CUSTOMER
+
+PROFILES = {
+    "sqlite-default": {
+        "DATABASE_ENGINE": "sqlite",
+        "DATABASE_CONN_MAX_AGE": "0",
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_TRANSACTION_MODE": "",
+    },
+    "sqlite-tuned": {"DATABASE_ENGINE": "sqlite"},
+    "postgresql": {"DATABASE_ENGINE": "postgresql"},
+}
+
+
+def setup_django(environ):
+    os.environ.update(environ)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "server.settings"
+    import django
+
+    django.setup()
+
+
+def prepare(environ, products):
+    setup_django(environ)
+    from django.core.management import call_command
+
+    from products.models import Category, Product
+
+    call_command("migrate", verbosity=0)
+    category = Category.objects.create(name="Benchmark")
+    Product.objects.bulk_create(
+        Product(
+            name=f"Product {i}",
+            description="",
+            price="1.00",
+            quantity=10**9,
+            category=category,
+        )
+        for i in range(products)
+    )
+    return [str(pk) for pk in Product.objects.filter(category=category).values_list("pk", flat=True)]
+
+
+def worker(environ, product_ids, start_at, stop_at, results):
+    setup_django(environ)
+    from django.db import OperationalError, close_old_connections
+    from graphql import GraphQLError
+
+    from products.schema import CreateOrder
+
+    counts = {"orders": 0, "locked": 0, "failed": 0}
+    latencies = []
+    time.sleep(max(0, start_at - time.time()))
+    i = os.getpid()
+    while time.time() < stop_at:
+        # What the request_started / request_finished signals do per request.
+        close_old_connections()
+        start = time.perf_counter()
+        try:
+            CreateOrder.mutate(
+                None, None,
+                product_ids=[product_ids[i % len(product_ids)]],
+                quantities=[1],
+                **CUSTOMER,
+            )
+            counts["orders"] += 1
+            latencies.append(time.perf_counter() - start)
+        except OperationalError as e:
+            counts["locked" if "locked" in str(e) else "failed"] += 1
+        except GraphQLError:
+            counts["failed"] += 1
+        close_old_connections()
+        i += 1
+    results.put((counts, latencies))
+
+
+def run(profile, processes, duration, products):
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        environ = dict(PROFILES[profile])
+        if environ["DATABASE_ENGINE"] == "sqlite":
+            environ["DATABASE_NAME"] = os.path.join(tmp, "db.sqlite3")
+        with context.Pool(1) as pool:
+            product_ids = pool.apply(prepare, (environ, products))
+        results = context.Queue()
+        start_at = time.time() + 3  # let every process import Django first
+        workers = [
+            context.Process(
+                target=worker,
+                args=(environ, product_ids, start_at, start_at + duration, results),
+            )
+            for _ in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+
+    totals = {"orders": 0, "locked": 0, "failed": 0}
+    latencies = []
+    for counts, timings in outcomes:
+        for key, value in counts.items():
+            totals[key] += value
+        latencies += timings
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+    return [
+        profile,
+        processes,
+        totals["orders"],
+        f"{totals['orders'] / duration:.0f}",
+        totals["locked"],
+        totals["failed"],
+        f"{p99 * 1000:.1f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=None)
+    args = parser.parse_args()
+
+    profiles = args.profiles or [
+        name
+        for name in PROFILES
+        if name != "postgresql" or os.environ.get("DATABASE_HOST")
+    ]
+    rows = [run(profile, args.processes, args.duration, args.products) for profile in profiles]
+    print_table(
+        ["profile", "processes", "orders", "orders/s", "locked", "failed", "p99 ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ class CategoryAdmin(admin.ModelAdmin):
     pass
 @admin.register(Order)
 class CategoryAdmin(admin.ModelAdmin):
-    pass
+    readonly_fields = ('total',)
 @admin.register(OrderItem)
 class CategoryAdmin(admin.ModelAdmin):
-    pass
+    readonly_fields = ('unit_price', 'total')
@@ -0,0 +1,33 @@
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+
+
+def in_async_context():
+    """True when called from code running on an event loop.
+
+    Resolvers use it to pick their async ORM path: under the ASGI view the
+    schema is executed on the loop, while the WSGI view (and the ASGI handler's
+    thread for sync views) never has a running loop in the calling thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def async_safe(resolver):
+    """Run a sync resolver in Django's thread-sensitive executor under async execution.
+
+    For mutations whose writes must share one ``transaction.atomic()`` block,
+    which Django does not support in async code.
+    """
+    @functools.wraps(resolver)
+    def wrapper(*args, **kwargs):
+        if in_async_context():
+            return sync_to_async(resolver)(*args, **kwargs)
+        return resolver(*args, **kwargs)
+
+    return wrapper
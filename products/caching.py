@@ -0,0 +1,183 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    OperationType,
+    get_named_type,
+    get_operation_ast,
+    print_ast,
+)
+
+# Root fields whose responses may be cached and the models they may touch.
+CATALOG_FIELDS = frozenset({'products', 'categories'})
+CATALOG_MODELS = frozenset({'products.product', 'products.category'})
+
+
+def get_cache():
+    alias = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_ALIAS', 'default')
+    return caches[alias] if alias else None
+
+
+def get_response(key):
+    return get_cache().get(key)
+
+
+def set_response(key, response):
+    get_cache().set(key, response, _timeout())
+
+
+async def aget_response(key):
+    return await get_cache().aget(key)
+
+
+async def aset_response(key, response):
+    await get_cache().aset(key, response, _timeout())
+
+
+def _timeout():
+    return getattr(settings, 'GRAPHQL_RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def _version_key(label):
+    return f'graphql:version:{label}'
+
+
+def _written_key(label):
+    return f'graphql:written:{label}'
+
+
+def invalidate(model):
+    """Drop every cached response that depends on ``model``."""
+    cache = get_cache()
+    if cache is not None:
+        label = model._meta.label_lower
+        cache.set(_version_key(label), uuid.uuid4().hex, None)
+        if getattr(settings, 'DATABASE_REPLICAS', ()):
+            cache.set(_written_key(label), True, getattr(settings, 'DATABASE_REPLICA_LAG', 5))
+
+
+def written_recently(schema, document, operation_name):
+    """Whether a catalog read would be cached while replicas may still miss a write it depends on."""
+    cache = get_cache()
+    if cache is None:
+        return False
+    models = catalog_models(schema, document, operation_name)
+    return bool(models and cache.get_many([_written_key(label) for label in models]))
+
+
+async def awritten_recently(schema, document, operation_name):
+    cache = get_cache()
+    if cache is None:
+        return False
+    models = catalog_models(schema, document, operation_name)
+    return bool(models and await cache.aget_many([_written_key(label) for label in models]))
+
+
+def invalidate_on_commit(model):
+    transaction.on_commit(lambda: invalidate(model))
+
+
+def catalog_models(schema, document, operation_name):
+    """Labels of the models a read-only catalog operation touches, or None if it is not one."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    models = set()
+    root_fields = set()
+
+    def walk(parent_type, selection_set, root):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                if name.startswith('__'):
+                    continue
+                if root:
+                    root_fields.add(name)
+                field = parent_type.fields.get(name)
+                if field is None:
+                    continue
+                named_type = get_named_type(field.type)
+                meta = getattr(getattr(named_type, 'graphene_type', None), '_meta', None)
+                model = getattr(meta, 'model', None)
+                if model is not None:
+                    models.add(model._meta.label_lower)
+                if selection.selection_set is not None:
+                    walk(named_type, selection.selection_set, False)
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                walk(schema.get_type(condition.name.value) if condition else parent_type,
+                     selection.selection_set, root)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    walk(schema.get_type(fragment.type_condition.name.value),
+                         fragment.selection_set, root)
+
+    walk(schema.query_type, operation.selection_set, True)
+    if not root_fields or not root_fields <= CATALOG_FIELDS or not models <= CATALOG_MODELS:
+        return None
+    return sorted(models)
+
+
+def response_key(schema, document, variables, operation_name):
+    """Cache key of a catalog read, or None when the response must not be cached.
+
+    The key covers the normalised query text, the variables and the current
+    version of every model the query touches, so invalidating a model simply
+    makes its old entries unreachable until they expire.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    models = catalog_models(schema, document, operation_name)
+    if models is None:
+        return None
+    version_keys = [_version_key(label) for label in models]
+    versions = cache.get_many(version_keys)
+    for version_key in version_keys:
+        if version_key not in versions:
+            cache.add(version_key, uuid.uuid4().hex, None)
+            versions[version_key] = cache.get(version_key)
+    return _response_key(document, variables, operation_name, [versions[k] for k in version_keys])
+
+
+async def aresponse_key(schema, document, variables, operation_name):
+    """``response_key()`` without blocking the event loop on the cache."""
+    cache = get_cache()
+    if cache is None:
+        return None
+    models = catalog_models(schema, document, operation_name)
+    if models is None:
+        return None
+    version_keys = [_version_key(label) for label in models]
+    versions = await cache.aget_many(version_keys)
+    for version_key in version_keys:
+        if version_key not in versions:
+            await cache.aadd(version_key, uuid.uuid4().hex, None)
+            versions[version_key] = await cache.aget(version_key)
+    return _response_key(document, variables, operation_name, [versions[k] for k in version_keys])
+
+
+def _response_key(document, variables, operation_name, versions):
+    payload = json.dumps(
+        [print_ast(document), operation_name, variables, versions],
+        sort_keys=True,
+        default=str,
+    )
+    return 'graphql:response:' + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag(key):
+    return '"' + key.rsplit(':', 1)[-1][:32] + '"'
@@ -0,0 +1,172 @@
+"""Streaming catalog import and export in CSV or JSON Lines.
+
+Rows carry ``sku``, ``name``, ``description``, ``price``, ``quantity`` and
+``category`` (the category name). Imports upsert products on ``sku``: every
+chunk resolves its category names with one query, creates the missing
+categories with one ``bulk_create()`` and writes its products with one
+``bulk_create(update_conflicts=True)``, so memory and query count depend on
+the chunk size rather than on the size of the feed.
+"""
+import contextlib
+import csv
+import decimal
+import itertools
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import caching
+from .models import Category, Product
+
+FORMATS = ('csv', 'jsonl')
+FIELDS = ('sku', 'name', 'description', 'price', 'quantity', 'category')
+# Product columns overwritten when a sku already exists.
+UPDATE_FIELDS = ['name', 'description', 'price', 'quantity', 'category', 'updated_at']
+CHUNK_SIZE = 1000
+
+
+class CatalogError(ValueError):
+    def __init__(self, line, message):
+        self.line = line
+        super().__init__(f'Line {line}: {message}')
+
+
+def read_rows(stream, format):
+    """Yield ``(line, row)`` for each record of a text ``stream`` in ``format``."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                raise CatalogError(line, f'invalid JSON ({e})')
+            if not isinstance(row, dict):
+                raise CatalogError(line, 'expected a JSON object')
+            yield line, row
+    else:
+        raise ValueError(f'Unknown catalog format {format!r}, expected one of {", ".join(FORMATS)}.')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def build_product(line, row):
+    """Unsaved ``Product`` for ``row``; ``category`` is left as the name in ``category_name``."""
+    missing = [field for field in FIELDS if row.get(field) in (None, '')]
+    if missing:
+        raise CatalogError(line, 'missing ' + ', '.join(missing))
+    try:
+        price = decimal.Decimal(str(row['price']))
+    except decimal.InvalidOperation:
+        raise CatalogError(line, f'invalid price {row["price"]!r}')
+    try:
+        quantity = int(row['quantity'])
+    except (TypeError, ValueError):
+        raise CatalogError(line, f'invalid quantity {row["quantity"]!r}')
+    product = Product(
+        sku=str(row['sku']).strip(),
+        name=str(row['name']).strip(),
+        description=str(row['description']),
+        price=price,
+        quantity=quantity,
+    )
+    try:
+        product.clean_fields(exclude=['category'])
+    except ValidationError as e:
+        raise CatalogError(line, '; '.join(
+            f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items()
+        ))
+    product.category_name = str(row['category']).strip()
+    return product
+
+
+def resolve_categories(names):
+    """Return ``({name: pk}, created)`` for ``names``, creating the missing categories.
+
+    Category names are not unique; an existing name maps to its oldest row.
+    """
+    categories = {}
+    for pk, name in Category.objects.filter(name__in=names).order_by('-pk').values_list('pk', 'name'):
+        categories[name] = pk
+    missing = [Category(name=name) for name in sorted(set(names) - categories.keys())]
+    if missing:
+        for category in Category.objects.bulk_create(missing):
+            categories[category.name] = category.pk
+        caching.invalidate_on_commit(Category)
+    return categories, len(missing)
+
+
+class ImportResult:
+    def __init__(self):
+        self.products = 0
+        self.categories_created = 0
+
+
+def upsert_chunk(rows, result):
+    """Upsert one chunk of ``(line, row)`` pairs; must run inside ``transaction.atomic()``."""
+    products = {}
+    for line, row in rows:
+        product = build_product(line, row)
+        # A sku may only be written once per statement; the last row wins.
+        products[product.sku] = product
+    products = list(products.values())
+    categories, created = resolve_categories({product.category_name for product in products})
+    result.categories_created += created
+    for product in products:
+        product.category_id = categories[product.category_name]
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=UPDATE_FIELDS,
+    )
+    caching.invalidate_on_commit(Product)
+    result.products += len(products)
+
+
+def import_products(rows, chunk_size=CHUNK_SIZE, atomic=True):
+    """Upsert ``(line, row)`` pairs chunk by chunk and return an ``ImportResult``.
+
+    With ``atomic`` the whole import is one transaction, otherwise each chunk
+    commits on its own and a bad row only aborts the chunk it is in.
+    """
+    result = ImportResult()
+    with transaction.atomic() if atomic else contextlib.nullcontext():
+        for chunk in chunked(rows, chunk_size):
+            with transaction.atomic():
+                upsert_chunk(chunk, result)
+    return result
+
+
+def export_rows(chunk_size=CHUNK_SIZE):
+    """Yield every product as a row dict, reading ``chunk_size`` rows at a time."""
+    queryset = Product.objects.order_by('pk').values_list(
+        'sku', 'name', 'description', 'price', 'quantity', 'category__name',
+    )
+    for values in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(FIELDS, values))
+
+
+def write_rows(stream, rows, format):
+    """Write row dicts to a text ``stream`` in ``format``; returns the number written."""
+    count = 0
+    if format == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+    elif format == 'jsonl':
+        for count, row in enumerate(rows, 1):
+            stream.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+    else:
+        raise ValueError(f'Unknown catalog format {format!r}, expected one of {", ".join(FORMATS)}.')
+    return count
@@ -0,0 +1,154 @@
+"""Static cost of a GraphQL operation, checked before anything is resolved.
+
+Every field returning an object or a list costs one unit per time it is
+resolved, i.e. the product of the sizes of the lists it is nested in.
+Connection edges count ``first`` items (the page size the resolver will use)
+and plain lists such as ``orderSet`` count ``LIST_SIZE``; scalars are free.
+So ``orders(first: 10) { edges { node { products { orderSet { id } } } } }``
+costs 1 + 1 + 10 + 10 + 100 = 122 and grows tenfold with each further level
+of the ``Order``/``Product`` cycle.
+
+Budgets come from ``settings.GRAPHQL_QUERY_COST`` and may be raised or
+lowered per client with ``settings.GRAPHQL_CLIENT_BUDGETS``, keyed by the
+``X-Api-Key`` request header.
+"""
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_composite_type,
+    is_list_type,
+    value_from_ast_untyped,
+)
+
+API_KEY_HEADER = 'X-Api-Key'
+
+DEFAULTS = {
+    'MAX_COST': 5000,
+    'MAX_DEPTH': 10,
+    'LIST_SIZE': 10,
+}
+
+
+def get_budget(request):
+    """``{'MAX_COST': ..., 'MAX_DEPTH': ..., 'LIST_SIZE': ...}`` for the client of ``request``."""
+    return get_budget_for(request.headers.get(API_KEY_HEADER))
+
+
+def get_budget_for(api_key):
+    """``get_budget()`` of the client sending ``api_key`` (None for anonymous clients)."""
+    budget = {**DEFAULTS, **getattr(settings, 'GRAPHQL_QUERY_COST', {})}
+    if api_key:
+        budget.update(getattr(settings, 'GRAPHQL_CLIENT_BUDGETS', {}).get(api_key, {}))
+    return budget
+
+
+class QueryCost:
+    def __init__(self, cost, depth, budget):
+        self.cost = cost
+        self.depth = depth
+        self.budget = budget
+
+    @property
+    def errors(self):
+        errors = []
+        max_depth = self.budget['MAX_DEPTH']
+        if max_depth is not None and self.depth > max_depth:
+            errors.append(GraphQLError(
+                f'Query depth {self.depth} exceeds the limit of {max_depth}.',
+                extensions={'code': 'QUERY_TOO_DEEP'},
+            ))
+        max_cost = self.budget['MAX_COST']
+        if max_cost is not None and self.cost > max_cost:
+            errors.append(GraphQLError(
+                f'Query cost {self.cost} exceeds the budget of {max_cost}.',
+                extensions={'code': 'QUERY_TOO_COMPLEX'},
+            ))
+        return errors
+
+    def as_extension(self):
+        return {
+            'requested': self.cost,
+            'limit': self.budget['MAX_COST'],
+            'depth': self.depth,
+            'depthLimit': self.budget['MAX_DEPTH'],
+        }
+
+
+def query_cost(schema, document, operation_name, variables, budget):
+    """``QueryCost`` of the operation ``operation_name`` of a validated ``document``."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return QueryCost(0, 0, budget)
+    variables = {
+        **{
+            definition.variable.name.value: value_from_ast_untyped(definition.default_value)
+            for definition in operation.variable_definitions
+            if definition.default_value is not None
+        },
+        **(variables or {}),
+    }
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    max_page = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    list_size = budget['LIST_SIZE']
+
+    def page_size(field_node):
+        for argument in field_node.arguments:
+            if argument.name.value == 'first':
+                first = value_from_ast_untyped(argument.value, variables)
+                if isinstance(first, int):
+                    return max(0, min(first, max_page))
+        return max_page
+
+    def walk(parent_type, selection_set, multiplier, page):
+        cost = depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                field = getattr(parent_type, 'fields', {}).get(name)
+                if field is None or name.startswith('__'):
+                    continue
+                field_cost, field_depth = multiplier if is_composite_type(get_named_type(field.type)) else 0, 1
+                if selection.selection_set is not None:
+                    inner = multiplier
+                    if is_list_type(get_nullable_type(field.type)):
+                        inner *= list_size if page is None else page
+                    inner_page = page_size(selection) if 'first' in field.args else None
+                    child_cost, child_depth = walk(
+                        get_named_type(field.type), selection.selection_set, inner, inner_page,
+                    )
+                    field_cost += child_cost
+                    field_depth += child_depth
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                field_cost, field_depth = walk(
+                    schema.get_type(condition.name.value) if condition else parent_type,
+                    selection.selection_set, multiplier, page,
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                field_cost, field_depth = walk(
+                    schema.get_type(fragment.type_condition.name.value),
+                    fragment.selection_set, multiplier, page,
+                )
+            else:
+                continue
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    root_type = schema.get_root_type(operation.operation)
+    cost, depth = walk(root_type, operation.selection_set, 1, None)
+    return QueryCost(cost, depth, budget)
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from graphql import GraphQLError, parse, validate
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class DocumentCache:
+    """LRU of parsed and validated GraphQL documents keyed by the sha256 of the query.
+
+    The same key doubles as the Automatic Persisted Query id, so a client that
+    already sent a query once can afterwards send only its hash. Documents
+    that fail validation are never cached.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, schema, query=None, sha256=None):
+        """Return ``(document, errors)`` for ``query`` or the persisted query ``sha256``."""
+        if sha256 is None:
+            sha256 = query_hash(query)
+        elif query is not None and query_hash(query) != sha256:
+            return None, [GraphQLError(
+                'provided sha does not match query',
+                extensions={'code': 'PERSISTED_QUERY_HASH_MISMATCH'},
+            )]
+
+        with self._lock:
+            document = self._documents.get(sha256)
+            if document is not None:
+                self._documents.move_to_end(sha256)
+                self.hits += 1
+                return document, []
+            self.misses += 1
+
+        if query is None:
+            return None, [GraphQLError(
+                'PersistedQueryNotFound', extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+            )]
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        errors = validate(schema, document)
+        if errors:
+            return None, errors
+
+        with self._lock:
+            self._documents[sha256] = document
+            self._documents.move_to_end(sha256)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return document, []
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._documents),
+            'maxsize': self.maxsize,
+        }
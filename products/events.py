@@ -0,0 +1,67 @@
+"""Order events published to GraphQL subscriptions.
+
+``post_save`` on ``Order`` publishes an ``order.created`` message for new
+orders and ``order.status`` / ``order.status.<pk>`` messages when the
+status is written (``workflow.change_status()`` sends ``post_save`` with
+``update_fields`` for the rows it updates). Messages are published once the
+transaction commits, so subscribers never see rolled back orders, and carry
+the order's columns so that subscribers do not have to read it back.
+"""
+import uuid
+from collections import OrderedDict
+
+from django.db import transaction
+
+from .pubsub import get_broker
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS = 'order.status'
+
+# Recent events decoded in this process, shared by all their subscribers.
+EVENT_CACHE_SIZE = 256
+_decoded = OrderedDict()
+
+
+def order_status_channel(pk):
+    return f'{ORDER_STATUS}.{pk}'
+
+
+def order_message(order):
+    return {
+        'id': uuid.uuid4().hex,
+        'fields': {field.attname: field.value_to_string(order) for field in order._meta.concrete_fields},
+    }
+
+
+def order_saved(order, created, update_fields, using):
+    if created:
+        channels = [ORDER_CREATED]
+    elif update_fields is not None and 'status' in update_fields:
+        channels = [ORDER_STATUS, order_status_channel(order.pk)]
+    else:
+        return
+    message = order_message(order)
+    broker = get_broker()
+
+    def publish():
+        for channel in channels:
+            broker.publish(channel, message)
+
+    transaction.on_commit(publish, using=using)
+
+
+def decode(model, message, loaders_factory):
+    """``(instance, loaders)`` for ``message``, built once per event and process.
+
+    Every subscriber of an event resolves the same instance with the same
+    loaders, so relations selected by many dashboards are read once.
+    """
+    cached = _decoded.get(message['id'])
+    if cached is None:
+        fields = message['fields']
+        names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+        instance = model.from_db(None, names, [model._meta.get_field(name).to_python(fields[name]) for name in names])
+        cached = _decoded[message['id']] = (instance, loaders_factory())
+        while len(_decoded) > EVENT_CACHE_SIZE:
+            _decoded.popitem(last=False)
+    return cached
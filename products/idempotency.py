@@ -0,0 +1,113 @@
+"""Idempotent mutations.
+
+A mutation sent with the ``settings.GRAPHQL_IDEMPOTENCY_HEADER`` header (or
+``extensions.idempotencyKey`` in the request body, for clients that cannot
+set headers) runs at most once per key and client: its ``X-Api-Key``, or
+else its address as ``products.throttling`` sees it. The key is claimed by
+inserting its ``IdempotencyKey`` row in the transaction that runs the
+mutation, and the response is stored in that same transaction:
+
+* a retry after the commit gets the stored response without executing
+  anything;
+* a retry while the first request is still running blocks on the row (on
+  SQLite, on the write lock) until that request commits, then gets its
+  response;
+* an operation that fails is rolled back together with its key, so a retry
+  runs it again.
+
+Reusing a key for another operation or other variables is an error. Keys
+live ``settings.GRAPHQL_IDEMPOTENCY_TTL`` seconds; expired rows are deleted
+as new keys are claimed.
+"""
+import hashlib
+import itertools
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import throttling
+from .complexity import API_KEY_HEADER
+from .documents import query_hash
+from .models import IdempotencyKey
+
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Expired keys are deleted by one in this many claims of each process.
+EVICT_EVERY = 100
+
+_claims = itertools.count()
+
+
+class KeyReused(Exception):
+    def __init__(self):
+        super().__init__('The idempotency key was already used for a different operation.')
+
+
+def get_key(request, data):
+    """The idempotency key sent with ``request``, or None."""
+    header = getattr(settings, 'GRAPHQL_IDEMPOTENCY_HEADER', 'Idempotency-Key')
+    key = request.headers.get(header) if header else None
+    if not key and isinstance(data, dict) and isinstance(data.get('extensions'), dict):
+        key = data['extensions'].get('idempotencyKey')
+    return str(key) if key else None
+
+
+def storage_key(request, key):
+    api_key = request.headers.get(API_KEY_HEADER)
+    client = f'key:{api_key}' if api_key else f'ip:{throttling.client_address(request)}'
+    return storage_key_for(client, key)
+
+
+def storage_key_for(client, key):
+    return hashlib.sha256(f'{client}\n{key}'.encode()).hexdigest()
+
+
+def fingerprint(query, sha256, variables, operation_name):
+    payload = json.dumps([sha256 or query_hash(query), operation_name, variables], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim(key, fingerprint):
+    """Insert the row of ``key``; returns the stored row instead when the key is taken."""
+    now = timezone.now()
+    if next(_claims) % EVICT_EVERY == 0:
+        IdempotencyKey.objects.filter(expires_at__lt=now).delete()
+    expires_at = now + timedelta(seconds=getattr(settings, 'GRAPHQL_IDEMPOTENCY_TTL', 24 * 3600))
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key=key, fingerprint=fingerprint, expires_at=expires_at)
+        return None
+    except IntegrityError:
+        pass
+    stored = IdempotencyKey.objects.get(pk=key)
+    if stored.expires_at > now:
+        return stored
+    IdempotencyKey.objects.filter(pk=key).update(
+        fingerprint=fingerprint, expires_at=expires_at, status_code=None, response='',
+    )
+    return None
+
+
+def execute_once(key, fingerprint, execute):
+    """``(response, status_code, replayed)`` of the operation claimed by ``key``.
+
+    ``execute()`` runs the operation and returns ``(response, status_code,
+    succeeded)``; only succeeded responses are stored, anything else is
+    rolled back with the key. Raises ``KeyReused`` for a different
+    ``fingerprint``.
+    """
+    with transaction.atomic():
+        stored = claim(key, fingerprint)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                raise KeyReused()
+            return stored.response, stored.status_code, True
+        response, status_code, succeeded = execute()
+        if succeeded:
+            IdempotencyKey.objects.filter(pk=key).update(response=response, status_code=status_code)
+        else:
+            transaction.set_rollback(True)
+        return response, status_code, False
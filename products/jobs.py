@@ -0,0 +1,155 @@
+"""Background jobs kept in the ``Job`` table.
+
+``enqueue(job(func, **kwargs))`` inserts the job once the current
+transaction commits, so a request only pays for one ``INSERT`` and rolled
+back work never runs. ``manage.py run_workers`` starts worker processes that
+claim due jobs with a conditional ``UPDATE`` (safe with any number of
+workers and without ``SELECT ... FOR UPDATE``), call them, and retry failures
+with exponential backoff until ``max_attempts``. A claimed job is leased to
+its worker for ``LEASE`` seconds; a worker that dies loses its jobs to the
+next worker once the lease expires.
+
+Jobs run at least once: a job may run again when its worker dies or
+overruns the lease, so jobs must tolerate being repeated. The ``key`` of a
+job makes enqueueing idempotent: a job enqueued again with the key of an
+existing job is dropped.
+
+Settings come from ``settings.JOBS``.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONCURRENCY': 2,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 2,
+    'MAX_BACKOFF': 600,
+    'LEASE': 300,
+    'POLL_INTERVAL': 1,
+    'BATCH_SIZE': 10,
+    'KEEP_DONE': 7 * 24 * 3600,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'JOBS', {})}
+
+
+def job(func, *, key=None, delay=0, max_attempts=None, **kwargs):
+    """An unsaved ``Job`` calling ``func(**kwargs)``; ``kwargs`` must be JSON-serialisable."""
+    name = func if isinstance(func, str) else f'{func.__module__}.{func.__qualname__}'
+    return Job(
+        name=name,
+        kwargs=kwargs,
+        key=key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or get_options()['MAX_ATTEMPTS'],
+    )
+
+
+def enqueue(*jobs, using=None):
+    """Insert ``jobs`` with one statement when the current transaction commits.
+
+    Outside a transaction they are inserted right away. A failure to insert
+    is logged rather than raised: the transaction has committed by then and
+    its caller must not be told otherwise.
+    """
+    def insert():
+        Job.objects.using(using).bulk_create(jobs, ignore_conflicts=True)
+
+    transaction.on_commit(insert, using=using, robust=True)
+
+
+def backoff(attempts, options):
+    """Seconds before retrying a job that failed its ``attempts``-th time, with jitter."""
+    delay = min(options['BACKOFF'] * 2 ** (attempts - 1), options['MAX_BACKOFF'])
+    return delay * random.uniform(0.5, 1)
+
+
+class Worker:
+    """Claims and runs due jobs; one per process started by ``run_workers``."""
+
+    def __init__(self, name=None, **options):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.options = {**get_options(), **{key.upper(): value for key, value in options.items()}}
+        self._purged_at = 0
+
+    def claim(self):
+        """Lease up to ``BATCH_SIZE`` due jobs to this worker and return them."""
+        now = timezone.now()
+        due = Job.objects.filter(
+            Q(status=Job.QUEUED) | Q(status=Job.RUNNING), run_at__lte=now,
+        ).order_by('run_at', 'id')
+        candidates = list(due.only('status', 'run_at', 'attempts', 'max_attempts')[:self.options['BATCH_SIZE']])
+        # Workers racing for the same rows each win some of them: only the
+        # first UPDATE of a row still matches its status and run_at.
+        random.shuffle(candidates)
+        claimed = []
+        for candidate in candidates:
+            current = Job.objects.filter(pk=candidate.pk, status=candidate.status, run_at=candidate.run_at)
+            if candidate.status == Job.RUNNING and candidate.attempts >= candidate.max_attempts:
+                # The last attempt overran its lease or its worker died.
+                current.update(status=Job.FAILED, finished_at=now, last_error='Lease expired.')
+                continue
+            lease = now + timedelta(seconds=self.options['LEASE'])
+            if current.update(status=Job.RUNNING, run_at=lease, locked_by=self.name, attempts=F('attempts') + 1):
+                claimed.append(candidate.pk)
+        return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+    def run(self, job):
+        mine = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=self.name)
+        try:
+            import_string(job.name)(**job.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning('Job %s %s failed (attempt %d of %d)', job.pk, job.name, job.attempts, job.max_attempts)
+            if job.attempts >= job.max_attempts:
+                mine.update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+            else:
+                retry_at = timezone.now() + timedelta(seconds=backoff(job.attempts, self.options))
+                mine.update(status=Job.QUEUED, run_at=retry_at, locked_by='', last_error=error)
+            return False
+        mine.update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+        return True
+
+    def run_pending(self):
+        """Run jobs until none is due; returns how many ran."""
+        count = 0
+        while True:
+            jobs = self.claim()
+            if not jobs:
+                return count
+            for job in jobs:
+                self.run(job)
+            count += len(jobs)
+
+    def purge(self):
+        """Delete jobs that finished more than ``KEEP_DONE`` seconds ago, at most once a minute."""
+        if time.monotonic() - self._purged_at < 60:
+            return
+        self._purged_at = time.monotonic()
+        before = timezone.now() - timedelta(seconds=self.options['KEEP_DONE'])
+        Job.objects.filter(status=Job.DONE, finished_at__lt=before).delete()
+
+    def serve(self, stopping=lambda: False):
+        """Run jobs as they become due until ``stopping()`` is true."""
+        while not stopping():
+            close_old_connections()
+            if not self.run_pending():
+                self.purge()
+                time.sleep(self.options['POLL_INTERVAL'])
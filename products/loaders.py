@@ -0,0 +1,174 @@
+import asyncio
+from collections import defaultdict
+
+from django.db.models import F
+
+from .aio import in_async_context
+from .models import Category, Order, OrderItem, OrderStatusChange, Product
+from .optimizer import prefetch_attr
+
+
+class DataLoader:
+    """Batch the lookups of one relation while a request is being resolved.
+
+    graphql-core resolves sync fields depth first, so keys cannot simply be
+    collected and flushed at the end of a tick. Instead, whenever a list of
+    rows is handed to the response, the keys of its relations are queued with
+    ``prime()``. The first ``load()`` on a level then fetches every queued key
+    with one ``IN (...)`` query and the remaining siblings hit the cache.
+
+    ``aload()`` is the same for async execution, where siblings resolve
+    concurrently: keys queued within one loop iteration share a query and
+    later callers wait on the batch already in flight for their key.
+
+    ``fetch(keys)`` returns the queryset of the rows for ``keys``; rows are
+    matched back to keys by primary key, or grouped into lists by the
+    ``group_by`` attribute for to-many relations.
+    """
+
+    def __init__(self, loaders, fetch, group_by=None):
+        self.loaders = loaders
+        self.fetch = fetch
+        self.group_by = group_by
+        self._cache = {}
+        self._queue = {}
+        self._inflight = {}
+
+    def prime(self, key):
+        if key is not None and key not in self._cache:
+            self._queue[key] = None
+
+    def _take_batch(self, key):
+        self._queue[key] = None
+        keys = [k for k in self._queue if k not in self._inflight]
+        self._queue.clear()
+        return keys
+
+    def _store(self, keys, rows):
+        self.loaders.prime(rows)
+        if self.group_by is None:
+            by_key = {row.pk: row for row in rows}
+            values = [by_key.get(key) for key in keys]
+        else:
+            groups = defaultdict(list)
+            for row in rows:
+                groups[getattr(row, self.group_by)].append(row)
+            values = [groups[key] for key in keys]
+        self._cache.update(zip(keys, values))
+
+    def load(self, key):
+        if key not in self._cache:
+            keys = self._take_batch(key)
+            self._store(keys, list(self.fetch(keys)))
+        return self._cache[key]
+
+    async def aload(self, key):
+        if key not in self._cache and key not in self._inflight:
+            # Give sibling resolvers one loop iteration to queue their keys.
+            self._queue[key] = None
+            await asyncio.sleep(0)
+        if key not in self._cache:
+            batch = self._inflight.get(key)
+            if batch is None:
+                keys = self._take_batch(key)
+                batch = asyncio.ensure_future(self._aload_batch(keys))
+                for k in keys:
+                    self._inflight[k] = batch
+            await batch
+        return self._cache[key]
+
+    async def _aload_batch(self, keys):
+        try:
+            self._store(keys, [row async for row in self.fetch(keys)])
+        finally:
+            for key in keys:
+                self._inflight.pop(key, None)
+
+
+class Loaders:
+    """All loaders of a single request, see ``get_loaders()``."""
+
+    def __init__(self):
+        self.category = DataLoader(self, lambda keys: Category.objects.filter(pk__in=keys))
+        self.product = DataLoader(self, lambda keys: Product.objects.filter(pk__in=keys))
+        self.order = DataLoader(self, lambda keys: Order.objects.filter(pk__in=keys))
+        self.products_by_category = DataLoader(
+            self, lambda keys: Product.objects.filter(category_id__in=keys), 'category_id',
+        )
+        self.items_by_order = DataLoader(
+            self, lambda keys: OrderItem.objects.filter(order_id__in=keys).order_by('pk'), 'order_id',
+        )
+        self.products_by_order = DataLoader(
+            self,
+            lambda keys: Product.objects.filter(orderitem__order_id__in=keys).annotate(
+                order_key=F('orderitem__order_id'),
+            ),
+            'order_key',
+        )
+        self.status_history_by_order = DataLoader(
+            self, lambda keys: OrderStatusChange.objects.filter(order_id__in=keys).order_by('pk'), 'order_id',
+        )
+        self.items_by_product = DataLoader(
+            self, lambda keys: OrderItem.objects.filter(product_id__in=keys).order_by('pk'), 'product_id',
+        )
+        self.orders_by_product = DataLoader(
+            self,
+            lambda keys: Order.objects.filter(orderitem__product_id__in=keys).annotate(
+                product_key=F('orderitem__product_id'),
+            ).order_by('pk'),
+            'product_key',
+        )
+        self._relations = {
+            Category: {'product_set': (self.products_by_category, 'pk')},
+            Product: {
+                'category': (self.category, 'category_id'),
+                'orderitem_set': (self.items_by_product, 'pk'),
+                'order_set': (self.orders_by_product, 'pk'),
+            },
+            Order: {
+                'orderitem_set': (self.items_by_order, 'pk'),
+                'products': (self.products_by_order, 'pk'),
+                'status_history': (self.status_history_by_order, 'pk'),
+            },
+            OrderItem: {
+                'product': (self.product, 'product_id'),
+                'order': (self.order, 'order_id'),
+            },
+        }
+
+    def prime(self, instances):
+        """Queue the relations of rows about to be resolved; returns them as a list."""
+        instances = list(instances)
+        for instance in instances:
+            deferred = instance.get_deferred_fields()
+            for loader, attname in self._relations.get(type(instance), {}).values():
+                if attname not in deferred:
+                    loader.prime(getattr(instance, attname))
+        return instances
+
+    def load_related(self, instance, name):
+        """Resolve relation ``name`` of ``instance``.
+
+        Rows already fetched by ``select_related()`` or ``prefetch_related()``
+        are returned as is, anything else goes through the batching loader
+        (as an awaitable under async execution).
+        """
+        prefetched = getattr(instance, prefetch_attr(name), None)
+        if prefetched is not None:
+            return prefetched
+        if name in instance._state.fields_cache:
+            return getattr(instance, name)
+        loader, attname = self._relations[type(instance)][name]
+        key = getattr(instance, attname)
+        return loader.aload(key) if in_async_context() else loader.load(key)
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request, creating them on first use."""
+    context = info.context
+    if context is None:
+        return Loaders()
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = context.loaders = Loaders()
+    return loaders
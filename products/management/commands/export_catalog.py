@@ -0,0 +1,29 @@
+
+from django.core.management.base import BaseCommand
+
+from products import catalog
+
+from .import_catalog import guess_format
+
+
+class Command(BaseCommand):
+    help = 'Write every product as CSV or JSON Lines, reading the table in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='File to write, "-" (default) for standard output.')
+        parser.add_argument(
+            '--format', choices=catalog.FORMATS,
+            help='Output format; guessed from the file extension, jsonl for standard output.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=catalog.CHUNK_SIZE)
+
+    def handle(self, path='-', format=None, chunk_size=catalog.CHUNK_SIZE, **options):
+        if format is None:
+            format = 'jsonl' if path == '-' else guess_format(path)
+        stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            count = catalog.write_rows(stream, catalog.export_rows(chunk_size), format)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        self.stderr.write(f'Exported {count} products.')
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import catalog
+
+
+class Command(BaseCommand):
+    help = 'Create or update products by sku from a CSV or JSON Lines file, streamed in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, "-" for standard input.')
+        parser.add_argument(
+            '--format', choices=catalog.FORMATS,
+            help='Input format; guessed from the file extension by default.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=catalog.CHUNK_SIZE)
+        parser.add_argument(
+            '--atomic', action='store_true',
+            help='Import everything in one transaction instead of committing each chunk.',
+        )
+
+    def handle(self, path, format=None, chunk_size=catalog.CHUNK_SIZE, atomic=False, **options):
+        format = format or guess_format(path)
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            result = catalog.import_products(
+                catalog.read_rows(stream, format), chunk_size=chunk_size, atomic=atomic,
+            )
+        except catalog.CatalogError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.products} products, created {result.categories_created} categories.'
+        ))
+
+
+def guess_format(path):
+    for format in catalog.FORMATS:
+        if path.endswith('.' + format):
+            return format
+    if path.endswith('.json'):
+        return 'jsonl'
+    raise CommandError('Cannot tell the format of the input, pass --format.')
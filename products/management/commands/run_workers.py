@@ -0,0 +1,74 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            help='Worker processes; 1 runs the worker in this process. Defaults to JOBS["CONCURRENCY"].',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no job is due instead of waiting for new ones.',
+        )
+
+    def handle(self, concurrency=None, burst=False, **options):
+        from products import jobs
+
+        concurrency = concurrency or jobs.get_options()['CONCURRENCY']
+        if concurrency == 1:
+            ran = work(burst)
+            if burst:
+                self.stdout.write(self.style.SUCCESS(f'Ran {ran} jobs.'))
+            return
+
+        stop = multiprocessing.Event()
+        # Setting the event from a signal handler could deadlock on its lock.
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stopping.append(True))
+        # Children must open their own database connections.
+        connections.close_all()
+        processes = {}
+        while True:
+            for index in range(concurrency):
+                process = processes.get(index)
+                if process is not None and (process.is_alive() or burst or stop.is_set()):
+                    continue
+                if process is not None:
+                    self.stderr.write(f'Worker {index} exited with code {process.exitcode}, restarting it.')
+                process = processes[index] = multiprocessing.Process(
+                    target=work, args=(burst, stop), name=f'run_workers-{index}',
+                )
+                process.start()
+            if burst or stop.is_set():
+                break
+            time.sleep(1)
+            if stopping:
+                stop.set()
+        for process in processes.values():
+            process.join()
+
+
+def work(burst, stop=None):
+    """Entry point of one worker; returns the number of jobs run in burst mode."""
+    import django
+
+    django.setup()
+    from products import jobs
+
+    if stop is not None:
+        # The parent relays SIGINT/SIGTERM through ``stop``; the current job finishes first.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    worker = jobs.Worker()
+    if burst:
+        return worker.run_pending()
+    worker.serve(stopping=stop.is_set if stop is not None else lambda: False)
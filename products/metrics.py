@@ -0,0 +1,74 @@
+"""In-process metrics exported in the Prometheus text format at ``/metrics``.
+
+Each worker process keeps its own counts; scrape every worker (or sum them
+in the query) when running several.
+"""
+import bisect
+import threading
+
+# Seconds, from a cached hit to a request that pins the worker.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # one count per bucket plus +Inf, then the sum
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_value, values in sorted(series.items()):
+            label = f'{self.label}="{escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{label}}} {values[-1]}'
+            yield f'{self.name}_count{{{label}}} {cumulative}'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram(
+    'graphql_request_duration_seconds',
+    'Time spent executing GraphQL operations.',
+    'operation',
+)
+resolver_duration = Histogram(
+    'graphql_resolver_duration_seconds',
+    'Time spent in resolvers of traced operations, per field.',
+    'field',
+)
+sql_duration = Histogram(
+    'graphql_resolver_sql_duration_seconds',
+    'Duration of each SQL query of traced operations, per field that ran it.',
+    'field',
+)
+
+REGISTRY = [request_duration, resolver_duration, sql_duration]
+
+
+def render():
+    return '\n'.join(line for metric in REGISTRY for line in metric.collect()) + '\n'
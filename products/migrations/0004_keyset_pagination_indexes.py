@@ -0,0 +1,66 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_order_alter_category_options_orderitem_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "В обработке"),
+                    ("accepted", "Заказ принят"),
+                    ("prepare", "Заказ готовиться"),
+                    ("created", "Заказ готов к выдаче"),
+                    ("delivery", "Передан курьеру"),
+                    ("canceled", "Отменен"),
+                    ("completed", "Выполнен"),
+                    ("refunded", "Возврат"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["name", "id"], name="products_ca_name_21d947_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["created_at", "id"], name="products_or_created_56b5c4_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "created_at", "id"],
+                name="products_or_status_40608b_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["name", "id"], name="products_pr_name_37bd5c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "name", "id"], name="products_pr_categor_d364a0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price"], name="products_pr_price_9b1a5f_idx"),
+        ),
+    ]
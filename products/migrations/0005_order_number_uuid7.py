@@ -0,0 +1,55 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:10
+
+import uuid
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def uuid7(timestamp_ms, rand):
+    """products.numbering.uuid7() as of this migration, frozen here."""
+    rand &= (1 << 74) - 1
+    value = (
+        (timestamp_ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | (rand >> 62) << 64
+        | 0b10 << 62
+        | rand & ((1 << 62) - 1)
+    )
+    return uuid.UUID(int=value)
+
+
+def order_numbers_to_uuid7(apps, schema_editor):
+    """Re-key existing uuid4 order numbers as UUIDv7 stamped with created_at.
+
+    The random bits of the old number are kept, so the new value is derived
+    from it deterministically and cannot clash with another row.
+    """
+    Order = apps.get_model("products", "Order")
+    batch = []
+    orders = Order.objects.only("pk", "order_number", "created_at").order_by("pk")
+    for order in orders.iterator(chunk_size=BATCH_SIZE):
+        if order.order_number.version == 7:
+            continue
+        order.order_number = uuid7(
+            int(order.created_at.timestamp() * 1000), order.order_number.int
+        )
+        batch.append(order)
+        if len(batch) == BATCH_SIZE:
+            Order.objects.bulk_update(batch, ["order_number"])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ["order_number"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        # The old random numbers cannot be restored; reversing keeps the v7 ones.
+        migrations.RunPython(order_numbers_to_uuid7, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import products.models
+
+SQLITE_CREATE = [
+    # External content: the index reads name and description from
+    # products_product instead of storing a second copy of them.
+    """
+    CREATE VIRTUAL TABLE products_product_fts USING fts5(
+        name, description,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    # Names weigh ten times as much as descriptions in the rank column.
+    "INSERT INTO products_product_fts(products_product_fts, rank) VALUES('rank', 'bm25(10.0, 1.0)')",
+    """
+    CREATE TRIGGER products_product_fts_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO products_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_product_fts_delete AFTER DELETE ON products_product BEGIN
+        INSERT INTO products_product_fts(products_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    # Stock and price updates leave the index alone.
+    """
+    CREATE TRIGGER products_product_fts_update AFTER UPDATE OF name, description ON products_product BEGIN
+        INSERT INTO products_product_fts(products_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO products_product_fts(products_product_fts) VALUES('rebuild')",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER products_product_fts_update",
+    "DROP TRIGGER products_product_fts_delete",
+    "DROP TRIGGER products_product_fts_insert",
+    "DROP TABLE products_product_fts",
+]
+POSTGRESQL_CREATE = [
+    """
+    ALTER TABLE products_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', description), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX products_product_search_vector ON products_product USING gin (search_vector)",
+]
+POSTGRESQL_DROP = [
+    "ALTER TABLE products_product DROP COLUMN search_vector",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+
+    return operation
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_product_sku"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchIndex",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("description", models.TextField()),
+                (
+                    "document",
+                    products.models.SearchDocumentField(
+                        db_column="products_product_fts"
+                    ),
+                ),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "products_product_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(
+            run({"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}),
+            run({"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP}),
+        ),
+    ]
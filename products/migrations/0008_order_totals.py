@@ -0,0 +1,70 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:50
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    """Price existing lines at the current product price and total every order.
+
+    Three set-based UPDATEs, so the migration does not load rows into Python.
+    The price at purchase time was never recorded; today's price is the best
+    estimate available.
+    """
+    Order = apps.get_model("products", "Order")
+    OrderItem = apps.get_model("products", "OrderItem")
+    Product = apps.get_model("products", "Product")
+    OrderItem.objects.update(
+        unit_price=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("price"))
+    )
+    OrderItem.objects.update(total=F("unit_price") * F("quantity"))
+    line_totals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum("total"))
+        .values("total")
+    )
+    Order.objects.update(total=Coalesce(Subquery(line_totals), 0, output_field=models.DecimalField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["created_at", "status", "total"],
+                name="products_or_created_c9bbd4_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["order", "product", "quantity", "total"],
+                name="products_or_order_i_e516d7_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_order_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatusChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В обработке"),
+                            ("accepted", "Заказ принят"),
+                            ("prepare", "Заказ готовиться"),
+                            ("created", "Заказ готов к выдаче"),
+                            ("delivery", "Передан курьеру"),
+                            ("canceled", "Отменен"),
+                            ("completed", "Выполнен"),
+                            ("refunded", "Возврат"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В обработке"),
+                            ("accepted", "Заказ принят"),
+                            ("prepare", "Заказ готовиться"),
+                            ("created", "Заказ готов к выдаче"),
+                            ("delivery", "Передан курьеру"),
+                            ("canceled", "Отменен"),
+                            ("completed", "Выполнен"),
+                            ("refunded", "Возврат"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "update_date"], name="products_or_status_3882d9_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderstatuschange",
+            name="order",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="status_history",
+                to="products.order",
+            ),
+        ),
+    ]
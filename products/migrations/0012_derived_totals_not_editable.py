@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_idempotency_keys"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="total",
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=8),
+        ),
+    ]
@@ -1,10 +1,11 @@
-from django.db import models
-from django.db.models.signals import pre_save
+from django.db import IntegrityError, models, transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-import uuid
+from django.utils import timezone
 from django.core.validators import EmailValidator
-import secrets
-import string
+from . import caching, events, numbering
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -16,8 +17,13 @@ class Category(models.Model):
         ordering = ('name',)
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
+        indexes = [
+            models.Index(fields=['name', 'id']),
+        ]
 
 class Product(models.Model):
+    # Supplier stock keeping unit, the key catalog imports upsert on.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=8, decimal_places=2)
@@ -33,6 +39,51 @@ class Product(models.Model):
         ordering = ('name',)
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['category', 'name', 'id']),
+            models.Index(fields=['price']),
+        ]
+
+class SearchDocumentField(models.TextField):
+    """The hidden column named after an FTS5 table, the left side of ``MATCH``."""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class ProductSearchIndex(models.Model):
+    """SQLite FTS5 index over product names and descriptions.
+
+    An external-content table: it stores only the index, keyed by the product
+    ``rowid``, and triggers created by migration 0007 keep it in sync with
+    every insert, update and delete, bulk ones included. ``rank`` is BM25 with
+    names weighted above descriptions; lower is more relevant. PostgreSQL uses
+    a ``search_vector`` column on the product table instead, see ``search``.
+    """
+    product = models.OneToOneField(
+        Product, models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='search_index',
+    )
+    name = models.TextField()
+    description = models.TextField()
+    document = SearchDocumentField(db_column='products_product_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    caching.invalidate_on_commit(sender)
 
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -57,24 +108,173 @@ class Order(models.Model):
     update_date = models.DateTimeField(auto_now=True)
     products = models.ManyToManyField(Product, through='OrderItem')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Sum of the line totals, written with the lines by CreateOrder and
+    # recomputed when a line is saved or deleted on its own.
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    # Attempts at inserting a new order before a number collision is fatal.
+    NUMBER_ATTEMPTS = 5
+
     def __str__(self):
         return f"Order #{self.pk}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        for attempt in range(1, self.NUMBER_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == self.NUMBER_ATTEMPTS or not self._discard_taken_numbers():
+                    raise
+
+    def _discard_taken_numbers(self):
+        """Clear generated numbers that already exist so pre_save draws new ones."""
+        taken = Order.objects.filter(
+            Q(order_number=self.order_number) | Q(receipt_number=self.receipt_number)
+        ).values_list('order_number', 'receipt_number')
+        for order_number, receipt_number in taken:
+            if order_number == self.order_number:
+                self.order_number = None
+            if receipt_number == self.receipt_number:
+                self.receipt_number = ''
+        return bool(taken)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['status', 'created_at', 'id']),
+            # Covers the sales aggregates over a date range.
+            models.Index(fields=['created_at', 'status', 'total']),
+            models.Index(fields=['status', 'update_date']),
+        ]
+
+@receiver(post_save, sender=Order)
+def publish_order_events(sender, instance, created, update_fields=None, using=None, **kwargs):
+    events.order_saved(instance, created, update_fields, using)
+
+class OrderStatusChange(models.Model):
+    """Append-only log of order status transitions, see ``workflow``."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
 @receiver(pre_save, sender=Order)
 def generate_order_number(sender, instance, **kwargs):
     if not instance.order_number:
-        instance.order_number = uuid.uuid4()
+        instance.order_number = numbering.new_order_number()
 
 @receiver(pre_save, sender=Order)
 def generate_receipt_number(sender, instance, **kwargs):
     if not instance.receipt_number:
-        receipt_number = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(7))
-        instance.receipt_number = receipt_number
+        instance.receipt_number = numbering.new_receipt_number()
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # Product price at the time of purchase and unit_price * quantity.
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2, editable=False)
+    total = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity}"
+
+    def priced(self):
+        """Snapshot the current product price unless already set and compute ``total``; returns ``self``.
+
+        ``save()`` does this by itself, call it on lines passed to ``bulk_create()``.
+        """
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        # Prices assigned in code may still be strings.
+        self.unit_price = self._meta.get_field('unit_price').to_python(self.unit_price)
+        self.total = self.unit_price * self.quantity
+        return self
+
+    class Meta:
+        indexes = [
+            # Lets the revenue by category aggregate read the lines of an
+            # order from the index alone.
+            models.Index(fields=['order', 'product', 'quantity', 'total']),
+        ]
+
+@receiver(pre_save, sender=OrderItem)
+def price_order_item(sender, instance, **kwargs):
+    instance.priced()
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def update_order_total(sender, instance, using=None, origin=None, **kwargs):
+    """Recompute ``Order.total`` in one UPDATE, e.g. after a line is edited in the admin.
+
+    CreateOrder bulk-creates the lines of a new order, which sends no signals.
+    """
+    if isinstance(origin, Order):
+        return  # Deleted along with its order.
+    line_totals = (
+        OrderItem.objects.using(using).filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum('total'))
+        .values('total')
+    )
+    Order.objects.using(using).filter(pk=instance.order_id).update(
+        total=Coalesce(Subquery(line_totals), 0, output_field=models.DecimalField())
+    )
+
+class Job(models.Model):
+    """A call of ``name`` (a dotted path) with ``kwargs``, run by ``manage.py run_workers``.
+
+    See ``jobs``. ``run_at`` is when a queued job becomes due and, while it is
+    running, when its worker's lease expires.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    # Jobs enqueued again with the key of an existing job are dropped.
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.name} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Due jobs, and expired leases, in the order workers claim them.
+            models.Index(fields=['status', 'run_at', 'id']),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+
+class IdempotencyKey(models.Model):
+    """The response to a mutation sent with an ``Idempotency-Key``, see ``idempotency``."""
+    # sha256 of the client and its key, so keys of different clients never meet.
+    key = models.CharField(max_length=64, primary_key=True)
+    # sha256 of the operation and its variables, which a retry must repeat.
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.TextField(blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
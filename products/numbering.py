@@ -0,0 +1,46 @@
+import os
+import secrets
+import string
+import time
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+RECEIPT_ALPHABET = string.ascii_uppercase + string.digits
+RECEIPT_LENGTH = 7
+
+
+def uuid7(timestamp_ms=None, rand=None):
+    """RFC 9562 UUID version 7: a 48-bit Unix time in milliseconds, then 74 random bits.
+
+    Values generated later sort later, so inserts land at the right edge of
+    the unique index instead of splitting random pages like ``uuid4()``.
+    """
+    if timestamp_ms is None:
+        timestamp_ms = time.time_ns() // 1_000_000
+    if rand is None:
+        rand = int.from_bytes(os.urandom(10), 'big')
+    rand &= (1 << 74) - 1
+    value = (
+        (timestamp_ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | (rand >> 62) << 64
+        | 0b10 << 62
+        | rand & ((1 << 62) - 1)
+    )
+    return uuid.UUID(int=value)
+
+
+def random_receipt_number():
+    return ''.join(secrets.choice(RECEIPT_ALPHABET) for _ in range(RECEIPT_LENGTH))
+
+
+def new_order_number():
+    return import_string(getattr(settings, 'ORDER_NUMBER_GENERATOR', 'products.numbering.uuid7'))()
+
+
+def new_receipt_number():
+    return import_string(
+        getattr(settings, 'RECEIPT_NUMBER_GENERATOR', 'products.numbering.random_receipt_number')
+    )()
@@ -0,0 +1,97 @@
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def prefetch_attr(name):
+    """Attribute that holds the rows prefetched for relation ``name``."""
+    return f'_prefetched_{name}'
+
+
+def optimize(queryset, info, path=(), only=()):
+    """Trim ``queryset`` to what the client selected below the current field.
+
+    Scalar fields become ``only()`` columns, forward foreign keys are joined
+    with ``select_related()`` and reverse / many-to-many sets are fetched with
+    ``prefetch_related()`` into ``prefetch_attr()``, recursively. Fields that
+    do not map to a model field (custom resolvers, ``__typename``) are ignored.
+
+    ``path`` descends into nested selections first, e.g. ``('edges', 'node')``
+    for a connection, and ``only`` lists columns that are always loaded.
+    """
+    field_nodes = info.field_nodes
+    for name in path:
+        field_nodes = _selected_fields(field_nodes, info).get(name, [])
+    return _optimize(queryset, field_nodes, info, *only)
+
+
+def _optimize(queryset, field_nodes, info, *required):
+    only, select_related, prefetch = _plan(queryset.model, field_nodes, info, '')
+    queryset = queryset.only(*only, *required)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def _plan(model, field_nodes, info, prefix):
+    only = [prefix + model._meta.pk.name]
+    select_related = []
+    prefetch = []
+    fields = _model_fields(model)
+    for name, nodes in _selected_fields(field_nodes, info).items():
+        field = fields.get(to_snake_case(name))
+        if field is None:
+            continue
+        if not field.is_relation:
+            only.append(prefix + field.name)
+        elif field.many_to_one or (field.one_to_one and field.concrete):
+            path = prefix + field.name
+            only.append(path)
+            select_related.append(path)
+            nested = _plan(field.related_model, nodes, info, path + '__')
+            only += nested[0]
+            select_related += nested[1]
+            prefetch += nested[2]
+        elif field.one_to_many or field.many_to_many:
+            accessor = field.name if field.concrete else field.get_accessor_name()
+            required = (field.field.name,) if field.one_to_many else ()
+            related = field.related_model._default_manager.all()
+            if not related.ordered:
+                related = related.order_by('pk')
+            prefetch.append(Prefetch(
+                prefix + accessor,
+                queryset=_optimize(related, nodes, info, *required),
+                to_attr=prefetch_attr(accessor),
+            ))
+    return only, select_related, prefetch
+
+
+def _model_fields(model):
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+def _selected_fields(field_nodes, info):
+    """Merge the sub-selections of ``field_nodes`` by field name, expanding fragments."""
+    selected = {}
+
+    def collect(selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                selected.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                collect(info.fragments[selection.name.value].selection_set)
+
+    for node in field_nodes:
+        if node.selection_set is not None:
+            collect(node.selection_set)
+    return selected
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+
+from .aio import in_async_context
+from .loaders import get_loaders
+from .optimizer import optimize
+
+
+def encode_cursor(instance, ordering):
+    values = [getattr(instance, field.lstrip('-')) for field in ordering]
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise GraphQLError(f'Invalid cursor: {cursor}')
+    return values
+
+
+def keyset_filter(ordering, values):
+    """Rows strictly after ``values`` in ``ordering``, as ``(a > x) OR (a = x AND b > y) ...``."""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(ordering[:i], values):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def connection_from_queryset(connection_type, queryset, info, ordering, first=None, after=None):
+    """Resolve one page of ``queryset`` as ``connection_type`` using keyset pagination.
+
+    ``ordering`` must be unique (end it with the primary key) so that a cursor
+    identifies exactly one position. Only ``first + 1`` rows are read however
+    deep into the table the page is. Ordering fields may be annotations of
+    ``queryset``, such as a search rank.
+    """
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if first is None:
+        first = max_limit
+    elif first < 0:
+        raise GraphQLError('Argument "first" must be a non-negative integer.')
+    first = min(first, max_limit)
+
+    columns = [field.lstrip('-') for field in ordering]
+    queryset = optimize(
+        queryset, info, path=('edges', 'node'),
+        only=[column for column in columns if column not in queryset.query.annotations],
+    ).order_by(*ordering)
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(after, ordering)))
+    queryset = queryset[:first + 1]
+
+    if in_async_context():
+        return _aconnection(connection_type, queryset, info, ordering, first, after)
+    return _connection(connection_type, list(queryset), info, ordering, first, after)
+
+
+async def _aconnection(connection_type, queryset, info, ordering, first, after):
+    rows = [row async for row in queryset]
+    return _connection(connection_type, rows, info, ordering, first, after)
+
+
+def _connection(connection_type, rows, info, ordering, first, after):
+    rows = get_loaders(info).prime(rows)
+    has_next_page = len(rows) > first
+    rows = rows[:first]
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row, ordering)) for row in rows
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=after is not None,
+            has_next_page=has_next_page,
+        ),
+    )
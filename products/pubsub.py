@@ -0,0 +1,70 @@
+"""Publish/subscribe for GraphQL subscriptions.
+
+Writers call ``get_broker().publish(channel, message)`` from any thread,
+subscribers iterate ``get_broker().subscribe(channel)`` on an event loop.
+Messages must be JSON-serialisable so that the in-process broker can be
+replaced with one backed by an external service (Redis pub/sub, PostgreSQL
+``LISTEN/NOTIFY``...) through the ``GRAPHQL_SUBSCRIPTION_BROKER`` setting,
+which is needed as soon as writes happen in another process than the one
+holding the WebSocket connections.
+"""
+import asyncio
+import functools
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InProcessBroker:
+    """Fan messages out to the subscribers of the same process.
+
+    Each subscriber owns a bounded queue on its own event loop; when a slow
+    subscriber falls ``queue_size`` messages behind, its oldest message is
+    dropped rather than letting memory grow.
+    """
+
+    def __init__(self, queue_size=1000):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, message)
+            except RuntimeError:
+                pass  # the subscriber's loop is closed
+
+    @staticmethod
+    def _put(queue, message):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    options = dict(getattr(settings, 'GRAPHQL_SUBSCRIPTION_BROKER', {}))
+    backend = options.pop('BACKEND', 'products.pubsub.InProcessBroker')
+    return import_string(backend)(**{key.lower(): value for key, value in options.items()})
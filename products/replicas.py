@@ -0,0 +1,111 @@
+"""Read replicas for GraphQL queries.
+
+``settings.DATABASE_REPLICAS`` names the aliases of the read replicas of the
+``default`` database. ``ReplicaRouter`` sends every write to the primary,
+and every read too unless it happens within ``reading_from(alias)``: the
+admin, background jobs, management commands and mutations never see a
+replica. The GraphQL view executes query operations within
+``reading_from()`` a replica picked per request, except:
+
+* the queries of a client that ran a mutation less than
+  ``settings.DATABASE_REPLICA_LAG`` seconds ago, so that it reads its own
+  writes; clients are told apart by their ``X-Api-Key`` header, or else by
+  their address (see ``products.throttling``). The mark is kept in the
+  ``default`` cache, which must be shared by the workers for a client to
+  read its writes on all of them;
+* catalog queries whose response would be cached while one of their models
+  was written that recently (``caching.written_recently()``), which would
+  keep a response without the write until it expires.
+"""
+import contextlib
+import contextvars
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import throttling
+from .complexity import API_KEY_HEADER
+
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+
+def _database(alias):
+    settings_dict = connections.settings[alias]
+    return settings_dict['HOST'], settings_dict['PORT'], str(settings_dict['NAME'])
+
+
+def get_replicas():
+    """The replicas to read from.
+
+    A replica on the primary's own database, as replicas are in tests
+    (``TEST['MIRROR']``), has nothing to offer, and its connection would not
+    see the rows of a transaction open on the primary.
+    """
+    primary = _database(DEFAULT_DB_ALIAS)
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if _database(alias) != primary]
+
+
+def get_lag():
+    return getattr(settings, 'DATABASE_REPLICA_LAG', 5)
+
+
+def pick():
+    """A replica to read from, or None when there are none."""
+    replicas = get_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+@contextlib.contextmanager
+def reading_from(alias):
+    """Route the reads within the block to the database ``alias`` (None for the primary)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', ())}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their tables from the primary.
+        return False if db in getattr(settings, 'DATABASE_REPLICAS', ()) else None
+
+
+def _written_key(request):
+    client = request.headers.get(API_KEY_HEADER) or throttling.client_address(request)
+    return 'graphql:wrote:' + hashlib.sha256(client.encode()).hexdigest()
+
+
+def mark_written(request):
+    """Send the reads of the client of ``request`` to the primary for a while."""
+    if get_replicas():
+        caches[DEFAULT_CACHE_ALIAS].set(_written_key(request), True, get_lag())
+
+
+async def amark_written(request):
+    if get_replicas():
+        await caches[DEFAULT_CACHE_ALIAS].aset(_written_key(request), True, get_lag())
+
+
+def wrote_recently(request):
+    return bool(caches[DEFAULT_CACHE_ALIAS].get(_written_key(request)))
+
+
+async def awrote_recently(request):
+    return bool(await caches[DEFAULT_CACHE_ALIAS].aget(_written_key(request)))
+
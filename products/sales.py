@@ -0,0 +1,69 @@
+"""Revenue aggregates computed by the database.
+
+Every function groups and sums in one query over the stored ``Order.total``
+and ``OrderItem.total`` instead of loading rows, and takes an optional
+``[start, end)`` range on ``Order.created_at`` that the ``(created_at,
+status, total)`` index turns into a range scan. Canceled and refunded orders
+are not revenue and are left out, except by ``revenue_by_status`` which
+reports every status.
+"""
+import decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from .models import Order, OrderItem
+from .stock import RELEASED_STATUSES
+
+CENT = decimal.Decimal('0.01')
+
+
+def _orders(start=None, end=None):
+    queryset = Order.objects.all()
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset
+
+
+def _rows(queryset):
+    # SQLite returns decimal sums through a float; round them back to cents.
+    rows = list(queryset)
+    for row in rows:
+        row['revenue'] = row['revenue'].quantize(CENT)
+    return rows
+
+
+def revenue_by_day(start=None, end=None):
+    """``[{'day', 'orders', 'revenue'}]`` oldest day first, days in ``TIME_ZONE``."""
+    return _rows(
+        _orders(start, end)
+        .exclude(status__in=RELEASED_STATUSES)
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(orders=Count('id'), revenue=Sum('total'))
+        .order_by('day')
+    )
+
+
+def revenue_by_category(start=None, end=None):
+    """``[{'category_id', 'category_name', 'units', 'revenue'}]`` highest revenue first."""
+    return _rows(
+        # An IN subquery rather than a join, so the date range is resolved on
+        # the order index first and only the lines of those orders are read.
+        OrderItem.objects.filter(order__in=_orders(start, end).exclude(status__in=RELEASED_STATUSES).values('pk'))
+        .values(category_id=F('product__category_id'), category_name=F('product__category__name'))
+        .annotate(units=Sum('quantity'), revenue=Sum('total'))
+        .order_by('-revenue', 'category_id')
+    )
+
+
+def revenue_by_status(start=None, end=None):
+    """``[{'status', 'orders', 'revenue'}]`` for every status that has orders."""
+    return _rows(
+        _orders(start, end)
+        .values('status')
+        .annotate(orders=Count('id'), revenue=Sum('total'))
+        .order_by('status')
+    )
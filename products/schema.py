@@ -1,52 +1,186 @@
+import io
+from collections import Counter
+
 import graphene
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from graphene_django import DjangoObjectType
-from .models import Product, Category, Order, OrderItem
+from graphql import GraphQLError
+from .aio import async_safe
+from .loaders import Loaders, get_loaders
+from .models import Product, Category, Order, OrderItem, OrderStatusChange
+from .optimizer import prefetch_attr
+from .pagination import connection_from_queryset
+from .search import ORDERING as SEARCH_ORDERING, search_products
+from .pubsub import get_broker
+from . import catalog, events, sales, stock, tasks, workflow
 
 class CategoryType(DjangoObjectType):
     class Meta:
         model = Category
 
+    def resolve_product_set(self, info):
+        return get_loaders(info).load_related(self, 'product_set')
+
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
     def resolve_category_name(self, info):
         return self.category.name
 
+    def resolve_category(self, info):
+        return get_loaders(info).load_related(self, 'category')
+
+    def resolve_orderitem_set(self, info):
+        return get_loaders(info).load_related(self, 'orderitem_set')
+
+    def resolve_order_set(self, info):
+        return get_loaders(info).load_related(self, 'order_set')
+
 class OrderItemType(DjangoObjectType):
     class Meta:
         model = OrderItem
 
+    def resolve_product(self, info):
+        return get_loaders(info).load_related(self, 'product')
+
+    def resolve_order(self, info):
+        return get_loaders(info).load_related(self, 'order')
+
 class OrderType(DjangoObjectType):
     class Meta:
         model = Order
 
     status = graphene.String()
 
+    def resolve_products(self, info):
+        return get_loaders(info).load_related(self, 'products')
+
+    def resolve_orderitem_set(self, info):
+        return get_loaders(info).load_related(self, 'orderitem_set')
+
+    def resolve_status_history(self, info):
+        return get_loaders(info).load_related(self, 'status_history')
+
     def resolve_status(self, info):
-        # Map the status value to the translated string
-        status_map = {
-            'pending': 'В обработке',
-            'accepted': 'Заказ принят',
-            'prepare': 'Заказ готовиться',
-            'created': 'Заказ готов к выдаче',
-            'delivery': 'Передан курьеру',
-            'canceled': 'Отменен',
-            'completed': 'Выполнен',
-            'refunded': 'Возврат',
-        }
-        return status_map.get(self.status, self.status)
-        
-class Query(graphene.ObjectType):
-    products = graphene.List(ProductType)
-    categories = graphene.List(CategoryType)
-    orders = graphene.List(OrderType)
+        return workflow.STATUS_LABELS.get(self.status, self.status)
 
-    def resolve_products(self, info):
-        return Product.objects.all()
-    def resolve_categories(self, info):
-        return Category.objects.all()
-    def resolve_orders(self, info):
-        return Order.objects.all()
+class OrderStatusChangeType(DjangoObjectType):
+    class Meta:
+        model = OrderStatusChange
+        fields = ('from_status', 'to_status', 'created_at')
+        convert_choices_to_enum = False
+
+class RevenueByDay(graphene.ObjectType):
+    day = graphene.Date()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+class RevenueByCategory(graphene.ObjectType):
+    category_id = graphene.ID()
+    category_name = graphene.String()
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+
+class RevenueByStatus(graphene.ObjectType):
+    status = graphene.String()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+class ProductConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProductType
+
+class CategoryConnection(graphene.relay.Connection):
+    class Meta:
+        node = CategoryType
+
+class OrderConnection(graphene.relay.Connection):
+    class Meta:
+        node = OrderType
+
+class Query(graphene.ObjectType):
+    products = graphene.Field(
+        ProductConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        category_id=graphene.ID(),
+        min_price=graphene.Decimal(),
+        max_price=graphene.Decimal(),
+    )
+    search_products = graphene.Field(
+        ProductConnection,
+        query=graphene.String(required=True),
+        category_id=graphene.ID(),
+        first=graphene.Int(),
+        after=graphene.String(),
+        description='Products whose name or description contains words starting with every word of "query", most relevant first.',
+    )
+    categories = graphene.Field(
+        CategoryConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    orders = graphene.Field(
+        OrderConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        status=graphene.String(),
+        created_after=graphene.DateTime(),
+        created_before=graphene.DateTime(),
+    )
+    revenue_by_day = graphene.List(
+        RevenueByDay,
+        created_after=graphene.DateTime(),
+        created_before=graphene.DateTime(),
+    )
+    revenue_by_category = graphene.List(
+        RevenueByCategory,
+        created_after=graphene.DateTime(),
+        created_before=graphene.DateTime(),
+    )
+    revenue_by_status = graphene.List(
+        RevenueByStatus,
+        created_after=graphene.DateTime(),
+        created_before=graphene.DateTime(),
+    )
+
+    def resolve_products(self, info, first=None, after=None, category_id=None, min_price=None, max_price=None):
+        queryset = Product.objects.all()
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+        return connection_from_queryset(ProductConnection, queryset, info, ('name', 'id'), first, after)
+    def resolve_search_products(self, info, query, category_id=None, first=None, after=None):
+        queryset = Product.objects.all()
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        queryset = search_products(query, queryset)
+        return connection_from_queryset(ProductConnection, queryset, info, SEARCH_ORDERING, first, after)
+    def resolve_categories(self, info, first=None, after=None):
+        queryset = Category.objects.all()
+        return connection_from_queryset(CategoryConnection, queryset, info, ('name', 'id'), first, after)
+    def resolve_orders(self, info, first=None, after=None, status=None, created_after=None, created_before=None):
+        queryset = Order.objects.all()
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        if created_after is not None:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before is not None:
+            queryset = queryset.filter(created_at__lt=created_before)
+        return connection_from_queryset(OrderConnection, queryset, info, ('-created_at', '-id'), first, after)
+    @async_safe
+    def resolve_revenue_by_day(self, info, created_after=None, created_before=None):
+        return sales.revenue_by_day(created_after, created_before)
+    @async_safe
+    def resolve_revenue_by_category(self, info, created_after=None, created_before=None):
+        return sales.revenue_by_category(created_after, created_before)
+    @async_safe
+    def resolve_revenue_by_status(self, info, created_after=None, created_before=None):
+        return sales.revenue_by_status(created_after, created_before)
 
 class CreateProduct(graphene.Mutation):
     class Arguments:
@@ -58,6 +192,7 @@ class CreateProduct(graphene.Mutation):
 
     product = graphene.Field(ProductType)
 
+    @async_safe
     def mutate(self, info, name, description, price, quantity, category_id):
         category = Category.objects.get(pk=category_id)
         product = Product(name=name, description=description, price=price, quantity=quantity, category=category)
@@ -75,20 +210,29 @@ class UpdateProduct(graphene.Mutation):
 
     product = graphene.Field(ProductType)
 
+    @async_safe
     def mutate(self, info, id, name=None, description=None, price=None, quantity=None, category_id=None):
         product = Product.objects.get(pk=id)
+        # Only write what was sent: saving a stale quantity read above would
+        # undo reservations made by concurrent checkouts.
+        update_fields = ['updated_at']
         if name is not None:
             product.name = name
+            update_fields.append('name')
         if description is not None:
             product.description = description
+            update_fields.append('description')
         if price is not None:
             product.price = price
+            update_fields.append('price')
         if quantity is not None:
             product.quantity = quantity
+            update_fields.append('quantity')
         if category_id is not None:
             category = Category.objects.get(pk=category_id)
             product.category = category
-        product.save()
+            update_fields.append('category')
+        product.save(update_fields=update_fields)
         return UpdateProduct(product=product)
 
 
@@ -98,6 +242,7 @@ class DeleteProduct(graphene.Mutation):
 
     success = graphene.Boolean()
 
+    @async_safe
     def mutate(self, info, id):
         product = Product.objects.get(pk=id)
         product.delete()
@@ -109,6 +254,7 @@ class CreateCategory(graphene.Mutation):
 
     category = graphene.Field(CategoryType)
 
+    @async_safe
     def mutate(self, info, name):
         category = Category(name=name)
         category.save()
@@ -120,6 +266,7 @@ class UpdateCategory(graphene.Mutation):
 
     category = graphene.Field(CategoryType)
 
+    @async_safe
     def mutate(self, info, id, name):
         category = Category.objects.get(pk=id)
         category.name = name
@@ -132,6 +279,7 @@ class DeleteCategory(graphene.Mutation):
 
     success = graphene.Boolean()
 
+    @async_safe
     def mutate(self, info, id):
         category = Category.objects.get(pk=id)
         category.delete()
@@ -148,20 +296,52 @@ class CreateOrder(graphene.Mutation):
 
     order = graphene.Field(OrderType)
 
+    @async_safe
     def mutate(self, info, name, surname, phone_number, address, email, product_ids, quantities):
-        order = Order(
-            name=name,
-            surname=surname,
-            phone_number=phone_number,
-            address=address,
-            email=email,
-        )
-        order.save()
-
-        for product_id, quantity in zip(product_ids, quantities):
-            product = Product.objects.get(pk=product_id)
-            order_item = OrderItem(order=order, product=product, quantity=quantity)
-            order_item.save()
+        if len(product_ids) != len(quantities):
+            raise GraphQLError('product_ids and quantities must have the same length.')
+        if any(quantity is None or quantity < 1 for quantity in quantities):
+            raise GraphQLError('Quantities must be positive integers.')
+
+        try:
+            keys = [Product._meta.pk.to_python(product_id) for product_id in product_ids]
+        except ValidationError as e:
+            raise GraphQLError(f'Invalid product id: {e.messages[0]}')
+
+        with transaction.atomic():
+            products = Product.objects.in_bulk(keys)
+            missing = [product_id for product_id, key in zip(product_ids, keys) if key not in products]
+            if missing:
+                raise GraphQLError(f'Products do not exist: {", ".join(map(str, missing))}.')
+            reserved = Counter()
+            for key, quantity in zip(keys, quantities):
+                reserved[key] += quantity
+            try:
+                stock.reserve(reserved)
+            except stock.InsufficientStock as e:
+                raise GraphQLError(str(e))
+
+            # Priced from the rows read above, before the reservation.
+            items = [
+                OrderItem(product=products[key], quantity=quantity).priced()
+                for key, quantity in zip(keys, quantities)
+            ]
+            order = Order(
+                name=name,
+                surname=surname,
+                phone_number=phone_number,
+                address=address,
+                email=email,
+                total=sum(item.total for item in items),
+            )
+            order.save()
+            for item in items:
+                item.order = order
+            items = OrderItem.objects.bulk_create(items)
+            # Confirmation email, stock sync and analytics run in the workers.
+            tasks.order_created(order, reserved)
+        # Let the payload resolve the lines from memory instead of re-reading them.
+        setattr(order, prefetch_attr('orderitem_set'), items)
 
         return CreateOrder(order=order)
 
@@ -176,21 +356,62 @@ class UpdateOrder(graphene.Mutation):
 
     order = graphene.Field(OrderType)
 
+    @async_safe
     def mutate(self, info, order_id, name=None, surname=None, phone_number=None, address=None, status=None):
-        order = Order.objects.get(pk=order_id)
-        if name is not None:
-            order.name = name
-        if surname is not None:
-            order.surname = surname
-        if phone_number is not None:
-            order.phone_number = phone_number
-        if address is not None:
-            order.address = address
-        if status is not None:
-            order.status = status
-        order.save()
+        with transaction.atomic():
+            order = Order.objects.get(pk=order_id)
+            update_fields = []
+            changes = {'name': name, 'surname': surname, 'phone_number': phone_number, 'address': address}
+            for field, value in changes.items():
+                if value is not None and value != getattr(order, field):
+                    setattr(order, field, value)
+                    update_fields.append(field)
+            if status is not None:
+                try:
+                    workflow.change_status([order], status)
+                except (workflow.InvalidTransition, workflow.ConcurrentTransition, stock.InsufficientStock) as e:
+                    raise GraphQLError(str(e))
+            if update_fields:
+                order.save(update_fields=update_fields + ['update_date'])
         return UpdateOrder(order=order)
 
+class ProductInput(graphene.InputObjectType):
+    sku = graphene.String(required=True)
+    name = graphene.String(required=True)
+    description = graphene.String(required=True)
+    price = graphene.Decimal(required=True)
+    quantity = graphene.Int(required=True)
+    category = graphene.String(required=True, description='Category name, created if missing.')
+
+
+class BulkUpsertProducts(graphene.Mutation):
+    """Create or update products by sku from a list or a CSV / JSON Lines document."""
+
+    class Arguments:
+        products = graphene.List(graphene.NonNull(ProductInput))
+        data = graphene.String()
+        format = graphene.String(default_value='jsonl')
+
+    count = graphene.Int()
+    categories_created = graphene.Int()
+
+    @async_safe
+    def mutate(self, info, products=None, data=None, format='jsonl'):
+        if (products is None) == (data is None):
+            raise GraphQLError('Pass either "products" or "data".')
+        if products is not None:
+            rows = ((line, dict(product)) for line, product in enumerate(products, 1))
+        elif format in catalog.FORMATS:
+            rows = catalog.read_rows(io.StringIO(data), format)
+        else:
+            raise GraphQLError(f'Unknown format "{format}", expected one of: {", ".join(catalog.FORMATS)}.')
+        try:
+            result = catalog.import_products(rows)
+        except catalog.CatalogError as e:
+            raise GraphQLError(str(e))
+        return BulkUpsertProducts(count=result.products, categories_created=result.categories_created)
+
+
 class Mutation(graphene.ObjectType):
     create_product = CreateProduct.Field()
     update_product = UpdateProduct.Field()
@@ -200,5 +421,33 @@ class Mutation(graphene.ObjectType):
     delete_category = DeleteCategory.Field()
     create_order = CreateOrder.Field()
     update_order = UpdateOrder.Field()
-
-schema = graphene.Schema(query=Query, mutation=Mutation)
+    bulk_upsert_products = BulkUpsertProducts.Field()
+
+async def order_events(info, channel):
+    async for message in get_broker().subscribe(channel):
+        order, loaders = events.decode(Order, message, Loaders)
+        info.context.loaders = loaders
+        yield order
+
+class Subscription(graphene.ObjectType):
+    order_created = graphene.Field(OrderType)
+    order_status_changed = graphene.Field(
+        OrderType,
+        order_id=graphene.ID(),
+        description='Status changes of one order, or of every order without "orderId".',
+    )
+
+    def subscribe_order_created(root, info):
+        return order_events(info, events.ORDER_CREATED)
+
+    def subscribe_order_status_changed(root, info, order_id=None):
+        if order_id is None:
+            return order_events(info, events.ORDER_STATUS)
+        try:
+            pk = Order._meta.pk.to_python(order_id)
+        except ValidationError as e:
+            raise GraphQLError(f'Invalid order id: {e.messages[0]}')
+        # Each order has its own channel, so a subscriber only wakes up for its order.
+        return order_events(info, events.order_status_channel(pk))
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
@@ -0,0 +1,62 @@
+"""Full-text product search with relevance ranking and prefix matching.
+
+Every word of the query must match the start of a word in the product name
+or description, so ``"blu cab"`` finds "Blue cable". Results are annotated
+with ``rank`` where lower is more relevant, which makes ``('rank', 'id')`` a
+keyset ordering for ``connection_from_queryset``.
+
+SQLite joins the ``products_product_fts`` FTS5 table (``ProductSearchIndex``)
+and uses its BM25 ``rank``; PostgreSQL matches the GIN-indexed
+``search_vector`` column and ranks with ``ts_rank_cd``. Both are created by
+migration 0007. Other backends fall back to ``icontains`` on every word.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+ORDERING = ('rank', 'id')
+# Longer queries are truncated: every extra word is another index lookup.
+MAX_TERMS = 8
+
+WORD = re.compile(r'\w+')
+
+
+def terms(query):
+    """The lowercased words of ``query``, at most ``MAX_TERMS`` of them."""
+    return [word.lower() for word in WORD.findall(query)][:MAX_TERMS]
+
+
+def search_products(query, queryset=None):
+    """``queryset`` (all products by default) narrowed to ``query`` and annotated with ``rank``."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    words = terms(query)
+    if not words:
+        return queryset.none().annotate(rank=Value(0.0))
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        # Quoting makes every word a literal string, ``*`` a prefix query.
+        expression = ' '.join(f'"{word}"*' for word in words)
+        return queryset.filter(search_index__document__match=expression).annotate(
+            rank=F('search_index__rank'),
+        )
+    if vendor == 'postgresql':
+        expression = ' & '.join(f'{word}:*' for word in words)
+        # Negated so that, as with BM25 on SQLite, lower ranks come first.
+        return queryset.filter(
+            RawSQL("products_product.search_vector @@ to_tsquery('simple', %s)", [expression], BooleanField()),
+        ).annotate(
+            rank=RawSQL(
+                "-ts_rank_cd(products_product.search_vector, to_tsquery('simple', %s))",
+                [expression],
+                FloatField(),
+            ),
+        )
+    condition = Q()
+    for word in words:
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return queryset.filter(condition).annotate(rank=Value(0.0))
@@ -0,0 +1,79 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from . import caching
+from .models import OrderItem, Product
+
+# Orders in these statuses no longer hold the stock of their lines.
+RELEASED_STATUSES = frozenset({'canceled', 'refunded'})
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(
+            'Not enough stock for products: ' + ', '.join(str(pk) for pk in product_ids) + '.'
+        )
+
+
+def _per_product(quantities):
+    return Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def reserve(quantities):
+    """Take ``{product_pk: quantity}`` out of stock or raise ``InsufficientStock``.
+
+    All products are decremented by one conditional ``UPDATE ... SET quantity =
+    quantity - n WHERE quantity >= n`` so concurrent checkouts can never drive
+    a row negative and no lock is held beyond that statement. Must be called
+    inside ``transaction.atomic()``; on failure nothing is reserved.
+    """
+    if not quantities:
+        return
+    amount = _per_product(quantities)
+    sid = transaction.savepoint()
+    reserved = Product.objects.filter(pk__in=quantities, quantity__gte=amount).update(
+        quantity=F('quantity') - amount,
+    )
+    if reserved == len(quantities):
+        transaction.savepoint_commit(sid)
+        caching.invalidate_on_commit(Product)
+        return
+    transaction.savepoint_rollback(sid)
+    available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'quantity'))
+    raise InsufficientStock(sorted(
+        pk for pk, quantity in quantities.items() if available.get(pk, 0) < quantity
+    ))
+
+
+def release(quantities):
+    """Put ``{product_pk: quantity}`` back into stock."""
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(
+            quantity=F('quantity') + _per_product(quantities),
+        )
+        caching.invalidate_on_commit(Product)
+
+
+def order_quantities(order):
+    """Units of each product held by ``order``, as ``{product_pk: quantity}``."""
+    quantities = Counter()
+    for product_id, quantity in OrderItem.objects.filter(order=order).values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    return dict(quantities)
+
+
+def change_status(order, status):
+    """Reserve or release the stock of ``order`` when ``status`` crosses RELEASED_STATUSES."""
+    was_released = order.status in RELEASED_STATUSES
+    if was_released == (status in RELEASED_STATUSES):
+        return
+    if was_released:
+        reserve(order_quantities(order))
+    else:
+        release(order_quantities(order))
@@ -0,0 +1,207 @@
+"""Streamed responses of large connections.
+
+A query whose only root field is a connection (``products``, ``orders``,
+...) asking for more than ``settings.GRAPHQL_STREAM_PAGE_SIZE`` items is
+executed one page of that size (at most ``RELAY_CONNECTION_MAX_LIMIT``) at a
+time, each page continuing from the ``endCursor`` of the one before. Every
+page is encoded and sent as soon as it is resolved, then dropped, so a
+worker holds one page whatever the size of the result. Streamed connections
+honour ``first`` up to ``GRAPHQL_STREAM_MAX_ITEMS`` instead of
+``RELAY_CONNECTION_MAX_LIMIT``, and the cost of an operation counts all of
+its pages.
+
+The response is the document one execution would give: the ``edges`` of all
+pages, a ``pageInfo`` spanning them and the errors of every page, with paths
+into the whole list; ``errors`` and ``extensions`` come after ``data``. Pages
+are separate reads: a row written while the response streams may or may not
+be in it, but keyset pagination never sends a row twice.
+"""
+import copy
+import math
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    ArgumentNode,
+    FieldNode,
+    IntValueNode,
+    NameNode,
+    OperationType,
+    SelectionSetNode,
+    StringValueNode,
+    get_named_type,
+    parse,
+    value_from_ast_untyped,
+)
+
+from . import complexity, encoding
+
+# Selected in every page to continue after it; not part of the response.
+PAGE_INFO_KEY = '_streamPageInfo'
+PAGE_INFO = parse(
+    f'{{ {PAGE_INFO_KEY}: pageInfo {{ hasPreviousPage hasNextPage startCursor endCursor }} }}'
+).definitions[0].selection_set.selections[0]
+# pageInfo fields taken from the first page; the others come from the last.
+START_FIELDS = {'hasPreviousPage', 'startCursor'}
+
+
+def response_key(field_node):
+    return (field_node.alias or field_node.name).value
+
+
+def plain_fields(selection_set):
+    """The fields of ``selection_set``, or None when it has fragments or directives."""
+    if not all(isinstance(node, FieldNode) and not node.directives for node in selection_set.selections):
+        return None
+    return selection_set.selections
+
+
+def get_stream(schema, document, operation_ast, variables):
+    """A ``ConnectionStream`` for the operation, or None when it is not streamed."""
+    page_size = getattr(settings, 'GRAPHQL_STREAM_PAGE_SIZE', None)
+    if not page_size or operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return None
+    # Resolvers never read more than that at once.
+    page_size = min(page_size, graphene_settings.RELAY_CONNECTION_MAX_LIMIT)
+    roots = plain_fields(operation_ast.selection_set)
+    if roots is None or len(roots) != 1 or roots[0].selection_set is None:
+        return None
+    field_node = roots[0]
+    field = schema.query_type.fields.get(field_node.name.value)
+    if field is None or 'first' not in field.args or 'after' not in field.args:
+        return None
+    if 'edges' not in getattr(get_named_type(field.type), 'fields', {}):
+        return None
+    selections = plain_fields(field_node.selection_set)
+    if selections is None or [node.name.value for node in selections].count('edges') != 1:
+        return None
+    for node in selections:
+        if node.name.value == 'pageInfo' and plain_fields(node.selection_set) is None:
+            return None
+    first = argument_value(operation_ast, field_node, 'first', variables)
+    if not isinstance(first, int) or first <= page_size:
+        return None
+    max_items = getattr(settings, 'GRAPHQL_STREAM_MAX_ITEMS', None)
+    if max_items is not None:
+        first = min(first, max_items)
+    return ConnectionStream(document, operation_ast, field_node, first, page_size)
+
+
+def argument_value(operation_ast, field_node, name, variables):
+    variables = {
+        **{
+            definition.variable.name.value: value_from_ast_untyped(definition.default_value)
+            for definition in operation_ast.variable_definitions
+            if definition.default_value is not None
+        },
+        **(variables or {}),
+    }
+    for argument in field_node.arguments:
+        if argument.name.value == name:
+            return value_from_ast_untyped(argument.value, variables)
+    return None
+
+
+class ConnectionStream:
+    """Pages of one root connection and the response text they make up.
+
+    The view executes ``page_document()`` until ``done``, handing each result
+    to ``add()``, then sends ``end()``.
+    """
+
+    def __init__(self, document, operation_ast, field_node, first, page_size):
+        self.document = document
+        self.operation_ast = operation_ast
+        self.field_node = field_node
+        self.key = response_key(field_node)
+        self.edges_key = next(response_key(node) for node in field_node.selection_set.selections if node.name.value == 'edges')
+        self.first = first
+        self.page_size = page_size
+        self.sent = 0
+        self.after = None
+        self.done = False
+        self.start_info = self.end_info = self.connection = None
+        self.errors = []
+
+    def cost(self, page_cost):
+        """``QueryCost`` of the whole operation from the cost of one page."""
+        pages = math.ceil(self.first / self.page_size)
+        return complexity.QueryCost(page_cost.cost * pages, page_cost.depth, page_cost.budget)
+
+    def page_document(self):
+        """The document asking for the next page of the connection."""
+        arguments = [
+            argument for argument in self.field_node.arguments
+            if argument.name.value != 'first' and (self.after is None or argument.name.value != 'after')
+        ]
+        size = min(self.page_size, self.first - self.sent)
+        arguments.append(ArgumentNode(name=NameNode(value='first'), value=IntValueNode(value=str(size))))
+        if self.after is not None:
+            arguments.append(ArgumentNode(name=NameNode(value='after'), value=StringValueNode(value=self.after)))
+        field = copy.copy(self.field_node)
+        field.arguments = tuple(arguments)
+        field.selection_set = SelectionSetNode(selections=(*self.field_node.selection_set.selections, PAGE_INFO))
+        operation = copy.copy(self.operation_ast)
+        operation.selection_set = SelectionSetNode(selections=(field,))
+        document = copy.copy(self.document)
+        document.definitions = tuple(
+            operation if definition is self.operation_ast else definition for definition in self.document.definitions
+        )
+        return document
+
+    def streamable(self, result):
+        """Whether the first page ``result`` starts a stream; otherwise it is the response."""
+        if not result.data or result.data.get(self.key) is None:
+            return False
+        return not any(not getattr(error, 'path', None) for error in result.errors or ())
+
+    def add(self, result):
+        """The response text of the page ``result``."""
+        connection = (result.data or {}).get(self.key)
+        for error in result.errors or ():
+            path = getattr(error, 'path', None)
+            if path and len(path) > 2 and path[1] == self.edges_key and isinstance(path[2], int):
+                error.path = [path[0], path[1], path[2] + self.sent, *path[3:]]
+            self.errors.append(error)
+        if connection is None:
+            # The connection failed; the response ends with the pages before it.
+            self.done = True
+            return ''
+        page_info = connection.pop(PAGE_INFO_KEY)
+        edges = connection[self.edges_key]
+        text = encoding.dumps(edges)[1:-1]
+        if self.start_info is None:
+            self.start_info = page_info
+            prefix = '{"data":{%s:{%s:[' % (encoding.dumps(self.key), encoding.dumps(self.edges_key))
+        else:
+            prefix = ',' if text and self.sent else ''
+        self.end_info, self.connection = page_info, connection
+        self.sent += len(edges)
+        self.after = page_info['endCursor']
+        self.done = not edges or not page_info['hasNextPage'] or self.sent >= self.first
+        return prefix + text
+
+    def end(self, errors, extensions):
+        """The rest of the response after the last page, with the formatted ``errors``."""
+        parts = [']']
+        for node in self.field_node.selection_set.selections:
+            name = node.name.value
+            if name == 'edges':
+                continue
+            if name == 'pageInfo':
+                value = {
+                    response_key(field): 'PageInfo' if field.name.value == '__typename' else (
+                        self.start_info if field.name.value in START_FIELDS else self.end_info
+                    )[field.name.value]
+                    for field in node.selection_set.selections
+                }
+            else:
+                value = self.connection[response_key(node)]
+            parts.append(',%s:%s' % (encoding.dumps(response_key(node)), encoding.dumps(value)))
+        parts.append('}}')
+        if errors:
+            parts.append(',"errors":%s' % encoding.dumps(errors))
+        if extensions:
+            parts.append(',"extensions":%s' % encoding.dumps(extensions))
+        parts.append('}')
+        return ''.join(parts)
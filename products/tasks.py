@@ -0,0 +1,67 @@
+"""Side effects of orders, run by ``manage.py run_workers`` (see ``jobs``).
+
+``order_created()`` is called by ``CreateOrder`` and enqueues the jobs of a
+new order, each keyed by the order so that it is enqueued at most once.
+Stock levels and analytics events are handed to the callables named by
+``settings.STOCK_SYNC_BACKEND`` and ``settings.ANALYTICS_BACKEND``; their
+jobs are not enqueued while those are unset.
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.module_loading import import_string
+
+from . import jobs
+from .models import Order, OrderItem, Product
+
+
+def order_created(order, product_ids):
+    """Enqueue the jobs of ``order`` once the current transaction commits."""
+    created = [jobs.job(send_order_confirmation, key=f'order-confirmation:{order.pk}', order_id=order.pk)]
+    if getattr(settings, 'STOCK_SYNC_BACKEND', None):
+        created.append(jobs.job(
+            sync_stock, key=f'stock-sync:order:{order.pk}', product_ids=sorted(set(product_ids)),
+        ))
+    if getattr(settings, 'ANALYTICS_BACKEND', None):
+        created.append(jobs.job(record_order, key=f'analytics:order:{order.pk}', order_id=order.pk))
+    jobs.enqueue(*created)
+
+
+def send_order_confirmation(order_id):
+    order = Order.objects.get(pk=order_id)
+    if not order.email:
+        return
+    lines = OrderItem.objects.filter(order=order).select_related('product').order_by('pk')
+    body = '\n'.join([
+        f'Hello {order.name},',
+        '',
+        f'We have received your order {order.receipt_number}:',
+        '',
+        *(f'  {line.product.name} x {line.quantity}: {line.total}' for line in lines),
+        '',
+        f'Total: {order.total}',
+    ])
+    send_mail(f'Order {order.receipt_number} received', body, None, [order.email])
+
+
+def sync_stock(product_ids):
+    """Send the current stock of ``product_ids`` as ``{sku or pk: quantity}``."""
+    quantities = {
+        sku or str(pk): quantity
+        for pk, sku, quantity in Product.objects.filter(pk__in=product_ids).values_list('pk', 'sku', 'quantity')
+    }
+    import_string(settings.STOCK_SYNC_BACKEND)(quantities)
+
+
+def record_order(order_id):
+    order = Order.objects.get(pk=order_id)
+    lines = OrderItem.objects.filter(order=order).values_list('product_id', 'quantity', 'total')
+    import_string(settings.ANALYTICS_BACKEND)({
+        'event': 'order.created',
+        'order_number': str(order.order_number),
+        'created_at': order.created_at.isoformat(),
+        'total': str(order.total),
+        'items': [
+            {'product_id': product_id, 'quantity': quantity, 'total': str(total)}
+            for product_id, quantity, total in lines
+        ],
+    })
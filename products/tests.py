@@ -1,3 +1,2213 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import runpy
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.db.utils import ConnectionHandler
+from django.forms import modelform_factory
+from django.test import (
+    AsyncClient,
+    AsyncRequestFactory,
+    Client,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphene_django.settings import graphene_settings
+
+from .documents import query_hash
+from . import catalog, encoding, events, idempotency, jobs, metrics, replicas, throttling, workflow
+from .loaders import Loaders
+from .models import Category, IdempotencyKey, Job, Order, OrderItem, OrderStatusChange, Product
+from .numbering import uuid7
+from .pubsub import get_broker
+from .schema import schema
+from .views import AsyncGraphQLView, GraphQLView
+from .websocket import GraphQLWebSocketApp
+from server.cache import cache_config
+from server.database import database_config, replica_configs
+from server.middleware import WhiteNoiseMiddleware
+
+scripted_receipt_numbers = []
+
+
+def scripted_receipt_number():
+    return scripted_receipt_numbers.pop(0)
+
+
+# Stand-ins for the stock sync and analytics backends of background jobs.
+synced_stock = []
+analytics_events = []
+flaky_failures = []
+
+
+def sync_stock(quantities):
+    synced_stock.append(quantities)
+
+
+def record_analytics(event):
+    analytics_events.append(event)
+
+
+def flaky(label):
+    """Fails while ``flaky_failures`` has items, popping one each time."""
+    if flaky_failures:
+        raise RuntimeError(f'{label} failed: {flaky_failures.pop()}')
+
+
+
+def _off_the_event_loop(name):
+    def method(self, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return getattr(LocMemCache, name)(self, *args, **kwargs)
+        raise AssertionError(f'cache.{name}() blocked the event loop')
+    return method
+
+
+class EventLoopGuardCache(LocMemCache):
+    """A local cache whose synchronous calls fail on an event loop, where Redis would block it."""
+
+    get = _off_the_event_loop('get')
+    set = _off_the_event_loop('set')
+    add = _off_the_event_loop('add')
+    get_many = _off_the_event_loop('get_many')
+    delete = _off_the_event_loop('delete')
+
+
+# Functional tests run uncached; ResponseCacheTests covers the response cache.
+@override_settings(GRAPHQL_RESPONSE_CACHE_ALIAS=None)
+class GraphQLTestCase(TestCase):
+    def query(self, query, variables=None):
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+        )
+        return response.json()
+
+    def create_catalog(self, categories=3, products_per_category=3):
+        products = []
+        for c in range(categories):
+            category = Category.objects.create(name=f'Category {c}')
+            for p in range(products_per_category):
+                products.append(Product.objects.create(
+                    name=f'Product {c}-{p}', description='Description',
+                    price='9.99', quantity=100, category=category,
+                ))
+        return products
+
+    def create_order(self, products, quantity=1):
+        order = Order.objects.create(
+            name='Ivan', surname='Ivanov', phone_number='+70000000000',
+            address='Moscow', email='ivan@example.com',
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        return order
+
+
+class DataLoaderTests(GraphQLTestCase):
+    def setUp(self):
+        products = self.create_catalog()
+        self.orders = [self.create_order(products[i:i + 4]) for i in range(5)]
+
+    def test_nested_order_items_use_one_query_per_level(self):
+        query = '{ orders { edges { node { orderitemSet { product { category { name } } } } } } }'
+        # orders, then order items joined with their products and categories
+        with self.assertNumQueries(2):
+            result = self.query(query)
+        self.assertNotIn('errors', result)
+        orders = [edge['node'] for edge in result['data']['orders']['edges']]
+        self.assertEqual(len(orders), 5)
+        self.assertEqual(
+            orders[-1]['orderitemSet'][0]['product']['category']['name'], 'Category 0',
+        )
+
+    def test_query_count_does_not_grow_with_orders(self):
+        query = '''{ orders { edges { node {
+            id products { name category { name } } orderitemSet { order { id } }
+        } } } }'''
+        with self.assertNumQueries(3):
+            self.query(query)
+        order = self.create_order(Product.objects.all())
+        with self.assertNumQueries(3):
+            result = self.query(query)
+        orders = {e['node']['id']: e['node'] for e in result['data']['orders']['edges']}
+        self.assertEqual(len(orders[str(order.pk)]['products']), 9)
+
+    def test_reverse_relations_are_batched(self):
+        query = '''{ categories { edges { node {
+            productSet { orderSet { id } orderitemSet { quantity } }
+        } } } }'''
+        with self.assertNumQueries(4):
+            result = self.query(query)
+        products = result['data']['categories']['edges'][0]['node']['productSet']
+        self.assertEqual(products[0]['orderSet'], [{'id': str(self.orders[0].pk)}])
+
+    def test_loader_batches_rows_outside_optimized_querysets(self):
+        loaders = Loaders()
+        items = loaders.prime(OrderItem.objects.all())
+        # one IN query for the products, one for their categories
+        with self.assertNumQueries(2):
+            products = [loaders.load_related(item, 'product') for item in items]
+            categories = [loaders.load_related(product, 'category') for product in products]
+        self.assertEqual(len(products), 20)
+        self.assertEqual(categories[0].name, 'Category 0')
+
+
+class QueryOptimizerTests(GraphQLTestCase):
+    def setUp(self):
+        products = self.create_catalog()
+        self.create_order(products[:2])
+
+    def capture(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.query(query)
+        self.assertNotIn('errors', result)
+        return result, [q['sql'] for q in queries]
+
+    def test_unselected_columns_are_not_fetched(self):
+        result, sql = self.capture('{ products { edges { node { id name } } } }')
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('description', sql[0])
+        self.assertNotIn('price', sql[0])
+        self.assertEqual(len(result['data']['products']['edges']), 9)
+
+    def test_order_address_is_not_fetched_unless_selected(self):
+        result, sql = self.capture('{ orders { edges { node { id status } } } }')
+        self.assertNotIn('address', sql[0])
+        self.assertEqual(result['data']['orders']['edges'][0]['node']['status'], 'В обработке')
+        result, sql = self.capture('{ orders { edges { node { address } } } }')
+        self.assertIn('address', sql[0])
+
+    def test_foreign_keys_are_joined(self):
+        result, sql = self.capture('{ products { edges { node { name category { name } } } } }')
+        self.assertEqual(len(sql), 1)
+        self.assertIn('JOIN', sql[0])
+        product = result['data']['products']['edges'][0]['node']
+        self.assertEqual(product['category']['name'], 'Category 0')
+
+    def test_reverse_relations_are_prefetched_through_fragments(self):
+        query = """
+            query { orders { edges { node { ...OrderFields } } } }
+            fragment OrderFields on OrderType {
+                products { name }
+                ... on OrderType { orderitemSet { quantity } }
+            }
+        """
+        result, sql = self.capture(query)
+        self.assertEqual(len(sql), 3)
+        self.assertNotIn('description', ' '.join(sql))
+        order = result['data']['orders']['edges'][0]['node']
+        self.assertEqual(len(order['products']), 2)
+        self.assertEqual(order['orderitemSet'], [{'quantity': 1}, {'quantity': 1}])
+
+
+class PaginationTests(GraphQLTestCase):
+    def setUp(self):
+        self.products = self.create_catalog(categories=2, products_per_category=5)
+
+    def products_page(self, first, after=None, **filters):
+        query = """
+            query($first: Int, $after: String, $categoryId: ID, $minPrice: Decimal, $maxPrice: Decimal) {
+                products(first: $first, after: $after, categoryId: $categoryId,
+                         minPrice: $minPrice, maxPrice: $maxPrice) {
+                    edges { cursor node { name } }
+                    pageInfo { endCursor hasNextPage }
+                }
+            }
+        """
+        result = self.query(query, dict(first=first, after=after, **filters))
+        self.assertNotIn('errors', result)
+        return result['data']['products']
+
+    def test_cursor_walks_every_product_once_in_order(self):
+        names, after = [], None
+        while True:
+            page = self.products_page(3, after)
+            names += [edge['node']['name'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(names, sorted(p.name for p in self.products))
+
+    def test_page_reads_a_bounded_number_of_rows(self):
+        page = self.products_page(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.products_page(2, page['pageInfo']['endCursor'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 3', queries[0]['sql'])
+
+    def test_duplicate_sort_keys_are_split_by_id(self):
+        Product.objects.update(name='Same')
+        first = self.products_page(4)
+        second = self.products_page(10, first['pageInfo']['endCursor'])
+        self.assertEqual(len(first['edges']) + len(second['edges']), 10)
+
+    def test_filters(self):
+        category = self.products[0].category
+        Product.objects.filter(pk=self.products[1].pk).update(price='50.00')
+        page = self.products_page(10, categoryId=category.pk, minPrice='10')
+        self.assertEqual([e['node']['name'] for e in page['edges']], [self.products[1].name])
+        page = self.products_page(10, maxPrice='10')
+        self.assertEqual(len(page['edges']), 9)
+
+    def test_orders_are_newest_first_and_filter_by_status(self):
+        first = self.create_order(self.products[:1])
+        second = self.create_order(self.products[:1])
+        Order.objects.filter(pk=first.pk).update(status='canceled')
+        result = self.query('{ orders { edges { node { id } } } }')
+        ids = [e['node']['id'] for e in result['data']['orders']['edges']]
+        self.assertEqual(ids, [str(second.pk), str(first.pk)])
+        result = self.query('{ orders(status: "canceled") { edges { node { id } } } }')
+        self.assertEqual(result['data']['orders']['edges'], [{'node': {'id': str(first.pk)}}])
+
+    def test_invalid_cursor_is_rejected(self):
+        result = self.query('{ products(after: "garbage") { edges { cursor } } }')
+        self.assertIn('Invalid cursor', result['errors'][0]['message'])
+
+
+class CreateOrderTests(GraphQLTestCase):
+    mutation = """
+        mutation($productIds: [ID]!, $quantities: [Int]!) {
+            createOrder(name: "Ivan", surname: "Ivanov", phoneNumber: "+70000000000",
+                        address: "Moscow", email: "ivan@example.com",
+                        productIds: $productIds, quantities: $quantities) {
+                order { id orderitemSet { quantity product { name } } }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.products = self.create_catalog(categories=1, products_per_category=10)
+        self.ids = [str(p.pk) for p in self.products]
+
+    def create(self, product_ids, quantities):
+        return self.query(self.mutation, {'productIds': product_ids, 'quantities': quantities})
+
+    def test_query_count_does_not_depend_on_line_count(self):
+        # in_bulk, the stock reservation, the order insert and the bulk insert
+        # of the items, plus the statements of three savepoints (mutation,
+        # reservation, order number retry); the payload is resolved from memory
+        with self.assertNumQueries(10):
+            result = self.create(self.ids[:1], [1])
+        with self.assertNumQueries(10):
+            result = self.create(self.ids, [2] * 10)
+        items = result['data']['createOrder']['order']['orderitemSet']
+        self.assertEqual(len(items), 10)
+        self.assertEqual(OrderItem.objects.count(), 11)
+
+    def test_mismatched_lengths_are_rejected(self):
+        result = self.create(self.ids[:2], [1])
+        self.assertIn('same length', result['errors'][0]['message'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_missing_product_rolls_back_whole_order(self):
+        result = self.create([self.ids[0], '999999'], [1, 1])
+        self.assertIn('999999', result['errors'][0]['message'])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_non_positive_quantities_are_rejected(self):
+        result = self.create(self.ids[:1], [0])
+        self.assertIn('positive', result['errors'][0]['message'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_prices_and_totals_are_stored(self):
+        Product.objects.filter(pk=self.products[1].pk).update(price='0.50')
+        self.create(self.ids[:2], [3, 2])
+        order = Order.objects.get()
+        lines = order.orderitem_set.order_by('pk').values_list('unit_price', 'quantity', 'total')
+        self.assertEqual([tuple(map(str, line)) for line in lines], [('9.99', '3', '29.97'), ('0.50', '2', '1.00')])
+        self.assertEqual(str(order.total), '30.97')
+        # Later price changes do not rewrite history.
+        Product.objects.update(price='1.00')
+        result = self.query('{ orders { edges { node { total orderitemSet { unitPrice total } } } } }')
+        node = result['data']['orders']['edges'][0]['node']
+        self.assertEqual(node['total'], '30.97')
+        self.assertEqual(node['orderitemSet'][0], {'unitPrice': '9.99', 'total': '29.97'})
+
+    def test_lines_saved_on_their_own_update_the_total(self):
+        self.create(self.ids[:2], [3, 2])
+        order = Order.objects.get()
+        first, second = order.orderitem_set.order_by('pk')
+        first.quantity = 1
+        first.save()
+        order.refresh_from_db()
+        self.assertEqual(str(order.total), '29.97')
+        second.delete()
+        OrderItem.objects.create(order=order, product=self.products[2], quantity=4)
+        order.refresh_from_db()
+        self.assertEqual(str(order.total), '49.95')
+        order.delete()
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_derived_fields_are_not_editable(self):
+        self.assertNotIn('total', modelform_factory(Order, fields='__all__').base_fields)
+        fields = modelform_factory(OrderItem, fields='__all__').base_fields
+        self.assertEqual(list(fields), ['order', 'product', 'quantity'])
+
+
+class StockReservationTests(GraphQLTestCase):
+    def setUp(self):
+        self.product = self.create_catalog(categories=1, products_per_category=1)[0]
+        Product.objects.filter(pk=self.product.pk).update(quantity=5)
+
+    def create(self, quantities):
+        return self.query(CreateOrderTests.mutation, {
+            'productIds': [str(self.product.pk)] * len(quantities), 'quantities': quantities,
+        })
+
+    def set_status(self, order_id, status):
+        return self.query(
+            'mutation($id: ID!, $status: String) { updateOrder(orderId: $id, status: $status) { order { id } } }',
+            {'id': order_id, 'status': status},
+        )
+
+    def stock(self):
+        return Product.objects.get(pk=self.product.pk).quantity
+
+    def test_order_reserves_stock(self):
+        result = self.create([2, 1])
+        self.assertNotIn('errors', result)
+        self.assertEqual(self.stock(), 2)
+
+    def test_order_exceeding_stock_is_rejected_without_side_effects(self):
+        result = self.create([3, 3])
+        self.assertIn('Not enough stock', result['errors'][0]['message'])
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancel_and_refund_release_stock_once(self):
+        order_id = self.create([4])['data']['createOrder']['order']['id']
+        self.set_status(order_id, 'canceled')
+        self.assertEqual(self.stock(), 5)
+        self.set_status(order_id, 'pending')
+        self.assertEqual(self.stock(), 1)
+        for status in ['accepted', 'prepare', 'created', 'completed', 'refunded']:
+            self.assertNotIn('errors', self.set_status(order_id, status))
+        self.assertEqual(self.stock(), 5)
+
+    def test_update_product_does_not_overwrite_reserved_stock(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.create([2])
+        stale.name = 'Renamed'
+        self.query(
+            'mutation($id: ID!) { updateProduct(id: $id, name: "Renamed") { product { id } } }',
+            {'id': stale.pk},
+        )
+        self.assertEqual(self.stock(), 3)
+
+
+class OrderWorkflowTests(GraphQLTestCase):
+    mutation = """
+        mutation($id: ID!, $status: String, $address: String) {
+            updateOrder(orderId: $id, status: $status, address: $address) { order { status } }
+        }
+    """
+
+    def setUp(self):
+        self.order = self.create_order(self.create_catalog(categories=1, products_per_category=1))
+
+    def update(self, **variables):
+        return self.query(self.mutation, {'id': self.order.pk, **variables})
+
+    def test_transitions_follow_the_graph(self):
+        result = self.update(status='accepted')
+        self.assertEqual(result['data']['updateOrder']['order']['status'], 'Заказ принят')
+        result = self.update(status='refunded')
+        self.assertEqual(result['errors'][0]['message'], 'Cannot change order status from "accepted" to "refunded".')
+        result = self.update(status='lost')
+        self.assertEqual(result['errors'][0]['message'], 'Unknown order status "lost".')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'accepted')
+
+    def test_history_is_recorded(self):
+        for status in ['accepted', 'canceled', 'pending']:
+            self.update(status=status)
+        self.update(address='Kazan')
+        result = self.query('{ orders { edges { node { statusHistory { fromStatus toStatus } } } } }')
+        history = result['data']['orders']['edges'][0]['node']['statusHistory']
+        self.assertEqual([(h['fromStatus'], h['toStatus']) for h in history], [
+            ('pending', 'accepted'), ('accepted', 'canceled'), ('canceled', 'pending'),
+        ])
+
+    def test_only_changed_fields_are_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.update(address='Kazan')
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "address" = ', updates[0])
+        self.assertNotIn('"name"', updates[0])
+        with CaptureQueriesContext(connection) as queries:
+            self.update(address='Kazan', status='pending')
+        self.assertFalse([q for q in queries if q['sql'].startswith(('UPDATE', 'INSERT'))])
+
+    def test_bulk_transition_writes_history_once(self):
+        orders = [self.order] + [self.create_order([]) for _ in range(4)]
+        Order.objects.filter(pk=orders[1].pk).update(status='accepted')
+        orders[1].status = 'accepted'
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                workflow.change_status(orders, 'canceled')
+        inserts = [q['sql'] for q in queries if 'INSERT INTO "products_orderstatuschange"' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OrderStatusChange.objects.count(), 5)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'canceled'})
+
+    def test_stale_status_is_a_concurrent_change(self):
+        Order.objects.filter(pk=self.order.pk).update(status='accepted')
+        with self.assertRaises(workflow.ConcurrentTransition), transaction.atomic():
+            workflow.change_status([self.order], 'canceled')
+        self.assertFalse(OrderStatusChange.objects.exists())
+
+
+class StockContentionTests(TransactionTestCase):
+    """Concurrent checkouts against one product must never oversell it."""
+
+    threads = 6
+    attempts = 5
+    stock = 20
+
+    def checkout(self, product_id, results):
+        client = Client()
+        try:
+            for _ in range(self.attempts):
+                while True:
+                    response = client.post('/graphql/', json.dumps({
+                        'query': CreateOrderTests.mutation,
+                        'variables': {'productIds': [product_id], 'quantities': [1]},
+                    }), content_type='application/json').json()
+                    errors = response.get('errors') or []
+                    # SQLite serialises writers; a locked database is a retry, not an outcome.
+                    if not any('locked' in error['message'] for error in errors):
+                        break
+                    time.sleep(0.005)
+                results.append(not errors)
+        finally:
+            connection.close()
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        category = Category.objects.create(name='Contention')
+        product = Product.objects.create(
+            name='Hot item', description='', price='1.00', quantity=self.stock, category=category,
+        )
+        results = []
+        workers = [
+            threading.Thread(target=self.checkout, args=(str(product.pk), results))
+            for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(results), self.threads * self.attempts)
+        self.assertEqual(results.count(True), self.stock)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(OrderItem.objects.count(), self.stock)
+
+
+class OrderNumberingTests(TestCase):
+    def create_order(self):
+        return Order.objects.create(
+            name='Ivan', surname='Ivanov', phone_number='+70000000000', address='Moscow',
+        )
+
+    def test_uuid7_sorts_by_time(self):
+        numbers = [uuid7(timestamp_ms=ms) for ms in (1, 2, 2 ** 40)]
+        self.assertEqual(sorted(numbers), numbers)
+        self.assertTrue(all(n.version == 7 for n in numbers))
+        self.assertEqual(uuid7(timestamp_ms=5, rand=0).int >> 80, 5)
+
+    def test_new_orders_get_time_ordered_numbers(self):
+        first, second = self.create_order(), self.create_order()
+        self.assertEqual(first.order_number.version, 7)
+        self.assertLessEqual(first.order_number.int >> 80, second.order_number.int >> 80)
+        self.assertEqual(len(first.receipt_number), 7)
+
+    @override_settings(RECEIPT_NUMBER_GENERATOR='products.tests.scripted_receipt_number')
+    def test_receipt_number_collision_is_retried(self):
+        scripted_receipt_numbers[:] = ['AAAAAAA', 'AAAAAAA', 'AAAAAAA', 'BBBBBBB']
+        self.create_order()
+        order = self.create_order()
+        self.assertEqual(order.receipt_number, 'BBBBBBB')
+        self.assertEqual(Order.objects.count(), 2)
+
+    @override_settings(RECEIPT_NUMBER_GENERATOR='products.tests.scripted_receipt_number')
+    def test_persistent_collision_gives_up(self):
+        scripted_receipt_numbers[:] = ['AAAAAAA'] * (Order.NUMBER_ATTEMPTS + 1)
+        self.create_order()
+        with self.assertRaises(IntegrityError):
+            self.create_order()
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class DocumentCacheTests(GraphQLTestCase):
+    query_text = '{ categories { edges { node { name } } } }'
+
+    def setUp(self):
+        GraphQLView.document_cache.clear()
+        Category.objects.create(name='Pizza')
+
+    def persisted(self, sha256, query=None):
+        body = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha256}}}
+        if query is not None:
+            body['query'] = query
+        return self.client.post('/graphql/', json.dumps(body), content_type='application/json').json()
+
+    def test_repeated_query_is_parsed_once(self):
+        self.query(self.query_text)
+        result = self.query(self.query_text)
+        self.assertEqual(result['data']['categories']['edges'], [{'node': {'name': 'Pizza'}}])
+        stats = self.client.get('/graphql/stats/').json()['documents']
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+
+    def test_invalid_documents_are_not_cached(self):
+        result = self.query('{ categories { nope } }')
+        self.assertIn('nope', result['errors'][0]['message'])
+        result = self.query('{ categories {')
+        self.assertIn('Syntax Error', result['errors'][0]['message'])
+        self.assertEqual(GraphQLView.document_cache.stats()['size'], 0)
+
+    def test_automatic_persisted_query_round_trip(self):
+        sha256 = query_hash(self.query_text)
+        result = self.persisted(sha256)
+        self.assertEqual(result['errors'][0]['message'], 'PersistedQueryNotFound')
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+        self.assertNotIn('errors', self.persisted(sha256, self.query_text))
+        result = self.persisted(sha256)
+        self.assertEqual(result['data']['categories']['edges'], [{'node': {'name': 'Pizza'}}])
+
+    def test_persisted_query_over_get(self):
+        sha256 = query_hash(self.query_text)
+        self.persisted(sha256, self.query_text)
+        extensions = json.dumps({'persistedQuery': {'version': 1, 'sha256Hash': sha256}})
+        result = self.client.get(
+            '/graphql/', {'extensions': extensions}, HTTP_ACCEPT='application/json',
+        ).json()
+        self.assertEqual(result['data']['categories']['edges'], [{'node': {'name': 'Pizza'}}])
+
+    def test_hash_mismatch_is_rejected(self):
+        result = self.persisted('0' * 64, self.query_text)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_HASH_MISMATCH')
+
+    def test_least_recently_used_documents_are_evicted(self):
+        cache = GraphQLView.document_cache
+        maxsize, cache.maxsize = cache.maxsize, 2
+        try:
+            for name in ('a', 'b', 'a', 'c'):
+                self.query(f'query {name} {{ categories {{ edges {{ cursor }} }} }}')
+            self.assertEqual(cache.stats()['size'], 2)
+            self.query('query a { categories { edges { cursor } } }')
+            self.assertEqual(cache.stats()['hits'], 2)
+        finally:
+            cache.maxsize = maxsize
+
+
+@override_settings(GRAPHQL_RESPONSE_CACHE_ALIAS='default')
+class ResponseCacheTests(GraphQLTestCase):
+    catalog = '{ products { edges { node { name quantity category { name } } } } }'
+
+    def setUp(self):
+        cache.clear()
+        self.products = self.create_catalog(categories=1, products_per_category=2)
+
+    def get(self, query, **headers):
+        return self.client.get('/graphql/', {'query': query}, HTTP_ACCEPT='application/json', **headers)
+
+    def names(self, result):
+        return [edge['node']['name'] for edge in result['data']['products']['edges']]
+
+    def test_repeated_catalog_query_skips_the_database(self):
+        first = self.query(self.catalog)
+        with self.assertNumQueries(0):
+            second = self.query(self.catalog)
+        self.assertEqual(first, second)
+
+    def test_variables_are_part_of_the_key(self):
+        query = 'query($first: Int) { products(first: $first) { edges { node { name } } } }'
+        self.assertEqual(len(self.names(self.query(query, {'first': 1}))), 1)
+        self.assertEqual(len(self.names(self.query(query, {'first': 2}))), 2)
+
+    def test_writes_invalidate_cached_reads(self):
+        self.query(self.catalog)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Product new', description='', price='1.00', quantity=1,
+                category=self.products[0].category,
+            )
+        self.assertIn('Product new', self.names(self.query(self.catalog)))
+        category = self.products[0].category
+        category.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        result = self.query(self.catalog)
+        self.assertEqual(result['data']['products']['edges'][0]['node']['category']['name'], 'Renamed')
+
+    def test_stock_reservation_invalidates_quantities(self):
+        self.query(self.catalog)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query(CreateOrderTests.mutation, {'productIds': [str(self.products[0].pk)], 'quantities': [7]})
+        quantities = [e['node']['quantity'] for e in self.query(self.catalog)['data']['products']['edges']]
+        self.assertEqual(quantities, [93, 100])
+
+    def test_orders_are_never_cached(self):
+        self.create_order(self.products)
+        for query in (
+            '{ orders { edges { node { id } } } }',
+            '{ products { edges { node { orderSet { id } } } } }',
+            '{ products { edges { node { id } } } orders { edges { node { id } } } }',
+        ):
+            self.query(query)
+            with CaptureQueriesContext(connection) as queries:
+                self.query(query)
+            self.assertTrue(queries, query)
+
+    def test_etag_short_circuits_get_requests(self):
+        response = self.get(self.catalog)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.get(self.catalog, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        for header, status in (
+            (f'"other", W/{etag}', 304),
+            ('*', 304),
+            (etag[:-5] + '"', 200),
+            (f'"x{etag[1:]}', 200),
+        ):
+            self.assertEqual(self.get(self.catalog, HTTP_IF_NONE_MATCH=header).status_code, status, header)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        response = self.get(self.catalog, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class AsyncViewTests(GraphQLTestCase):
+    view = staticmethod(AsyncGraphQLView.as_view(schema=schema))
+
+    def setUp(self):
+        self.products = self.create_catalog()
+        self.orders = [self.create_order(self.products[i:i + 4]) for i in range(5)]
+
+    async def aquery(self, query, variables=None):
+        request = AsyncRequestFactory().post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+        )
+        response = await self.view(request)
+        return json.loads(response.content)
+
+    def test_nested_relations_are_batched_per_level(self):
+        query = '''{ orders { edges { node {
+            id products { name category { name } } orderitemSet { order { id } }
+        } } } }'''
+        with self.assertNumQueries(3):
+            result = async_to_sync(self.aquery)(query)
+        self.assertNotIn('errors', result)
+        self.assertEqual(len(result['data']['orders']['edges']), 5)
+
+    def test_loader_batches_concurrent_siblings(self):
+        loaders = Loaders()
+        items = list(OrderItem.objects.all())
+
+        async def load_all():
+            return await asyncio.gather(*(loaders.load_related(item, 'product') for item in items))
+
+        with self.assertNumQueries(1):
+            products = async_to_sync(load_all)()
+        self.assertEqual(len(products), 20)
+
+    async def test_matches_sync_view(self):
+        query = '''{ categories { edges { node {
+            name productSet { name orderSet { id } orderitemSet { quantity } }
+        } } } }'''
+        result = await self.aquery(query)
+        self.assertEqual(result, await sync_to_async(self.query)(query))
+
+    async def test_pagination(self):
+        query = 'query($after: String) { products(first: 5, after: $after) { edges { node { name } } pageInfo { endCursor } } }'
+        first = (await self.aquery(query))['data']['products']
+        second = (await self.aquery(query, {'after': first['pageInfo']['endCursor']}))['data']['products']
+        self.assertEqual(len(first['edges']) + len(second['edges']), 9)
+
+    async def test_mutations_run_in_one_transaction(self):
+        result = await self.aquery(CreateOrderTests.mutation, {
+            'productIds': [str(self.products[0].pk), str(self.products[1].pk)], 'quantities': [2, 200],
+        })
+        self.assertIn('errors', result)
+        self.assertEqual(await Order.objects.acount(), 5)
+        result = await self.aquery(CreateOrderTests.mutation, {
+            'productIds': [str(self.products[0].pk)], 'quantities': [2],
+        })
+        self.assertNotIn('errors', result)
+        self.assertEqual(await Order.objects.acount(), 6)
+        product = await Product.objects.aget(pk=self.products[0].pk)
+        self.assertEqual(product.quantity, 98)
+
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'products.tests.EventLoopGuardCache'}},
+        GRAPHQL_RESPONSE_CACHE_ALIAS='default',
+        GRAPHQL_RATE_LIMIT={'RATE': 100},
+        GRAPHQL_RATE_LIMIT_STORE={'BACKEND': 'products.throttling.CacheStore'},
+    )
+    def test_cache_is_awaited(self):
+        throttling.get_store.cache_clear()
+        self.addCleanup(throttling.get_store.cache_clear)
+        request = lambda **headers: AsyncRequestFactory().get(
+            '/graphql/', {'query': '{ categories { edges { node { name } } } }'}, headers=headers,
+        )
+        first = async_to_sync(self.view)(request())
+        with self.assertNumQueries(0):
+            cached = async_to_sync(self.view)(request())
+            not_modified = async_to_sync(self.view)(request(If_None_Match=first['ETag']))
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIsNotNone(cache.get(throttling.get_store().key('ip:127.0.0.1')))
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def connect(self, **environ):
+        environ.setdefault('DATABASE_NAME', os.path.join(self.tmp.name, 'db.sqlite3'))
+        handler = ConnectionHandler({'default': database_config(None, environ)})
+        self.addCleanup(handler.close_all)
+        return handler['default']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def pragma(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_sqlite_connections_are_tuned(self):
+        conn = self.connect(SQLITE_BUSY_TIMEOUT='1234')
+        self.assertEqual(self.pragma(conn, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(conn, 'synchronous'), 1)
+        self.assertEqual(self.pragma(conn, 'busy_timeout'), 1234)
+        self.assertEqual(self.pragma(conn, 'mmap_size'), 256 * 1024 * 1024)
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        conn = self.connect()
+        other = self.connect(DATABASE_NAME=conn.settings_dict['NAME'], SQLITE_BUSY_TIMEOUT='0')
+        conn.ensure_connection()
+        other.ensure_connection()
+        # what transaction.atomic() runs first; a deferred BEGIN would not lock
+        conn._start_transaction_under_autocommit()
+        try:
+            with self.assertRaisesMessage(Exception, 'database is locked'):
+                other._start_transaction_under_autocommit()
+        finally:
+            conn.cursor().execute('ROLLBACK')
+
+    def test_connection_lifetime_and_profiles(self):
+        config = database_config(Path(self.tmp.name), {'DATABASE_CONN_MAX_AGE': 'none', 'DATABASE_CONN_HEALTH_CHECKS': '0'})
+        self.assertIsNone(config['CONN_MAX_AGE'])
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+        config = database_config(None, {'DATABASE_ENGINE': 'postgresql', 'DATABASE_POOLER': 'pgbouncer'})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+        with self.assertRaises(ValueError):
+            database_config(None, {'DATABASE_ENGINE': 'oracle'})
+
+    def test_replicas(self):
+        base_dir = Path(self.tmp.name)
+        self.assertEqual(replica_configs(base_dir, {}), {})
+        configs = replica_configs(base_dir, {'DATABASE_REPLICAS': '/tmp/a.sqlite3, /tmp/b.sqlite3', 'SQLITE_BUSY_TIMEOUT': '10'})
+        self.assertEqual(list(configs), ['replica_1', 'replica_2'])
+        self.assertEqual(configs['replica_2']['NAME'], '/tmp/b.sqlite3')
+        self.assertEqual(configs['replica_2']['OPTIONS']['timeout'], 0.01)
+        self.assertEqual(configs['replica_1']['TEST'], {'MIRROR': 'default'})
+        configs = replica_configs(None, {
+            'DATABASE_ENGINE': 'postgresql', 'DATABASE_PORT': '5432', 'DATABASE_REPLICAS': 'db-1,db-2:6432',
+        })
+        self.assertEqual([(c['HOST'], c['PORT']) for c in configs.values()], [('db-1', '5432'), ('db-2', '6432')])
+
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    environ = {'DJANGO_SECRET_KEY': 'secret', 'DJANGO_ALLOWED_HOSTS': 'shop.example.com'}
+
+    def load(self, **environ):
+        with mock.patch.dict(os.environ, {**self.environ, **environ}):
+            return runpy.run_module('server.settings_production')
+
+    def test_shared_cache(self):
+        settings = self.load(CACHE_URL='redis://cache:6379/1')
+        self.assertEqual(settings['CACHES']['default'], {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': ['redis://cache:6379/1'],
+        })
+        self.assertEqual(settings['GRAPHQL_RESPONSE_CACHE_ALIAS'], 'default')
+        self.assertEqual(settings['GRAPHQL_RATE_LIMIT_STORE']['BACKEND'], 'products.throttling.CacheStore')
+        self.assertEqual(cache_config('memcached://a:11211,memcached://b')['LOCATION'], ['a:11211', 'b'])
+        with self.assertRaises(ValueError):
+            cache_config('locmem://')
+
+    def test_allowed_hosts_are_required(self):
+        self.assertEqual(self.load(DJANGO_ALLOWED_HOSTS='shop.example.com, api.example.com')['ALLOWED_HOSTS'], [
+            'shop.example.com', 'api.example.com',
+        ])
+        with mock.patch.dict(os.environ, self.environ):
+            del os.environ['DJANGO_ALLOWED_HOSTS']
+            with self.assertRaises(KeyError):
+                runpy.run_module('server.settings_production')
+
+    def test_features_needing_a_shared_cache(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('CACHE_URL', None)
+            settings = self.load()
+            self.assertIsNone(settings['GRAPHQL_RESPONSE_CACHE_ALIAS'])
+            with mock.patch('server.settings.DATABASE_REPLICAS', ['replica_1']):
+                with self.assertRaisesMessage(ImproperlyConfigured, 'CACHE_URL'):
+                    self.load()
+
+
+class QueryCostTests(GraphQLTestCase):
+    cyclic = '''query($first: Int) { orders(first: $first) { edges { node {
+        products { orderSet { products { orderSet { id } } } }
+    } } } }'''
+
+    def setUp(self):
+        self.create_order(self.create_catalog(categories=1, products_per_category=2))
+
+    def post(self, query, variables=None, **headers):
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+            **headers,
+        )
+
+    def test_cost_is_reported_in_extensions(self):
+        result = self.query('{ products(first: 20) { edges { node { name category { name } } } } }')
+        self.assertEqual(result['extensions']['cost'], {
+            'requested': 42, 'limit': 5000, 'depth': 5, 'depthLimit': 10,
+        })
+
+    def test_page_size_and_list_fan_out_multiply(self):
+        query = 'query($first: Int) { orders(first: $first) { edges { node { products { orderSet { id } } } } } }'
+        self.assertEqual(self.query(query, {'first': 10})['extensions']['cost']['requested'], 122)
+        # without "first" the resolver returns a full page
+        self.assertEqual(self.query(query)['extensions']['cost']['requested'], 1202)
+        self.assertEqual(self.query(query, {'first': 10 ** 6})['extensions']['cost']['requested'], 1202)
+
+    def test_fragments_are_counted(self):
+        query = '''{ orders(first: 10) { edges { node { ...Fields } } } }
+            fragment Fields on OrderType { products { name } }'''
+        self.assertEqual(self.query(query)['extensions']['cost']['requested'], 22)
+
+    def test_expensive_queries_are_rejected_before_resolving(self):
+        with self.assertNumQueries(0):
+            response = self.post(self.cyclic, {'first': 100})
+        self.assertEqual(response.status_code, 400)
+        result = response.json()
+        self.assertNotIn('data', result)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertEqual(result['extensions']['cost']['requested'], 111202)
+        self.assertNotIn('errors', self.query(self.cyclic, {'first': 1}))
+
+    @override_settings(GRAPHQL_QUERY_COST={'MAX_DEPTH': 6})
+    def test_deep_queries_are_rejected(self):
+        result = self.query(self.cyclic, {'first': 1})
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_DEEP')
+        self.assertEqual(result['extensions']['cost']['depth'], 8)
+
+    @override_settings(GRAPHQL_CLIENT_BUDGETS={'reporting': {'MAX_COST': 200000}, 'widget': {'MAX_COST': 10}})
+    def test_budgets_per_client(self):
+        response = self.post(self.cyclic, {'first': 100}, HTTP_X_API_KEY='reporting')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['extensions']['cost']['limit'], 200000)
+        response = self.post('{ categories { edges { node { name } } } }', HTTP_X_API_KEY='widget')
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        response = self.post(self.cyclic, {'first': 100}, HTTP_X_API_KEY='unknown')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0)
+class TracingTests(GraphQLTestCase):
+    query_text = '{ orders { edges { node { orderitemSet { quantity product { name } } } } } }'
+
+    def setUp(self):
+        products = self.create_catalog(categories=1, products_per_category=3)
+        for i in range(3):
+            self.create_order(products[i:])
+        metrics.resolver_duration.clear()
+        metrics.sql_duration.clear()
+
+    def traced(self, query):
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': query}), content_type='application/json',
+            HTTP_X_GRAPHQL_TRACE='1',
+        )
+        return response.json()
+
+    def test_trace_is_reported_on_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.traced(self.query_text)
+        trace = result['extensions']['trace']
+        self.assertEqual(trace['sqlQueries'], len(queries))
+        resolvers = trace['resolvers']
+        self.assertEqual(resolvers['orders']['calls'], 1)
+        self.assertEqual(resolvers['orders.edges.node.orderitemSet']['calls'], 3)
+        self.assertEqual(resolvers['orders.edges.node.orderitemSet.product.name']['calls'], 6)
+        self.assertEqual(
+            sum(stats.get('sqlQueries', 0) for stats in resolvers.values()), len(queries),
+        )
+
+    def test_untraced_requests_skip_the_middleware(self):
+        result = self.query(self.query_text)
+        self.assertNotIn('trace', result['extensions'])
+        self.assertNotIn('graphql_resolver_duration_seconds_count', self.client.get('/metrics').content.decode())
+
+    @override_settings(GRAPHQL_TRACE_SAMPLE_RATE=1)
+    def test_sampled_requests_feed_metrics_without_a_trace(self):
+        result = self.query(self.query_text)
+        self.assertNotIn('trace', result['extensions'])
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4')
+        body = response.content.decode()
+        self.assertIn('graphql_resolver_duration_seconds_count{field="OrderItemType.product"} 6', body)
+        self.assertIn('graphql_resolver_duration_seconds_bucket{field="Query.orders",le="+Inf"} 1', body)
+        self.assertIn('graphql_request_duration_seconds_count{operation="query"}', body)
+        self.assertIn('graphql_resolver_sql_duration_seconds_count{field="Query.orders"} 2', body)
+
+    def test_async_view_is_traced(self):
+        request = AsyncRequestFactory().post(
+            '/graphql/', json.dumps({'query': self.query_text}), content_type='application/json',
+            headers={'X-GraphQL-Trace': '1'},
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(AsyncViewTests.view)(request)
+        trace = json.loads(response.content)['extensions']['trace']
+        self.assertEqual(trace['sqlQueries'], len(queries))
+        self.assertEqual(trace['resolvers']['orders.edges.node.orderitemSet']['calls'], 3)
+
+
+class CatalogImportTests(GraphQLTestCase):
+    mutation = """
+        mutation($products: [ProductInput!], $data: String, $format: String) {
+            bulkUpsertProducts(products: $products, data: $data, format: $format) {
+                count categoriesCreated
+            }
+        }
+    """
+
+    def feed(self, count, category='Feed', price='1.50'):
+        return [
+            {'sku': f'SKU-{i}', 'name': f'Item {i}', 'description': 'Description', 'price': price,
+             'quantity': 10, 'category': category}
+            for i in range(count)
+        ]
+
+    def test_products_are_inserted_then_updated_by_sku(self):
+        Category.objects.create(name='Feed')
+        result = self.query(self.mutation, {'products': self.feed(3)})
+        self.assertEqual(result['data']['bulkUpsertProducts'], {'count': 3, 'categoriesCreated': 0})
+        created_at = Product.objects.get(sku='SKU-0').created_at
+
+        result = self.query(self.mutation, {'products': self.feed(4, category='New', price='2.00')})
+        self.assertEqual(result['data']['bulkUpsertProducts'], {'count': 4, 'categoriesCreated': 1})
+        self.assertEqual(Product.objects.count(), 4)
+        product = Product.objects.get(sku='SKU-0')
+        self.assertEqual((str(product.price), product.category.name), ('2.00', 'New'))
+        self.assertEqual(product.created_at, created_at)
+
+    def test_categories_are_resolved_once_per_chunk(self):
+        rows = [(i, row) for i, row in enumerate(self.feed(2500), 1)]
+        for i, (_, row) in enumerate(rows):
+            row['category'] = f'Category {i % 7}'
+        with CaptureQueriesContext(connection) as queries:
+            result = catalog.import_products(rows, chunk_size=1000)
+        self.assertEqual((result.products, result.categories_created), (2500, 7))
+        self.assertEqual(Category.objects.count(), 7)
+        category_queries = [q['sql'] for q in queries if 'products_category' in q['sql']]
+        # one lookup per chunk, one insert for the new categories
+        self.assertEqual(len(category_queries), 3 + 1)
+        # SQLite takes at most 999 parameters, i.e. 124 products, per INSERT
+        self.assertEqual(sum('INSERT INTO "products_product"' in q['sql'] for q in queries), 9 + 9 + 5)
+
+    def test_csv_and_jsonl_documents(self):
+        data = 'sku,name,description,price,quantity,category\nA-1,Apple,"Red, sweet",0.99,5,Fruit\n'
+        result = self.query(self.mutation, {'data': data, 'format': 'csv'})
+        self.assertEqual(result['data']['bulkUpsertProducts']['count'], 1)
+        self.assertEqual(Product.objects.get(sku='A-1').description, 'Red, sweet')
+        data = '\n'.join(json.dumps(row) for row in self.feed(2)) + '\n'
+        result = self.query(self.mutation, {'data': data})
+        self.assertEqual(result['data']['bulkUpsertProducts']['count'], 2)
+
+    def test_invalid_rows_abort_the_import(self):
+        rows = self.feed(3)
+        rows[2]['price'] = 'free'
+        data = '\n'.join(json.dumps(row) for row in rows)
+        result = self.query(self.mutation, {'data': data, 'format': 'jsonl'})
+        self.assertEqual(result['errors'][0]['message'], "Line 3: invalid price 'free'")
+        self.assertFalse(Product.objects.exists())
+        rows[2] = {'sku': 'X'}
+        result = self.query(self.mutation, {'data': '\n'.join(json.dumps(row) for row in rows)})
+        self.assertEqual(result['errors'][0]['message'], 'Line 3: missing name, description, price, quantity, category')
+
+    def test_management_commands_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'feed.jsonl')
+            with open(path, 'w') as f:
+                f.writelines(json.dumps(row) + '\n' for row in self.feed(5))
+            out = io.StringIO()
+            call_command('import_catalog', path, '--chunk-size', '2', stdout=out)
+            self.assertIn('Imported 5 products, created 1 categories.', out.getvalue())
+
+            path = os.path.join(tmp, 'export.csv')
+            call_command('export_catalog', path, '--chunk-size', '2', stderr=io.StringIO())
+            with open(path, newline='') as f:
+                exported = list(csv.DictReader(f))
+        self.assertEqual([row['sku'] for row in exported], [f'SKU-{i}' for i in range(5)])
+        self.assertEqual(exported[0]['category'], 'Feed')
+        self.assertEqual(exported[0]['price'], '1.50')
+
+        out = io.StringIO()
+        call_command('export_catalog', stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(out.getvalue().splitlines()[4])['name'], 'Item 4')
+
+        with self.assertRaisesMessage(CommandError, 'Cannot tell the format'):
+            call_command('import_catalog', 'feed.txt')
+
+
+class SearchTests(GraphQLTestCase):
+    def setUp(self):
+        self.lamps = Category.objects.create(name='Lamps')
+        self.cables = Category.objects.create(name='Cables')
+        for name, description, category in [
+            ('Blue cable', 'USB cable, 2 m', self.cables),
+            ('Cable tie', 'Pack of 100', self.cables),
+            ('Desk lamp', 'Warm light with a blue cable', self.lamps),
+            ('Floor lamp', 'Tall and bright', self.lamps),
+        ]:
+            Product.objects.create(name=name, description=description, price='5.00', quantity=1, category=category)
+
+    def search(self, query, first=None, after=None, category_id=None):
+        result = self.query(
+            """
+            query($query: String!, $first: Int, $after: String, $categoryId: ID) {
+                searchProducts(query: $query, first: $first, after: $after, categoryId: $categoryId) {
+                    edges { node { name } }
+                    pageInfo { endCursor hasNextPage }
+                }
+            }
+            """,
+            {'query': query, 'first': first, 'after': after, 'categoryId': category_id},
+        )
+        self.assertNotIn('errors', result)
+        return result['data']['searchProducts']
+
+    def names(self, page):
+        return [edge['node']['name'] for edge in page['edges']]
+
+    def test_prefixes_of_every_word_must_match(self):
+        self.assertCountEqual(self.names(self.search('lam')), ['Desk lamp', 'Floor lamp'])
+        self.assertEqual(self.names(self.search('BLU LAM')), ['Desk lamp'])
+        self.assertEqual(self.names(self.search('cab "tie')), ['Cable tie'])
+        self.assertEqual(self.names(self.search('***')), [])
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.names(self.search('blue'))[-1], 'Desk lamp')
+        self.assertEqual(self.names(self.search('cable', category_id=self.lamps.pk)), ['Desk lamp'])
+
+    def test_pages_follow_relevance(self):
+        everything = self.names(self.search('cable'))
+        names, after = [], None
+        while True:
+            page = self.search('cable', first=1, after=after)
+            names += self.names(page)
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(names, everything)
+        self.assertEqual(len(names), 3)
+
+    def test_index_follows_writes(self):
+        product = Product.objects.get(name='Cable tie')
+        product.name = 'Zip tie'
+        product.save()
+        Product.objects.filter(name='Floor lamp').delete()
+        Product.objects.bulk_create([
+            Product(name='Zebra lamp', description='Striped', price='1.00', quantity=1, category=self.lamps),
+        ])
+        self.assertEqual(self.names(self.search('z')), ['Zebra lamp', 'Zip tie'])
+        self.assertEqual(self.names(self.search('floor')), [])
+        self.assertEqual(self.names(self.search('cable tie')), [])
+
+    def test_search_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search('cable', first=2)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('MATCH', queries[0]['sql'])
+
+
+class SalesAggregateTests(GraphQLTestCase):
+    def setUp(self):
+        self.products = self.create_catalog(categories=2, products_per_category=1)
+        days = ['2026-01-01T10:00:00Z', '2026-01-01T23:00:00Z', '2026-01-02T09:00:00Z', '2026-01-03T09:00:00Z']
+        statuses = ['pending', 'completed', 'canceled', 'completed']
+        for i, (day, status) in enumerate(zip(days, statuses)):
+            order = self.create_order(self.products[i % 2:], quantity=i + 1)
+            Order.objects.filter(pk=order.pk).update(
+                created_at=day, status=status, total=order.orderitem_set.aggregate(total=Sum('total'))['total'],
+            )
+
+    def test_revenue_by_day_skips_canceled_orders(self):
+        with self.assertNumQueries(1):
+            result = self.query('{ revenueByDay { day orders revenue } }')
+        self.assertEqual(result['data']['revenueByDay'], [
+            {'day': '2026-01-01', 'orders': 2, 'revenue': '39.96'},
+            {'day': '2026-01-03', 'orders': 1, 'revenue': '39.96'},
+        ])
+
+    def test_revenue_by_category(self):
+        with self.assertNumQueries(1):
+            result = self.query(
+                'query($before: DateTime) { revenueByCategory(createdBefore: $before) { categoryName units revenue } }',
+                {'before': '2026-01-03T00:00:00Z'},
+            )
+        self.assertEqual(result['data']['revenueByCategory'], [
+            {'categoryName': 'Category 1', 'units': 3, 'revenue': '29.97'},
+            {'categoryName': 'Category 0', 'units': 1, 'revenue': '9.99'},
+        ])
+
+    def test_revenue_by_status(self):
+        result = self.query(
+            'query($after: DateTime) { revenueByStatus(createdAfter: $after) { status orders revenue } }',
+            {'after': '2026-01-01T12:00:00Z'},
+        )
+        self.assertEqual(result['data']['revenueByStatus'], [
+            {'status': 'canceled', 'orders': 1, 'revenue': '59.94'},
+            {'status': 'completed', 'orders': 2, 'revenue': '59.94'},
+        ])
+
+
+class WebSocketClient:
+    """Drives an ASGI WebSocket application through in-memory queues."""
+
+    def __init__(self, app, path='/graphql/', subprotocols=('graphql-transport-ws',)):
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': path, 'subprotocols': list(subprotocols)}
+        self.task = asyncio.ensure_future(app(scope, self.inbox.get, self.outbox.put))
+
+    async def connect(self):
+        await self.inbox.put({'type': 'websocket.connect'})
+        return await self.outbox.get()
+
+    async def send(self, message):
+        await self.inbox.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        message = await asyncio.wait_for(self.outbox.get(), 5)
+        return json.loads(message['text']) if message['type'] == 'websocket.send' else message
+
+    async def subscribe(self, id, query, variables=None):
+        await self.send({'type': 'subscribe', 'id': id, 'payload': {'query': query, 'variables': variables}})
+
+    async def close(self):
+        await self.inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
+
+
+class SubscriptionTests(GraphQLTestCase):
+    status_changed = """
+        subscription($id: ID) {
+            orderStatusChanged(orderId: $id) { id status orderitemSet { quantity } }
+        }
+    """
+
+    def setUp(self):
+        self.products = self.create_catalog(categories=1, products_per_category=2)
+        self.orders = [self.create_order(self.products) for _ in range(2)]
+        self.app = GraphQLWebSocketApp(schema)
+
+    async def open(self, payload=None):
+        client = WebSocketClient(self.app)
+        self.assertEqual(await client.connect(), {'type': 'websocket.accept', 'subprotocol': 'graphql-transport-ws'})
+        await client.send({'type': 'connection_init', 'payload': payload})
+        self.assertEqual(await client.receive(), {'type': 'connection_ack'})
+        return client
+
+    async def subscribed(self, channel, count=1):
+        while get_broker().subscriber_count(channel) < count:
+            await asyncio.sleep(0)
+
+    def set_status(self, order, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                workflow.change_status([order], status)
+
+    def create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query(CreateOrderTests.mutation, {'productIds': [str(self.products[0].pk)], 'quantities': [2]})
+
+    def test_new_orders_are_pushed_after_commit(self):
+        async def session():
+            client = await self.open()
+            await client.subscribe('1', 'subscription { orderCreated { name total orderitemSet { quantity } } }')
+            await self.subscribed(events.ORDER_CREATED)
+            await sync_to_async(self.create)()
+            message = await client.receive()
+            await client.close()
+            return message
+
+        message = async_to_sync(session)()
+        self.assertEqual(message, {'type': 'next', 'id': '1', 'payload': {'data': {'orderCreated': {
+            'name': 'Ivan', 'total': '19.98', 'orderitemSet': [{'quantity': 2}],
+        }}}})
+
+    def test_subscribers_only_hear_about_their_order(self):
+        first, second = self.orders
+
+        async def session():
+            client = await self.open()
+            await client.subscribe('a', self.status_changed, {'id': str(second.pk)})
+            await self.subscribed(events.order_status_channel(second.pk))
+            await sync_to_async(self.set_status)(first, 'accepted')
+            await sync_to_async(self.set_status)(second, 'canceled')
+            message = await client.receive()
+            await client.send({'type': 'complete', 'id': 'a'})
+            while get_broker().subscriber_count(events.order_status_channel(second.pk)):
+                await asyncio.sleep(0)
+            await client.close()
+            return message
+
+        message = async_to_sync(session)()
+        self.assertEqual(message['payload']['data']['orderStatusChanged']['id'], str(second.pk))
+        self.assertEqual(message['payload']['data']['orderStatusChanged']['status'], 'Отменен')
+
+    def test_dashboards_share_the_reads_of_an_event(self):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        async def session():
+            clients = [await self.open() for _ in range(20)]
+            for client in clients:
+                await client.subscribe('all', self.status_changed)
+            await self.subscribed(events.ORDER_STATUS, 20)
+            # Delivery may start before the write returns here; the write
+            # itself (pending -> accepted) reads nothing.
+            start = len(queries)
+            await sync_to_async(self.set_status)(self.orders[0], 'accepted')
+            messages = [await client.receive() for client in clients]
+            for client in clients:
+                await client.close()
+            return messages, [sql for sql in queries[start:] if sql.startswith('SELECT')]
+
+        with connection.execute_wrapper(record):
+            messages, delivery_queries = async_to_sync(session)()
+        self.assertEqual(len(messages), 20)
+        self.assertEqual(messages[0]['payload']['data']['orderStatusChanged']['orderitemSet'], [
+            {'quantity': 1}, {'quantity': 1},
+        ])
+        # one query for the order lines, however many dashboards listen
+        self.assertEqual(len(delivery_queries), 1)
+
+    def test_protocol_errors(self):
+        async def session():
+            refused = WebSocketClient(self.app, subprotocols=())
+            rejection = await refused.connect()
+            await refused.task
+
+            early = WebSocketClient(self.app)
+            await early.connect()
+            await early.subscribe('1', self.status_changed)
+            unauthorized = await early.receive()
+            await early.task
+
+            client = await self.open()
+            await client.subscribe('2', '{ orders { edges { node { id } } } }')
+            not_a_subscription = await client.receive()
+            await client.subscribe('3', self.status_changed, {'id': 'x'})
+            invalid_id = await client.receive()
+            await client.send({'type': 'ping'})
+            pong = await client.receive()
+            await client.close()
+            return rejection, unauthorized, not_a_subscription, invalid_id, pong
+
+        rejection, unauthorized, not_a_subscription, invalid_id, pong = async_to_sync(session)()
+        self.assertEqual(rejection, {'type': 'websocket.close', 'code': 4400})
+        self.assertEqual(unauthorized['code'], 4401)
+        self.assertIn('Only subscription operations', not_a_subscription['payload'][0]['message'])
+        self.assertEqual(invalid_id['type'], 'error')
+        self.assertIn('Invalid order id', invalid_id['payload'][0]['message'])
+        self.assertEqual(pong, {'type': 'pong'})
+
+    @override_settings(GRAPHQL_CLIENT_BUDGETS={'partner': {'MAX_COST': 200_000}})
+    def test_subscriptions_are_held_to_the_cost_budget(self):
+        cyclic = """
+            subscription { orderCreated { orderitemSet { product { orderSet { orderitemSet {
+                product { orderSet { orderitemSet { product { name } } } }
+            } } } } } }
+        """
+
+        async def session():
+            client = await self.open()
+            await client.subscribe('1', cyclic)
+            rejected = await client.receive()
+            await client.close()
+            partner = await self.open({'X-Api-Key': 'partner'})
+            await partner.subscribe('1', cyclic)
+            await self.subscribed(events.ORDER_CREATED)
+            await partner.close()
+            return rejected
+
+        rejected = async_to_sync(session)()
+        self.assertEqual(rejected['type'], 'error')
+        self.assertEqual(rejected['payload'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+
+    @override_settings(GRAPHQL_SUBSCRIPTION_MAX_OPERATIONS=2)
+    def test_connections_run_a_limited_number_of_subscriptions(self):
+        query = 'subscription { orderCreated { name } }'
+
+        async def session():
+            client = await self.open()
+            await client.subscribe('1', query)
+            await client.subscribe('2', query)
+            await client.subscribe('3', query)
+            rejected = await client.receive()
+            await self.subscribed(events.ORDER_CREATED, 2)
+            await client.send({'type': 'complete', 'id': '1'})
+            while get_broker().subscriber_count(events.ORDER_CREATED) > 1:
+                await asyncio.sleep(0)
+            await client.subscribe('4', query)
+            await self.subscribed(events.ORDER_CREATED, 2)
+            await client.close()
+            return rejected
+
+        rejected = async_to_sync(session)()
+        self.assertEqual(rejected['type'], 'error')
+        self.assertEqual(rejected['id'], '3')
+        self.assertEqual(rejected['payload'][0]['extensions']['code'], 'TOO_MANY_SUBSCRIPTIONS')
+
+
+@override_settings(
+    STOCK_SYNC_BACKEND='products.tests.sync_stock',
+    ANALYTICS_BACKEND='products.tests.record_analytics',
+)
+class JobTests(GraphQLTestCase):
+    def setUp(self):
+        self.products = self.create_catalog(categories=1, products_per_category=2)
+        self.products[0].sku = 'SKU-0'
+        self.products[0].save()
+        synced_stock.clear()
+        analytics_events.clear()
+        flaky_failures.clear()
+
+    def checkout(self, quantity=2):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.query(CreateOrderTests.mutation, {
+                'productIds': [str(product.pk) for product in self.products], 'quantities': [quantity, 1],
+            })
+
+    def enqueue(self, *new_jobs):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue(*new_jobs)
+
+    def run_workers(self):
+        out = io.StringIO()
+        call_command('run_workers', concurrency=1, burst=True, stdout=out)
+        return out.getvalue()
+
+    def test_checkout_enqueues_side_effects_for_the_workers(self):
+        result = self.checkout()
+        self.assertNotIn('errors', result)
+        order = Order.objects.get()
+        self.assertEqual(
+            sorted(Job.objects.values_list('key', flat=True)),
+            [f'analytics:order:{order.pk}', f'order-confirmation:{order.pk}', f'stock-sync:order:{order.pk}'],
+        )
+        # Nothing ran during the request.
+        self.assertEqual(mail.outbox, [])
+
+        self.assertIn('Ran 3 jobs', self.run_workers())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ivan@example.com'])
+        self.assertIn(order.receipt_number, mail.outbox[0].subject)
+        self.assertIn('Product 0-0 x 2: 19.98', mail.outbox[0].body)
+        self.assertEqual(synced_stock, [{'SKU-0': 98, str(self.products[1].pk): 99}])
+        self.assertEqual(analytics_events[0]['total'], '29.97')
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+        self.assertIn('Ran 0 jobs', self.run_workers())
+
+    def test_failed_checkout_enqueues_nothing(self):
+        result = self.checkout(quantity=1000)
+        self.assertIn('Not enough stock', result['errors'][0]['message'])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(STOCK_SYNC_BACKEND=None, ANALYTICS_BACKEND=None)
+    def test_unconfigured_backends_are_not_enqueued(self):
+        self.checkout()
+        self.assertEqual(Job.objects.get().name, 'products.tasks.send_order_confirmation')
+
+    def test_idempotency_key_drops_duplicates(self):
+        for _ in range(2):
+            self.enqueue(jobs.job(flaky, key='once', label='a'), jobs.job(flaky, label='b'))
+        self.assertEqual(Job.objects.filter(key='once').count(), 1)
+        self.assertEqual(Job.objects.filter(key=None).count(), 2)
+
+    def test_failures_are_retried_with_backoff(self):
+        self.enqueue(jobs.job(flaky, label='sync'))
+        flaky_failures.extend(['timeout'])
+        self.assertEqual(jobs.Worker().run_pending(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('sync failed: timeout', job.last_error)
+        # Between 1 and 2 seconds for the first retry with a base of 2.
+        self.assertGreater(job.run_at, job.created_at + timedelta(seconds=0.9))
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(jobs.Worker().run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.DONE, 2, ''))
+
+    @override_settings(JOBS={'BACKOFF': 0})
+    def test_job_fails_after_max_attempts(self):
+        self.enqueue(jobs.job(flaky, max_attempts=3, label='sync'))
+        flaky_failures.extend(['1', '2', '3', '4'])
+        self.assertEqual(jobs.Worker().run_pending(), 3)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertIn('sync failed', job.last_error)
+        self.assertEqual(len(flaky_failures), 1)
+
+    def test_expired_leases_are_taken_over(self):
+        past = timezone.now() - timedelta(seconds=1)
+        Job.objects.bulk_create([
+            Job(name='products.tests.flaky', kwargs={'label': 'a'}, status=Job.RUNNING,
+                run_at=past, attempts=1, locked_by='dead'),
+            Job(name='products.tests.flaky', kwargs={'label': 'b'}, status=Job.RUNNING,
+                run_at=past, attempts=5, max_attempts=5, locked_by='dead'),
+            Job(name='products.tests.flaky', kwargs={'label': 'c'}, status=Job.RUNNING,
+                run_at=timezone.now() + timedelta(minutes=5), attempts=1, locked_by='alive'),
+        ])
+        self.assertEqual(jobs.Worker(name='new').run_pending(), 1)
+        self.assertEqual(
+            dict(Job.objects.values_list('kwargs__label', 'status')),
+            {'a': Job.DONE, 'b': Job.FAILED, 'c': Job.RUNNING},
+        )
+
+    def test_workers_claim_disjoint_jobs(self):
+        self.enqueue(*(jobs.job(flaky, label=str(i)) for i in range(15)))
+        first = jobs.Worker(name='first', batch_size=10).claim()
+        second = jobs.Worker(name='second', batch_size=10).claim()
+        self.assertEqual((len(first), len(second)), (10, 5))
+        self.assertFalse({job.pk for job in first} & {job.pk for job in second})
+        self.assertEqual(jobs.Worker(name='third').claim(), [])
+
+
+class IdempotencyTests(GraphQLTestCase):
+    update_product = """
+        mutation($id: ID!, $quantity: Int) { updateProduct(id: $id, quantity: $quantity) { product { quantity } } }
+    """
+
+    def setUp(self):
+        self.products = self.create_catalog(categories=1, products_per_category=2)
+        self.variables = {'productIds': [str(self.products[0].pk)], 'quantities': [2]}
+
+    def post(self, query=CreateOrderTests.mutation, variables=None, key='checkout-1', **body):
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': self.variables if variables is None else variables, **body}),
+            content_type='application/json',
+            headers={'Idempotency-Key': key} if key else {},
+        )
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post()
+        # The INSERT claiming the key fails and the stored response is read, nothing else.
+        with self.assertNumQueries(7):
+            retry = self.post()
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(retry.content, first.content)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, first)
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).quantity, 98)
+
+        self.post(key='checkout-2')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_in_extensions(self):
+        for _ in range(2):
+            self.post(key=None, extensions={'idempotencyKey': 'checkout-1'})
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_scoped_per_client(self):
+        for api_key in ('client-a', 'client-b', 'client-a'):
+            self.client.post(
+                '/graphql/',
+                json.dumps({'query': CreateOrderTests.mutation, 'variables': self.variables}),
+                content_type='application/json',
+                headers={'Idempotency-Key': 'checkout-1', 'X-Api-Key': api_key},
+            )
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_anonymous_clients_are_scoped_per_address(self):
+        responses = [
+            self.client.post(
+                '/graphql/',
+                json.dumps({'query': CreateOrderTests.mutation, 'variables': self.variables}),
+                content_type='application/json',
+                headers={'Idempotency-Key': 'checkout-1'},
+                REMOTE_ADDR=address,
+            )
+            for address in ('10.0.0.1', '10.0.0.9')
+        ]
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, responses[1])
+        self.assertNotEqual(responses[0].content, responses[1].content)
+
+    def test_key_reused_for_another_operation_is_rejected(self):
+        self.post()
+        response = self.post(variables={**self.variables, 'quantities': [3]})
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('already used', response.json()['errors'][0]['message'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_mutation_can_be_retried(self):
+        Product.objects.filter(pk=self.products[0].pk).update(quantity=1)
+        self.assertIn('Not enough stock', self.post().json()['errors'][0]['message'])
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Product.objects.filter(pk=self.products[0].pk).update(quantity=5)
+        self.assertNotIn('errors', self.post().json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_update_mutations_and_queries(self):
+        product_id = str(self.products[0].pk)
+        for _ in range(2):
+            self.post(self.update_product, {'id': product_id, 'quantity': 7}, key='restock')
+        order = self.create_order(self.products[:1])
+        for _ in range(2):
+            self.post(
+                'mutation($id: ID!) { updateOrder(orderId: $id, status: "accepted") { order { status } } }',
+                {'id': str(order.pk)}, key='accept',
+            )
+        self.assertEqual(order.status_history.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+        # Queries are safe to repeat and ignore the key.
+        self.post('{ categories { edges { node { name } } } }', {}, key='read')
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_expired_keys_run_again_and_are_evicted(self):
+        self.post()
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.post()
+        self.assertEqual(Order.objects.count(), 2)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with mock.patch.object(idempotency, '_claims', itertools.count(idempotency.EVICT_EVERY)):
+            self.post(key='checkout-2')
+        self.assertEqual(IdempotencyKey.objects.get().key, idempotency.storage_key_for('ip:127.0.0.1', 'checkout-2'))
+
+    def test_async_view(self):
+        request = AsyncRequestFactory().post(
+            '/graphql/',
+            json.dumps({'query': CreateOrderTests.mutation, 'variables': self.variables}),
+            content_type='application/json',
+            headers={'Idempotency-Key': 'checkout-1'},
+        )
+        first = async_to_sync(AsyncViewTests.view)(request)
+        retry = async_to_sync(AsyncViewTests.view)(request)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class IdempotencyContentionTests(TransactionTestCase):
+    threads = 4
+
+    def test_concurrent_retries_create_one_order(self):
+        category = Category.objects.create(name='Contention')
+        product = Product.objects.create(name='Item', description='', price='1.00', quantity=10, category=category)
+        body = json.dumps({
+            'query': CreateOrderTests.mutation,
+            'variables': {'productIds': [str(product.pk)], 'quantities': [1]},
+        })
+        responses = []
+        barrier = threading.Barrier(self.threads)
+
+        def checkout():
+            client = Client()
+            barrier.wait()
+            try:
+                while True:
+                    # The shared in-memory test database reports a held lock at
+                    # once instead of waiting for busy_timeout; that is a retry.
+                    try:
+                        response = client.post(
+                            '/graphql/', body, content_type='application/json', headers={'Idempotency-Key': 'same'},
+                        )
+                    except OperationalError:
+                        time.sleep(0.005)
+                        continue
+                    if b'locked' not in response.content:
+                        break
+                    time.sleep(0.005)
+                responses.append(response.content)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(responses), self.threads)
+        self.assertEqual(len(set(responses)), 1, responses[0])
+        self.assertEqual(Order.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 9)
+
+
+class BatchTests(GraphQLTestCase):
+    products_query = '{ products(first: 5) { edges { node { name category { name } } } } }'
+    orders_query = '{ orders { edges { node { orderitemSet { product { name quantity category { name } } } } } } }'
+
+    def setUp(self):
+        self.products = self.create_catalog(categories=2, products_per_category=3)
+        self.order = self.create_order(self.products[:4])
+
+    def post(self, operations):
+        return self.client.post('/graphql/', json.dumps(operations), content_type='application/json')
+
+    def test_operations_run_in_one_request(self):
+        operations = [
+            {'query': '{ categories { edges { node { name } } } }'},
+            {'query': self.products_query},
+            {'query': self.orders_query},
+        ]
+        separate = [self.query(operation['query']) for operation in operations]
+        with mock.patch('products.loaders.Loaders', wraps=Loaders) as loaders:
+            response = self.post(operations)
+        results = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['data'] for result in results], [result['data'] for result in separate])
+        self.assertEqual([(result['id'], result['status']) for result in results], [(None, 200)] * 3)
+        self.assertEqual(loaders.call_count, 1)
+
+    def test_repeated_queries_run_once(self):
+        # Captured queries are read lazily, before the next request resets them.
+        with CaptureQueriesContext(connection) as queries:
+            self.post([{'query': self.products_query}])
+        single = len(queries)
+        with CaptureQueriesContext(connection) as batched:
+            results = self.post([{'query': self.products_query}] * 3).json()
+        self.assertEqual(len(batched), single)
+        self.assertGreater(single, 0)
+        self.assertEqual(results[0], results[2])
+
+    def test_loaders_are_dropped_around_mutations(self):
+        product_id = str(self.products[0].pk)
+        results = self.post([
+            {'query': self.orders_query},
+            {
+                'query': 'mutation($id: ID!) { updateProduct(id: $id, quantity: 5) { product { quantity } } }',
+                'variables': {'id': product_id},
+            },
+            {'query': self.orders_query},
+        ]).json()
+        quantity = lambda result: result['data']['orders']['edges'][0]['node']['orderitemSet'][0]['product']['quantity']
+        self.assertEqual(quantity(results[0]), 100)
+        self.assertEqual(results[1]['data']['updateProduct']['product']['quantity'], 5)
+        self.assertEqual(quantity(results[2]), 5)
+
+    @override_settings(GRAPHQL_BATCH_MAX_OPERATIONS=2)
+    def test_batch_limits(self):
+        operation = {'query': '{ categories { edges { node { name } } } }'}
+        self.assertEqual(len(self.post([operation, operation]).json()), 2)
+        for body, message in (
+            ([operation] * 3, 'exceeds the limit of 2'),
+            ([], 'empty list'),
+            ([operation, 'query'], 'JSON object'),
+        ):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.json()['errors'][0]['message'])
+
+    def test_idempotency_keys_are_rejected(self):
+        mutation = {'query': CreateOrderTests.mutation, 'variables': {
+            'productIds': [str(self.products[0].pk)], 'quantities': [1],
+        }}
+        orders = Order.objects.count()
+        for headers, operation in (
+            ({'Idempotency-Key': 'checkout-1'}, mutation),
+            ({}, {**mutation, 'extensions': {'idempotencyKey': 'checkout-1'}}),
+        ):
+            response = self.client.post(
+                '/graphql/', json.dumps([{'query': self.products_query}, operation]),
+                content_type='application/json', headers=headers,
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('not supported in batches', response.json()['errors'][0]['message'])
+        self.assertEqual(Order.objects.count(), orders)
+
+    def test_operations_share_the_cost_budget(self):
+        # 1 + 1 + 5 + 5 = 12 per operation
+        with override_settings(GRAPHQL_QUERY_COST={'MAX_COST': 30}):
+            results = self.post([{'query': f'query Q{i} {self.products_query}'} for i in range(3)]).json()
+            repeated = self.post([{'query': self.products_query}] * 3).json()
+        self.assertEqual([('errors' in result) for result in results], [False, False, True])
+        self.assertIn('exceeds the budget of 30', results[2]['errors'][0]['message'])
+        # Repeated queries are answered from the first one's result.
+        self.assertEqual([('errors' in result) for result in repeated], [False, False, False])
+
+    def test_async_view(self):
+        request = AsyncRequestFactory().post(
+            '/graphql/',
+            json.dumps([{'query': self.products_query}, {'query': self.orders_query}]),
+            content_type='application/json',
+        )
+        with mock.patch('products.loaders.Loaders', wraps=Loaders) as loaders:
+            response = async_to_sync(AsyncViewTests.view)(request)
+        results = json.loads(response.content)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[1]['data'], self.query(self.orders_query)['data'])
+        self.assertEqual(loaders.call_count, 1)
+
+
+class MiddlewareTests(GraphQLTestCase):
+    query_body = json.dumps({'query': '{ categories { edges { node { name } } } }'})
+
+    def assertSkipsSiteMiddleware(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Frame-Options', response.headers)
+        self.assertNotIn('Cookie', response.headers.get('Vary', ''))
+        self.assertFalse(response.cookies)
+
+    def test_api_requests_skip_site_middleware(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post('/graphql/', self.query_body, content_type='application/json')
+        self.assertSkipsSiteMiddleware(response)
+        self.assertIn('data', response.json())
+        self.assertSkipsSiteMiddleware(client.get('/metrics'))
+        graphiql = client.get('/graphql/', HTTP_ACCEPT='text/html')
+        self.assertSkipsSiteMiddleware(graphiql)
+        self.assertContains(graphiql, 'graphiql')
+
+    def test_api_requests_skip_site_middleware_under_asgi(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        response = async_to_sync(client.post)('/graphql/', self.query_body, content_type='application/json')
+        self.assertSkipsSiteMiddleware(response)
+        self.assertIn('data', response.json())
+
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    def test_whitenoise_stays_async_under_asgi(self):
+        # Adapted to sync, it ran the async view's resolvers into a deadlock.
+        middleware = WhiteNoiseMiddleware(AsyncGraphQLView.as_view(schema=schema))
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = AsyncRequestFactory()
+        response = async_to_sync(middleware)(
+            factory.post('/graphql/', self.query_body, content_type='application/json')
+        )
+        self.assertIn('data', json.loads(response.content))
+        response = async_to_sync(middleware)(factory.get('/static/admin/css/base.css'))
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertFalse(iscoroutinefunction(WhiteNoiseMiddleware(GraphQLView.as_view(schema=schema))))
+
+    def test_admin_keeps_site_middleware(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.get('/admin/login/')
+        self.assertEqual(response.headers['X-Frame-Options'], 'DENY')
+        self.assertIn('csrftoken', response.cookies)
+        response = client.post('/admin/login/', {'username': 'admin', 'password': 'secret'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(client.get('/admin/').status_code, 302)
+
+
+@override_settings(GRAPHQL_STREAM_PAGE_SIZE=4, GRAPHQL_STREAM_MAX_ITEMS=None)
+class StreamingTests(GraphQLTestCase):
+    products_query = '''query ($first: Int, $after: String) {
+        items: products(first: $first, after: $after) {
+            pageInfo { hasPreviousPage hasNextPage startCursor endCursor __typename }
+            edges { cursor node { name category { name } } }
+        }
+    }'''
+
+    def setUp(self):
+        self.create_catalog(3, 5)
+
+    def post(self, variables, query=None, **headers):
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query or self.products_query, 'variables': variables}),
+            content_type='application/json',
+            **headers,
+        )
+
+    def unstreamed(self, variables):
+        with override_settings(GRAPHQL_STREAM_PAGE_SIZE=None):
+            return self.query(self.products_query, variables)
+
+    def test_large_connections_are_streamed_page_by_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post({'first': 10})
+            self.assertTrue(response.streaming)
+            result = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len([q for q in queries if 'FROM "products_product"' in q['sql']]), 3)
+        self.assertEqual(result['data'], self.unstreamed({'first': 10})['data'])
+        self.assertEqual(len(result['data']['items']['edges']), 10)
+        self.assertTrue(result['data']['items']['pageInfo']['hasNextPage'])
+        # 1 + 1 + 1 + 4 + 4 per page, and 1 for the pageInfo continuing the stream
+        self.assertEqual(result['extensions']['cost']['requested'], 3 * 12)
+
+        after = result['data']['items']['pageInfo']['endCursor']
+        rest = json.loads(b''.join(self.post({'first': 10, 'after': after}).streaming_content))
+        self.assertEqual(rest['data'], self.unstreamed({'first': 10, 'after': after})['data'])
+        self.assertEqual(len(rest['data']['items']['edges']), 5)
+        self.assertFalse(rest['data']['items']['pageInfo']['hasNextPage'])
+        self.assertTrue(rest['data']['items']['pageInfo']['hasPreviousPage'])
+
+    def test_other_queries_are_not_streamed(self):
+        self.assertFalse(self.post({'first': 4}).streaming)
+        self.assertFalse(self.post({}, query='{ products(first: 10) { edges { node { name } } } categories { edges { node { name } } } }').streaming)
+        with override_settings(GRAPHQL_STREAM_PAGE_SIZE=None):
+            self.assertFalse(self.post({'first': 10}).streaming)
+
+    @mock.patch.object(graphene_settings, 'RELAY_CONNECTION_MAX_LIMIT', 4)
+    def test_streams_go_beyond_the_page_limit(self):
+        self.assertEqual(len(self.unstreamed({'first': 12})['data']['items']['edges']), 4)
+        result = json.loads(b''.join(self.post({'first': 12}).streaming_content))
+        self.assertEqual(len(result['data']['items']['edges']), 12)
+        with override_settings(GRAPHQL_STREAM_MAX_ITEMS=6):
+            result = json.loads(b''.join(self.post({'first': 12}).streaming_content))
+        self.assertEqual(len(result['data']['items']['edges']), 6)
+
+    @override_settings(GRAPHQL_QUERY_COST={'MAX_COST': 25})
+    def test_streams_are_charged_for_every_page(self):
+        self.assertNotIn('errors', self.unstreamed({'first': 10}))
+        response = self.post({'first': 10})
+        self.assertFalse(response.streaming)
+        self.assertIn('exceeds the budget of 25', response.json()['errors'][0]['message'])
+
+    def test_async_view(self):
+        request = AsyncRequestFactory().post(
+            '/graphql/', json.dumps({'query': self.products_query, 'variables': {'first': 10}}),
+            content_type='application/json',
+        )
+
+        async def read():
+            response = await AsyncViewTests.view(request)
+            self.assertTrue(response.is_async)
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        result = json.loads(async_to_sync(read)())
+        self.assertEqual(result['data'], self.unstreamed({'first': 10})['data'])
+
+
+class ResponseEncodingTests(GraphQLTestCase):
+    def test_fast_json_falls_back_to_json(self):
+        value = {'name': 'Ünïcode', 'big': 2 ** 70, 'list': [1.5, None, True]}
+        with override_settings(GRAPHQL_FAST_JSON=True):
+            self.assertEqual(json.loads(encoding.dumps(value)), value)
+            self.assertEqual(json.loads(encoding.dumps({'name': 'Ünïcode'})), {'name': 'Ünïcode'})
+        self.assertEqual(encoding.dumps(value), json.dumps(value, separators=(',', ':')))
+
+    def test_fast_json_responses(self):
+        self.create_catalog()
+        query = '{ products { edges { node { name price category { name } } } } }'
+        with override_settings(GRAPHQL_FAST_JSON=True):
+            fast = self.query(query)
+        self.assertEqual(fast, self.query(query))
+
+    @override_settings(GRAPHQL_STREAM_PAGE_SIZE=4)
+    def test_responses_are_compressed_as_the_client_accepts(self):
+        self.create_catalog()
+        body = json.dumps({'query': '{ products(first: 9) { edges { node { name description } } } }'})
+        plain = self.client.post('/graphql/', body, content_type='application/json')
+        plain = b''.join(plain.streaming_content)
+        for accept, decompress in (('gzip', gzip.decompress), ('gzip, deflate, br', brotli.decompress)):
+            response = self.client.post('/graphql/', body, content_type='application/json', HTTP_ACCEPT_ENCODING=accept)
+            self.assertEqual(response.headers['Content-Encoding'], accept.split(', ')[-1])
+            self.assertIn('Accept-Encoding', response.headers['Vary'])
+            self.assertEqual(decompress(b''.join(response.streaming_content)), plain)
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': '{ products { edges { node { name description } } } }'}),
+            content_type='application/json', HTTP_ACCEPT_ENCODING='br',
+        )
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))['data']['products']['edges']), 9)
+        admin = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertNotIn('Content-Encoding', admin.headers)
+        graphiql = self.client.get('/graphql/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertContains(graphiql, 'graphiql')
+        self.assertNotIn('Content-Encoding', graphiql.headers)
+
+
+@override_settings(GRAPHQL_RATE_LIMIT={'RATE': 2, 'BURST': 5, 'CLIENTS': {'partner': {'RATE': 10, 'BURST': 20}}})
+class ThrottlingTests(GraphQLTestCase):
+    categories = '{ categories { edges { node { name } } } }'
+
+    def setUp(self):
+        self.create_catalog(1, 1)
+        throttling.get_store().clear()
+        self.addCleanup(throttling.get_store().clear)
+        clock = mock.patch.object(throttling, 'time')
+        self.clock = clock.start().time
+        self.clock.return_value = 1000.0
+        self.addCleanup(clock.stop)
+
+    def post(self, body, **headers):
+        return self.client.post('/graphql/', json.dumps(body), content_type='application/json', **headers)
+
+    def burst(self, requests, query=None, **headers):
+        """Status codes of ``requests`` requests sent at the same instant."""
+        return [self.post({'query': query or self.categories}, **headers).status_code for _ in range(requests)]
+
+    def test_bursts_beyond_the_bucket_are_rejected(self):
+        self.assertEqual(self.burst(7), [200] * 5 + [429] * 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post({'query': self.categories})
+            self.assertEqual(len(queries), 0)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(response.json(), {'errors': [{'message': 'Too many requests.'}]})
+        # Two tokens a second.
+        self.clock.return_value += 1
+        self.assertEqual(self.burst(3), [200, 200, 429])
+        self.clock.return_value += 10
+        self.assertEqual(self.burst(6), [200] * 5 + [429])
+
+    def test_mutations_weigh_more_than_queries(self):
+        mutation = 'mutation { createCategory(name: "New") { category { name } } }'
+        self.assertEqual(self.burst(2, mutation), [200, 429])
+        # A full bucket's worth of tokens is back after 2.5 seconds.
+        self.assertEqual(self.post({'query': mutation}).headers['Retry-After'], '3')
+        self.clock.return_value += 2.5
+        self.assertEqual(self.burst(1, mutation) + self.burst(1), [200, 429])
+        self.clock.return_value += 0.5
+        self.assertEqual(self.burst(2), [200, 429])
+
+    def test_batches_take_the_tokens_of_all_their_operations(self):
+        batch = [{'query': self.categories}] * 4
+        self.assertEqual(self.post(batch).status_code, 200)
+        self.assertEqual(self.post(batch).status_code, 429)
+        self.assertEqual(self.burst(2), [200, 429])
+
+    def test_clients_have_their_own_buckets(self):
+        self.assertEqual(self.burst(6), [200] * 5 + [429])
+        self.assertEqual(self.burst(6, REMOTE_ADDR='10.0.0.2'), [200] * 5 + [429])
+        # Made-up keys share the bucket of their address; known ones have their own limits.
+        self.assertEqual(self.burst(1, HTTP_X_API_KEY='made-up'), [429])
+        self.assertEqual(self.burst(21, HTTP_X_API_KEY='partner'), [200] * 20 + [429])
+        self.assertEqual(self.burst(1, HTTP_X_FORWARDED_FOR='10.0.0.3'), [429])
+        limits = {**throttling.get_limits(), 'CLIENT_IP_HEADER': 'X-Forwarded-For'}
+        with override_settings(GRAPHQL_RATE_LIMIT=limits):
+            # The client may prepend any address; the proxy's is the last one.
+            self.assertEqual(self.burst(6, HTTP_X_FORWARDED_FOR='10.0.0.4, 10.0.0.3'), [200] * 5 + [429])
+            self.assertEqual(self.burst(1, HTTP_X_FORWARDED_FOR='10.0.0.3, 10.0.0.4'), [200])
+
+    def test_async_view(self):
+        client = AsyncClient()
+
+        async def burst():
+            return [
+                (await client.post('/graphql/', {'query': self.categories}, content_type='application/json')).status_code
+                for _ in range(6)
+            ]
+
+        self.assertEqual(async_to_sync(burst)(), [200] * 5 + [429])
+
+    def test_cache_store_is_shared(self):
+        stores = [throttling.CacheStore(), throttling.CacheStore()]
+        self.addCleanup(stores[0].clear)
+        waits = [stores[i % 2].take('ip:10.0.0.1', 1, 2, 5, 1000.0) for i in range(6)]
+        self.assertEqual(waits[:5], [0] * 5)
+        self.assertAlmostEqual(waits[5], 0.5)
+        self.assertEqual(stores[1].take('ip:10.0.0.1', 1, 2, 5, 1000.5), 0)
+
+    def test_in_process_store_forgets_the_least_recent_clients(self):
+        store = throttling.InProcessStore(max_clients=2)
+        for client in ('a', 'b', 'a', 'c'):
+            store.take(client, 5, 1, 5, 1000.0)
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+        self.assertEqual(store.take('b', 5, 1, 5, 1000.0), 0)
+
+    @override_settings(GRAPHQL_RATE_LIMIT={}, GRAPHQL_MAX_CONCURRENT_REQUESTS=2)
+    def test_requests_beyond_the_concurrency_limit_are_shed(self):
+        self.assertEqual(self.burst(10), [200] * 10)
+        for _ in range(2):
+            self.assertTrue(throttling.in_flight.enter())
+        try:
+            with CaptureQueriesContext(connection) as queries, self.assertNoLogs('django.request'):
+                response = self.post({'query': self.categories})
+                self.assertEqual(len(queries), 0)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '1')
+            self.assertIn('errors', response.json())
+            response = async_to_sync(AsyncClient().post)('/graphql/', {'query': self.categories}, content_type='application/json')
+            self.assertEqual(response.status_code, 503)
+        finally:
+            throttling.in_flight.leave()
+        self.assertEqual(self.burst(1), [200])
+        throttling.in_flight.leave()
+        self.assertEqual(throttling.in_flight.count, 0)
+
+    @override_settings(
+        GRAPHQL_RATE_LIMIT={}, GRAPHQL_MAX_CONCURRENT_REQUESTS=1,
+        GRAPHQL_STREAM_PAGE_SIZE=1, GRAPHQL_STREAM_MAX_ITEMS=None,
+    )
+    def test_streamed_responses_hold_their_slot_until_sent(self):
+        self.create_catalog(1, 2)
+        body = {'query': '{ products(first: 3) { edges { node { name } } } }'}
+        response = self.post(body)
+        self.assertTrue(response.streaming)
+        self.assertEqual(throttling.in_flight.count, 1)
+        self.assertEqual(self.post({'query': self.categories}).status_code, 503)
+        pages = iter(response.streaming_content)
+        next(pages)
+        next(pages)
+        self.assertEqual(throttling.in_flight.count, 1)
+        b''.join(pages)
+        self.assertEqual(throttling.in_flight.count, 0)
+        # closed before its first page was sent
+        self.post(body).close()
+        self.assertEqual(throttling.in_flight.count, 0)
+
+        async def read():
+            request = AsyncRequestFactory().post('/graphql/', json.dumps(body), content_type='application/json')
+            response = await AsyncViewTests.view(request)
+            held = throttling.in_flight.count
+            content = b''.join([chunk async for chunk in response.streaming_content])
+            return held, json.loads(content)
+
+        held, result = async_to_sync(read)()
+        self.assertEqual((held, throttling.in_flight.count), (1, 0))
+        self.assertEqual(len(result['data']['products']['edges']), 3)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], GRAPHQL_RESPONSE_CACHE_ALIAS=None)
+class ReplicaTests(TransactionTestCase):
+    """The test database is the primary and a SQLite file its replica, replicated on demand."""
+
+    categories = '{ categories { edges { node { name } } } }'
+    view = staticmethod(AsyncViewTests.view)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.replica_file = os.path.join(tmp.name, 'replica.sqlite3')
+        config = database_config(None, {'DATABASE_NAME': self.replica_file, 'DATABASE_CONN_MAX_AGE': '0'})
+        connections.settings['replica'] = connections.configure_settings({'default': {}, 'replica': config})['replica']
+        self.addCleanup(connections.settings.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        cache.clear()
+        self.addCleanup(cache.clear)
+        GraphQLTestCase.create_catalog(self, 2, 1)
+        self.replicate()
+
+    def replicate(self):
+        """Copy the primary to the replica."""
+        connections['replica'].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_file)
+        try:
+            connection.connection.backup(replica)
+        finally:
+            replica.close()
+
+    def post(self, body, **headers):
+        return self.client.post('/graphql/', json.dumps(body), content_type='application/json', **headers).json()
+
+    def names(self, **headers):
+        result = self.post({'query': self.categories}, **headers)
+        return {edge['node']['name'] for edge in result['data']['categories']['edges']}
+
+    def test_queries_read_from_the_replica(self):
+        Category.objects.create(name='Not replicated')
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(self.names(), {'Category 0', 'Category 1'})
+        self.replicate()
+        self.assertEqual(self.names(), {'Category 0', 'Category 1', 'Not replicated'})
+        with override_settings(DATABASE_REPLICAS=[]):
+            Category.objects.create(name='Primary only')
+            self.assertIn('Primary only', self.names())
+
+    def test_clients_read_their_own_writes_from_the_primary(self):
+        result = self.post({'query': 'mutation { createCategory(name: "New") { category { name } } }'})
+        self.assertEqual(result['data']['createCategory']['category']['name'], 'New')
+        self.assertEqual(Category.objects.using('replica').count(), 2)
+        self.assertIn('New', self.names())
+        self.assertIn('New', self.names(HTTP_X_FORWARDED_FOR='10.0.0.1'))
+        self.assertNotIn('New', self.names(REMOTE_ADDR='10.0.0.2'))
+        self.assertNotIn('New', self.names(HTTP_X_API_KEY='other'))
+        with override_settings(GRAPHQL_RATE_LIMIT={'CLIENT_IP_HEADER': 'X-Forwarded-For'}):
+            self.assertNotIn('New', self.names(HTTP_X_FORWARDED_FOR='10.0.0.1'))
+        with mock.patch('time.time', return_value=time.time() + replicas.get_lag() + 1):
+            self.assertNotIn('New', self.names())
+        self.replicate()
+        self.assertIn('New', self.names(REMOTE_ADDR='10.0.0.2'))
+
+    def test_batches_read_their_writes_after_a_mutation(self):
+        before, _, after = self.post([
+            {'query': self.categories},
+            {'query': 'mutation { createCategory(name: "New") { category { name } } }'},
+            {'query': self.categories},
+        ])
+        self.assertEqual(len(before['data']['categories']['edges']), 2)
+        self.assertEqual(len(after['data']['categories']['edges']), 3)
+
+    @override_settings(GRAPHQL_RESPONSE_CACHE_ALIAS='default')
+    def test_cached_responses_are_not_read_from_a_lagging_replica(self):
+        Category.objects.create(name='New')
+        # Another client, but the response will be cached for everyone.
+        self.assertIn('New', self.names(REMOTE_ADDR='10.0.0.2'))
+        self.assertIn('New', self.names(REMOTE_ADDR='10.0.0.3'))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'products.tests.EventLoopGuardCache'}})
+    def test_async_view(self):
+        Category.objects.create(name='Not replicated')
+        result = async_to_sync(AsyncViewTests.aquery)(self, self.categories)
+        self.assertEqual(len(result['data']['categories']['edges']), 2)
+        async_to_sync(AsyncViewTests.aquery)(self, 'mutation { createCategory(name: "New") { category { name } } }')
+        result = async_to_sync(AsyncViewTests.aquery)(self, self.categories)
+        self.assertEqual(len(result['data']['categories']['edges']), 4)
+
+    def test_router(self):
+        router = replicas.ReplicaRouter()
+        with replicas.reading_from('replica'):
+            self.assertEqual(router.db_for_read(Category), 'replica')
+            self.assertEqual(router.db_for_write(Category), 'default')
+        self.assertIsNone(router.db_for_read(Category))
+        self.assertFalse(router.allow_migrate('replica', 'products'))
+        self.assertIsNone(router.allow_migrate('default', 'products'))
+        replicated = Category.objects.using('replica').get(name='Category 0')
+        self.assertTrue(router.allow_relation(replicated, Category.objects.get(name='Category 1')))
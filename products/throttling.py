@@ -0,0 +1,214 @@
+"""Per-client rate limiting and load shedding of the GraphQL endpoint.
+
+Every client has a token bucket of ``BURST`` tokens refilled at ``RATE``
+tokens a second (``settings.GRAPHQL_RATE_LIMIT``). A request takes
+``WEIGHTS[type]`` tokens per operation, so that a mutation, which writes
+and locks rows, costs more than a query; a batch takes the tokens of all of
+its operations at once. A request finding too few tokens is answered 429,
+with the seconds until there will be enough in ``Retry-After``, before
+anything is resolved.
+
+Clients are told apart by their address, or by their ``X-Api-Key`` header
+when the key is one of ``CLIENTS``, which may give it its own ``RATE`` and
+``BURST``. Other keys cost nothing to make up, so they get no bucket of
+their own. Behind a proxy, ``CLIENT_IP_HEADER`` names the header in which it
+appends the address it saw (``X-Forwarded-For``).
+
+Buckets are kept by the store of ``settings.GRAPHQL_RATE_LIMIT_STORE``,
+``InProcessStore`` by default: each worker process has its own, so a client
+may get up to its rate times the number of workers. ``CacheStore`` shares
+them through a Django cache (Redis, Memcached) instead. Stores have
+``take()`` and, for the async view, ``atake()``.
+
+Independently, ``settings.GRAPHQL_MAX_CONCURRENT_REQUESTS`` bounds the
+GraphQL requests a worker process executes at once, which matters under
+ASGI or threaded workers: the requests beyond it are answered 503 right
+away rather than queueing behind a slow database until every client times
+out.
+"""
+import functools
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from .complexity import API_KEY_HEADER
+
+DEFAULTS = {
+    'RATE': None,
+    'BURST': 60,
+    'WEIGHTS': {'query': 1, 'mutation': 5, 'subscription': 1},
+    'CLIENTS': {},
+    'CLIENT_IP_HEADER': None,
+}
+# Seconds a shed request is told to wait.
+SHED_RETRY_AFTER = 1
+
+
+def take_tokens(full_at, now, tokens, rate, burst):
+    """``(full_at, wait)`` of a bucket after taking ``tokens`` from it at ``now``.
+
+    A bucket is stored as the time at which it is full again (None when it
+    is), so it is one number to read and write and refills by itself. When
+    there are too few tokens, ``full_at`` is unchanged and ``wait`` is the
+    seconds until there are enough; otherwise ``wait`` is 0.
+    """
+    # A request weighing more than a full bucket waits for a full bucket.
+    tokens = min(tokens, burst)
+    taken = max(full_at or now, now) + tokens / rate
+    wait = taken - now - burst / rate
+    # Sums of fractions of a second are not exact.
+    if wait > 1e-9:
+        return full_at, wait
+    return taken, 0
+
+
+class InProcessStore:
+    """Buckets of the clients of this process.
+
+    Full buckets are not kept, and past ``max_clients`` the least recently
+    seen clients are forgotten, i.e. their buckets refilled.
+    """
+
+    def __init__(self, max_clients=100_000):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client, tokens, rate, burst, now):
+        with self._lock:
+            full_at, wait = take_tokens(self._buckets.pop(client, None), now, tokens, rate, burst)
+            if full_at is not None and full_at > now:
+                self._buckets[client] = full_at
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    async def atake(self, client, tokens, rate, burst, now):
+        return self.take(client, tokens, rate, burst, now)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheStore:
+    """Buckets in the Django cache ``alias``, shared by the processes using it.
+
+    Django's cache API has no compare-and-set, so two processes updating the
+    bucket of a client at the same instant may both take its last tokens.
+    """
+
+    def __init__(self, alias='default', key_prefix='graphql:throttle'):
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    def key(self, client):
+        return f'{self.key_prefix}:{hashlib.sha256(client.encode()).hexdigest()}'
+
+    def take(self, client, tokens, rate, burst, now):
+        cache = caches[self.alias]
+        key = self.key(client)
+        full_at, wait = take_tokens(cache.get(key), now, tokens, rate, burst)
+        if not wait:
+            cache.set(key, full_at, math.ceil(full_at - now) + 1)
+        return wait
+
+    async def atake(self, client, tokens, rate, burst, now):
+        cache = caches[self.alias]
+        key = self.key(client)
+        full_at, wait = take_tokens(await cache.aget(key), now, tokens, rate, burst)
+        if not wait:
+            await cache.aset(key, full_at, math.ceil(full_at - now) + 1)
+        return wait
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    options = dict(getattr(settings, 'GRAPHQL_RATE_LIMIT_STORE', {}))
+    backend = options.pop('BACKEND', 'products.throttling.InProcessStore')
+    return import_string(backend)(**{key.lower(): value for key, value in options.items()})
+
+
+def get_limits():
+    return {**DEFAULTS, **getattr(settings, 'GRAPHQL_RATE_LIMIT', {})}
+
+
+def client_key(request, limits):
+    """``(key, limits)`` of the client of ``request``, with its own limits applied."""
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and api_key in limits['CLIENTS']:
+        return f'key:{api_key}', {**limits, **limits['CLIENTS'][api_key]}
+    return f'ip:{client_address(request)}', limits
+
+
+def client_address(request):
+    """Address of the client of ``request``, the proxy's ``CLIENT_IP_HEADER`` first."""
+    header = get_limits()['CLIENT_IP_HEADER']
+    if header:
+        # The last address is the one the proxy appended; the client wrote the others.
+        address = request.headers.get(header, '').split(',')[-1].strip()
+        if address:
+            return address
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _take_args(request, operation_types):
+    """Arguments of the store's ``take()`` for the request, or None when it is not limited."""
+    client, limits = client_key(request, get_limits())
+    if limits['RATE'] is None:
+        return None
+    tokens = sum(limits['WEIGHTS'].get(operation_type, 1) for operation_type in operation_types)
+    return client, tokens, limits['RATE'], limits['BURST'], time.time()
+
+
+def throttle(request, operation_types):
+    """Take the tokens of ``operation_types`` for the client of ``request``.
+
+    Returns 0, or the seconds to wait when the client is over its rate.
+    """
+    args = _take_args(request, operation_types)
+    return 0 if args is None else get_store().take(*args)
+
+
+async def athrottle(request, operation_types):
+    """``throttle()`` without blocking the event loop on the store."""
+    args = _take_args(request, operation_types)
+    return 0 if args is None else await get_store().atake(*args)
+
+
+def retry_after(wait):
+    """``Retry-After`` header value, in whole seconds, for ``wait``."""
+    return str(max(1, math.ceil(wait)))
+
+
+class InFlight:
+    """Number of requests this process is executing."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        """Count one more request, or return False when the process is at its limit."""
+        limit = getattr(settings, 'GRAPHQL_MAX_CONCURRENT_REQUESTS', None)
+        with self._lock:
+            if limit is not None and self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.count -= 1
+
+
+in_flight = InFlight()
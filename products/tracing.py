@@ -0,0 +1,160 @@
+"""Per-resolver timing and SQL accounting for GraphQL operations.
+
+An operation is traced when the client sends ``settings.GRAPHQL_TRACE_HEADER``
+(the trace is then returned in ``extensions.trace``) or when it is picked by
+``settings.GRAPHQL_TRACE_SAMPLE_RATE``; either way its resolvers feed the
+histograms in ``products.metrics``. Untraced operations run without the
+middleware or any SQL wrapper, so tracing costs nothing while it is off.
+"""
+import contextlib
+import contextvars
+import inspect
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+# FieldStats of the resolver running in the current context, for SQL attribution.
+_current = contextvars.ContextVar('graphql_trace_field', default=None)
+
+
+class FieldStats:
+    __slots__ = ('field', 'calls', 'seconds', 'queries', 'sql_seconds')
+
+    def __init__(self, field):
+        self.field = field
+        self.calls = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def as_dict(self):
+        stats = {'calls': self.calls, 'ms': round(self.seconds * 1000, 3)}
+        if self.queries:
+            stats.update(sqlQueries=self.queries, sqlMs=round(self.sql_seconds * 1000, 3))
+        return stats
+
+
+class Tracer:
+    """Statistics of one operation, aggregated by resolver path without list indices."""
+
+    def __init__(self, report):
+        self.report = report
+        self.started = time.perf_counter()
+        self.paths = {}
+        self.unattributed = FieldStats('')
+
+    def field_stats(self, info):
+        path = '.'.join(key for key in info.path.as_list() if isinstance(key, str))
+        stats = self.paths.get(path)
+        if stats is None:
+            stats = self.paths[path] = FieldStats(f'{info.parent_type.name}.{info.field_name}')
+        return stats
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = _current.get() or self.unattributed
+            stats.queries += 1
+            stats.sql_seconds += elapsed
+            metrics.sql_duration.observe(stats.field, elapsed)
+
+    def attach(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self.record_query)
+
+    def detach(self):
+        for connection in connections.all():
+            if self.record_query in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self.record_query)
+
+    def as_extension(self):
+        resolvers = {**self.paths}
+        if self.unattributed.queries:
+            resolvers[''] = self.unattributed
+        return {
+            'durationMs': round((time.perf_counter() - self.started) * 1000, 3),
+            'sqlQueries': sum(stats.queries for stats in resolvers.values()),
+            'sqlMs': round(sum(stats.sql_seconds for stats in resolvers.values()) * 1000, 3),
+            'resolvers': {path: stats.as_dict() for path, stats in resolvers.items()},
+        }
+
+
+class TracingMiddleware:
+    """Graphene middleware timing every resolver of a traced request."""
+
+    def resolve(self, next, root, info, **args):
+        tracer = getattr(info.context, 'tracer', None)
+        if tracer is None:
+            return next(root, info, **args)
+        stats = tracer.field_stats(info)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        finally:
+            _current.reset(token)
+        if inspect.isawaitable(result):
+            return self.await_result(result, stats, start)
+        self.record(stats, start)
+        return result
+
+    async def await_result(self, result, stats, start):
+        token = _current.set(stats)
+        try:
+            return await result
+        finally:
+            _current.reset(token)
+            self.record(stats, start)
+
+    @staticmethod
+    def record(stats, start):
+        elapsed = time.perf_counter() - start
+        stats.calls += 1
+        stats.seconds += elapsed
+        metrics.resolver_duration.observe(stats.field, elapsed)
+
+
+def start(request):
+    """Return the ``Tracer`` for the operation ``request`` is about to run, or None."""
+    header = getattr(settings, 'GRAPHQL_TRACE_HEADER', None)
+    report = bool(header and request.headers.get(header))
+    if not report and random.random() >= getattr(settings, 'GRAPHQL_TRACE_SAMPLE_RATE', 0):
+        return None
+    return Tracer(report)
+
+
+@contextlib.contextmanager
+def trace(request):
+    tracer = request.tracer = start(request)
+    if tracer is None:
+        yield None
+        return
+    tracer.attach()
+    try:
+        yield tracer
+    finally:
+        tracer.detach()
+        request.tracer = None
+
+
+@contextlib.asynccontextmanager
+async def atrace(request):
+    """``trace()`` for the async view, whose queries run in the sync executor thread."""
+    tracer = request.tracer = start(request)
+    if tracer is None:
+        yield None
+        return
+    await sync_to_async(tracer.attach)()
+    try:
+        yield tracer
+    finally:
+        await sync_to_async(tracer.detach)()
+        request.tracer = None
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 from .schema import schema
+from .views import AsyncGraphQLView, GraphQLView, graphql_stats
+
+view_class = AsyncGraphQLView if settings.GRAPHQL_ASYNC else GraphQLView
 
 urlpatterns = [
     # Other URL patterns
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql/', csrf_exempt(view_class.as_view(graphiql=True, schema=schema))),
+    path('graphql/stats/', graphql_stats),
 ]
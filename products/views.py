@@ -1,3 +1,841 @@
-from django.shortcuts import render
+import inspect
+import json
+import time
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.http import parse_etags
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView as BaseGraphQLView
+from graphene_django.views import HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast
+
+from . import (
+    caching,
+    complexity,
+    encoding,
+    idempotency,
+    metrics,
+    replicas,
+    streaming,
+    throttling,
+    tracing,
+)
+from .documents import DocumentCache
+
+
+class GraphQLView(BaseGraphQLView):
+    """GraphQL endpoint that parses and validates each distinct query only once.
+
+    Documents come from a process-wide ``DocumentCache`` keyed by the sha256
+    of the query text, which also serves Automatic Persisted Queries: a
+    request may carry ``extensions.persistedQuery.sha256Hash`` instead of (or
+    alongside) ``query``.
+
+    Read-only catalog queries are answered from the response cache in
+    ``products.caching``; over GET they also carry an ``ETag`` and a matching
+    ``If-None-Match`` gets a 304 before anything is executed.
+
+    Operations over the client's cost budget (see ``products.complexity``)
+    are rejected before any resolver runs; the computed cost is reported in
+    the ``extensions`` of every executed response, next to the resolver
+    trace of ``products.tracing`` when the client asked for one.
+
+    Mutations sent with an idempotency key run at most once per key, see
+    ``products.idempotency``; a batch carrying one is rejected.
+
+    A JSON array of operations is executed as a batch, in order, and answered
+    with the array of their results. Until one of them is a mutation, the
+    operations share the request's loaders and a query repeated within the
+    batch is executed once. They share the client's cost budget, and
+    ``GRAPHQL_BATCH_MAX_OPERATIONS`` caps the length of a batch.
+
+    Queries of more items of a connection than one page are executed and
+    streamed page by page, see ``products.streaming``. Responses are encoded
+    with orjson when ``GRAPHQL_FAST_JSON`` is enabled (``products.encoding``).
+
+    Requests of clients over their rate are answered 429 before anything is
+    executed, and requests beyond ``GRAPHQL_MAX_CONCURRENT_REQUESTS`` in the
+    process 503 before anything is parsed; see ``products.throttling``. A
+    streamed response holds its request's slot until its last page is sent.
+
+    Query operations read from a replica when there are some, see
+    ``products.replicas``.
+    """
+
+    document_cache = DocumentCache(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 1000))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.documents = {}
+        self.etag = None
+        self.replayed = False
+        self.batch_cost = 0
+        self.batch_results = {}
+        self.wrote = False
+        self.streaming = None
+        self.admitted = False
+        self.replica = replicas.pick()
+
+    def dispatch(self, request, *args, **kwargs):
+        # The base dispatch() without its ensure_csrf_cookie(): the endpoint is
+        # csrf_exempt, and a token would add Set-Cookie and Vary: Cookie to
+        # every response.
+        dispatch = BaseGraphQLView.dispatch.__wrapped__
+        if not throttling.in_flight.enter():
+            return self.overloaded(request)
+        self.admitted = True
+        response = None
+        try:
+            response = dispatch(self, request, *args, **kwargs)
+            if self.streaming is not None:
+                response = self.streaming_response()
+        finally:
+            # The pages of a streamed response are executed as it is sent,
+            # which releases the slot when it ends.
+            if response is None or not response.streaming:
+                self.release()
+        return self.add_headers(response)
+
+    def release(self):
+        """Give back the request's slot of ``GRAPHQL_MAX_CONCURRENT_REQUESTS``, once."""
+        if self.admitted:
+            self.admitted = False
+            throttling.in_flight.leave()
+
+    def streaming_response(self):
+        response = StreamingHttpResponse(self.streaming, content_type="application/json")
+        # Django closes a response once it is sent. stream_pages() releases
+        # the slot when it finishes or is closed, but not if it never started.
+        response._resource_closers.append(self.release)
+        return response
+
+    def add_headers(self, response):
+        if self.etag and response.status_code in (200, 304):
+            response["ETag"] = self.etag
+        if self.replayed:
+            response[idempotency.REPLAYED_HEADER] = "true"
+        return response
+
+    def rejected(self, request, status, message, retry_after):
+        response = HttpResponse(status=status, content_type="application/json")
+        response["Retry-After"] = retry_after
+        response.content = self.json_encode(request, {"errors": [{"message": message}]})
+        return response
+
+    def overloaded(self, request):
+        response = self.rejected(
+            request, 503, "The server is busy.", str(throttling.SHED_RETRY_AFTER)
+        )
+        # Django logs a 5xx as an error, with a report for ADMINS, which would
+        # make shedding cost more than the request it sheds.
+        response._has_been_logged = True
+        return response
+
+    def json_encode(self, request, d, pretty=False):
+        if self.pretty or pretty or request.GET.get("pretty"):
+            return super().json_encode(request, d, pretty)
+        return encoding.dumps(d)
+
+    def parse_body(self, request):
+        data = self.read_body(request)
+        self.throttle(request, data)
+        return data
+
+    def read_body(self, request):
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+        if isinstance(data, list):
+            self.check_batch(data)
+            if any(idempotency.get_key(request, entry) for entry in data):
+                # Before any operation of the batch has run.
+                raise HttpError(HttpResponseBadRequest(
+                    "Idempotency keys are not supported in batches, send the mutation on its own."
+                ))
+            self.batch = True
+        elif not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+        return data
+
+    def throttle(self, request, data):
+        wait = throttling.throttle(request, self.get_operation_types(request, data))
+        if wait:
+            raise self.too_many_requests(request, wait)
+
+    def too_many_requests(self, request, wait):
+        message = "Too many requests."
+        return HttpError(
+            self.rejected(request, 429, message, throttling.retry_after(wait)), message
+        )
+
+    def get_operation_types(self, request, data):
+        """Yield the type of each operation of the request, "query" when it has none."""
+        for entry in data if self.batch else [data]:
+            try:
+                query, _, operation_name, _ = self.get_graphql_params(request, entry)
+                sha256 = self.get_persisted_query_hash(request, entry)
+            except HttpError:
+                yield OperationType.QUERY.value
+                continue
+            operation_ast = None
+            if query or sha256:
+                document, errors = self.get_document(query or None, sha256)
+                if not errors:
+                    operation_ast = get_operation_ast(document, operation_name)
+            yield (operation_ast.operation if operation_ast else OperationType.QUERY).value
+
+    @staticmethod
+    def check_batch(data):
+        if not data:
+            raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+        max_operations = getattr(settings, "GRAPHQL_BATCH_MAX_OPERATIONS", 10)
+        if max_operations is not None and len(data) > max_operations:
+            raise HttpError(HttpResponseBadRequest(
+                f"Batch of {len(data)} operations exceeds the limit of {max_operations}."
+            ))
+        if not all(isinstance(entry, dict) for entry in data):
+            raise HttpError(HttpResponseBadRequest("Every operation of a batch must be a JSON object."))
+
+    def get_document(self, query, sha256):
+        """``DocumentCache.get()`` memoised for the lifetime of this request."""
+        key = (query, sha256)
+        if key not in self.documents:
+            self.documents[key] = self.document_cache.get(
+                self.schema.graphql_schema, query, sha256
+            )
+        return self.documents[key]
+
+    def get_cacheable_document(self, request, data, query):
+        """Document of a request whose response may be cached, or None."""
+        if self.batch:
+            return None
+        sha256 = self.get_persisted_query_hash(request, data)
+        if not query and not sha256:
+            return None
+        document, errors = self.get_document(query or None, sha256)
+        return None if errors else document
+
+    def get_response_cache_key(self, request, data, query, variables, operation_name):
+        document = self.get_cacheable_document(request, data, query)
+        if document is None:
+            return None
+        return caching.response_key(
+            self.schema.graphql_schema, document, variables, operation_name
+        )
+
+    def not_modified(self, request, cache_key):
+        """Set the ``ETag`` of a GET request; whether the client's copy is current."""
+        if request.method.lower() != "get":
+            return False
+        self.etag = caching.etag(cache_key)
+        tags = parse_etags(request.headers.get("If-None-Match", ""))
+        # Weak comparison, as If-None-Match asks for.
+        return "*" in tags or self.etag in {tag.removeprefix("W/") for tag in tags}
+
+    def get_cached_response(self, request, cache_key):
+        """``(result, status_code)`` answered without executing, or None."""
+        if cache_key is None:
+            return None
+        if self.not_modified(request, cache_key):
+            return "", 304
+        cached = caching.get_response(cache_key)
+        if cached is not None:
+            return cached, 200
+        return None
+
+    def get_idempotency_key(self, request, data, query, variables, operation_name):
+        """``(key, fingerprint)`` of a mutation sent with an idempotency key, or None."""
+        key = idempotency.get_key(request, data)
+        if key is None:
+            return None
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            raise HttpError(HttpResponseBadRequest("Idempotency key is too long."))
+        sha256 = self.get_persisted_query_hash(request, data)
+        if not query and not sha256:
+            return None
+        document, errors = self.get_document(query or None, sha256)
+        if errors:
+            return None
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.MUTATION:
+            return None
+        return (
+            idempotency.storage_key(request, key),
+            idempotency.fingerprint(query, sha256, variables, operation_name),
+        )
+
+    def get_idempotent_response(
+        self, request, data, query, variables, operation_name, id, idempotency_key
+    ):
+        def execute():
+            # The synchronous execution, also when called from AsyncGraphQLView.
+            execution_result = GraphQLView.execute_graphql_request(
+                self, request, data, query, variables, operation_name
+            )
+            result, status_code = self.format_response(
+                request, execution_result, id, None, False
+            )
+            return result, status_code, not execution_result.errors
+
+        try:
+            result, status_code, self.replayed = idempotency.execute_once(
+                *idempotency_key, execute
+            )
+        except idempotency.KeyReused as e:
+            raise HttpError(HttpResponse(status=422), str(e))
+        return result, status_code
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        idempotency_key = self.get_idempotency_key(
+            request, data, query, variables, operation_name
+        )
+        if idempotency_key is not None:
+            return self.get_idempotent_response(
+                request, data, query, variables, operation_name, id, idempotency_key
+            )
+
+        stream = self.get_stream(request, data, query, variables, operation_name, show_graphiql)
+        if stream is not None:
+            return self.get_streamed_response(request, data, variables, operation_name, id, stream)
+
+        cache_key = self.get_response_cache_key(
+            request, data, query, variables, operation_name
+        )
+        cached = self.get_cached_response(request, cache_key)
+        if cached is not None:
+            return cached
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(
+            request, execution_result, id, cache_key, show_graphiql
+        )
+
+    def get_stream(self, request, data, query, variables, operation_name, show_graphiql):
+        """``streaming.ConnectionStream`` when the response is streamed, or None."""
+        if self.batch or show_graphiql or self.pretty or request.GET.get("pretty"):
+            return None
+        if not query and not self.get_persisted_query_hash(request, data):
+            return None
+        document, operation_ast, _ = self.get_operation(request, data, query, operation_name)
+        if document is None:
+            return None
+        return streaming.get_stream(self.schema.graphql_schema, document, operation_ast, variables)
+
+    def get_streamed_response(self, request, data, variables, operation_name, id, stream):
+        """Execute the first page; the rest is executed as ``self.streaming`` is sent."""
+        cost = stream.cost(self.get_query_cost(
+            request, stream.page_document(), variables, operation_name
+        ))
+        if cost.errors:
+            result = self.report(ExecutionResult(errors=cost.errors), cost)
+            return self.format_response(request, result, id, None, False)
+        started = time.perf_counter()
+        result = self.execute_page(request, stream, variables, operation_name)
+        if not stream.streamable(result):
+            return self.format_response(request, self.report(result, cost), id, None, False)
+        self.streaming = self.stream_pages(request, stream, result, variables, operation_name, cost, started)
+        return None, 200
+
+    def execute_page(self, request, stream, variables, operation_name):
+        # Rows of the previous page are not kept for the next one.
+        request.loaders = None
+        read_alias = self.get_read_alias(
+            request, stream.document, stream.operation_ast, operation_name
+        )
+        try:
+            with replicas.reading_from(read_alias):
+                options = self.get_execution_options(request, variables, operation_name)
+                return execute(self.schema.graphql_schema, stream.page_document(), **options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def stream_pages(self, request, stream, result, variables, operation_name, cost, started):
+        try:
+            while True:
+                yield stream.add(result)
+                if stream.done:
+                    break
+                result = self.execute_page(request, stream, variables, operation_name)
+            self.observe_duration(stream.operation_ast, started)
+            yield self.end_stream(stream, cost)
+        finally:
+            self.release()
+
+    def end_stream(self, stream, cost):
+        errors = [self.format_error(e) for e in stream.errors]
+        return stream.end(errors, {"cost": cost.as_extension()})
+
+    def format_response(self, request, execution_result, id, cache_key, show_graphiql):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+            if cache_key is not None and not execution_result.errors:
+                caching.set_response(cache_key, result)
+        else:
+            result = None
+
+        return result, status_code
+
+    @staticmethod
+    def get_persisted_query_hash(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted = (extensions or {}).get("persistedQuery") or {}
+        return persisted.get("sha256Hash")
+
+    def get_operation(self, request, data, query, operation_name, show_graphiql=False):
+        """Return ``(document, operation_ast, None)`` for an executable request.
+
+        Requests that must not be executed give ``(None, None, result)`` with
+        the result to respond with instead.
+        """
+        sha256 = self.get_persisted_query_hash(request, data)
+        if not query and not sha256:
+            if show_graphiql:
+                return None, None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        document, errors = self.get_document(query or None, sha256)
+        if errors:
+            return None, None, ExecutionResult(errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if request.method.lower() == "get":
+            if operation_ast and operation_ast.operation != OperationType.QUERY:
+                if show_graphiql:
+                    return None, None, None
+
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request.".format(
+                            operation_ast.operation.value
+                        ),
+                    )
+                )
+        return document, operation_ast, None
+
+    def get_query_cost(self, request, document, variables, operation_name):
+        cost = complexity.query_cost(
+            self.schema.graphql_schema,
+            document,
+            operation_name,
+            variables,
+            complexity.get_budget(request),
+        )
+        if self.batch:
+            # The operations of a batch share one budget.
+            cost = complexity.QueryCost(self.batch_cost + cost.cost, cost.depth, cost.budget)
+            if not cost.errors:
+                self.batch_cost = cost.cost
+        return cost
+
+    def start_operation(self, request, operation_ast):
+        """Drop what the operations of a batch share before and after a mutation."""
+        mutation = operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+        if mutation or self.wrote:
+            request.loaders = None
+            self.batch_results.clear()
+        self.wrote = mutation
+
+    @staticmethod
+    def end_operation(request, operation_ast):
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            replicas.mark_written(request)
+
+    def get_read_alias(self, request, document, operation_ast, operation_name):
+        """Replica to execute a query operation on, or None for the primary."""
+        if not self.may_read_replica(operation_ast) or replicas.wrote_recently(request):
+            return None
+        if caching.written_recently(self.schema.graphql_schema, document, operation_name):
+            return None
+        return self.replica
+
+    def may_read_replica(self, operation_ast):
+        return (
+            self.replica is not None
+            and operation_ast is not None
+            and operation_ast.operation == OperationType.QUERY
+        )
+
+    def batch_result_key(self, document, operation_ast, variables, operation_name):
+        """Key of a query's result for the queries after it in the batch, or None."""
+        if not self.batch or operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None
+        # Documents are memoised for the request, so equal queries share the object.
+        return id(document), operation_name, json.dumps(variables, sort_keys=True, default=str)
+
+    @staticmethod
+    def report(result, cost, tracer=None):
+        """Add the query cost, and the trace when the client asked for it, to ``extensions``."""
+        extensions = {**(result.extensions or {}), "cost": cost.as_extension()}
+        if tracer is not None and tracer.report:
+            extensions["trace"] = tracer.as_extension()
+        result.extensions = extensions
+        return result
+
+    @staticmethod
+    def observe_duration(operation_ast, started):
+        metrics.request_duration.observe(
+            operation_ast.operation.value if operation_ast else "unknown",
+            time.perf_counter() - started,
+        )
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if getattr(request, "tracer", None) is not None:
+            return [*(middleware or []), tracing.TracingMiddleware()]
+        return middleware
+
+    def get_execution_options(self, request, variables, operation_name):
+        return {
+            "root_value": self.get_root_value(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "context_value": self.get_context(request),
+            "middleware": self.get_middleware(request),
+            "execution_context_class": self.execution_context_class,
+        }
+
+    @staticmethod
+    def is_atomic_mutation(operation_ast):
+        return (
+            operation_ast
+            and operation_ast.operation == OperationType.MUTATION
+            and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+            )
+        )
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        document, operation_ast, result = self.get_operation(
+            request, data, query, operation_name, show_graphiql
+        )
+        if document is None:
+            return result
+        result_key = self.batch_result_key(document, operation_ast, variables, operation_name)
+        if result_key in self.batch_results:
+            return self.batch_results[result_key]
+        cost = self.get_query_cost(request, document, variables, operation_name)
+        if cost.errors:
+            return self.report(ExecutionResult(errors=cost.errors), cost)
+        self.start_operation(request, operation_ast)
+        read_alias = self.get_read_alias(request, document, operation_ast, operation_name)
+        started = time.perf_counter()
+        with tracing.trace(request) as tracer, replicas.reading_from(read_alias):
+            try:
+                options = self.get_execution_options(request, variables, operation_name)
+                if self.is_atomic_mutation(operation_ast):
+                    with transaction.atomic():
+                        result = execute(self.schema.graphql_schema, document, **options)
+                        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                            transaction.set_rollback(True)
+                else:
+                    result = execute(self.schema.graphql_schema, document, **options)
+            except Exception as e:
+                return ExecutionResult(errors=[e])
+        self.end_operation(request, operation_ast)
+        self.observe_duration(operation_ast, started)
+        result = self.report(result, cost, tracer)
+        if result_key is not None and not result.errors:
+            self.batch_results[result_key] = result
+        return result
+
+
+class AsyncGraphQLView(GraphQLView):
+    """``GraphQLView`` executing the schema on the event loop under ASGI.
+
+    Root fields and relations are read with the async ORM and sibling
+    relations are batched concurrently by ``DataLoader.aload()``, so a worker
+    interleaves many requests instead of parking a thread on each one.
+    Mutations keep their single ``transaction.atomic()`` block by running in
+    Django's thread-sensitive executor (see ``products.aio.async_safe``), and
+    so does a whole operation when ``ATOMIC_MUTATIONS`` is enabled.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not throttling.in_flight.enter():
+            return self.overloaded(request)
+        self.admitted = True
+        response = None
+        try:
+            response = await self.dispatch_admitted(request)
+        finally:
+            if response is None or not response.streaming:
+                self.release()
+        return response
+
+    async def dispatch_admitted(self, request):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = await self.aparse_body(request)
+            show_graphiql = self.graphiql and self.can_display_graphiql(request, data)
+
+            if show_graphiql:
+                return await sync_to_async(self.render_graphiql)(
+                    request,
+                    whatwg_fetch_version=self.whatwg_fetch_version,
+                    whatwg_fetch_sri=self.whatwg_fetch_sri,
+                    react_version=self.react_version,
+                    react_sri=self.react_sri,
+                    react_dom_sri=self.react_dom_sri,
+                    graphiql_version=self.graphiql_version,
+                    graphiql_sri=self.graphiql_sri,
+                    graphiql_css_sri=self.graphiql_css_sri,
+                    subscriptions_transport_ws_version=self.subscriptions_transport_ws_version,
+                    subscriptions_transport_ws_sri=self.subscriptions_transport_ws_sri,
+                    graphiql_plugin_explorer_version=self.graphiql_plugin_explorer_version,
+                    graphiql_plugin_explorer_sri=self.graphiql_plugin_explorer_sri,
+                    subscription_path=self.subscription_path,
+                    graphiql_header_editor_enabled=graphene_settings.GRAPHIQL_HEADER_EDITOR_ENABLED,
+                    graphiql_should_persist_headers=graphene_settings.GRAPHIQL_SHOULD_PERSIST_HEADERS,
+                )
+
+            if self.batch:
+                responses = [await self.get_response(request, entry) for entry in data]
+                result = "[{}]".format(
+                    ",".join([response[0] for response in responses])
+                )
+                status_code = (
+                    responses
+                    and max(responses, key=lambda response: response[1])[1]
+                    or 200
+                )
+            else:
+                result, status_code = await self.get_response(
+                    request, data, show_graphiql
+                )
+
+            if self.streaming is not None:
+                response = self.streaming_response()
+            else:
+                response = HttpResponse(
+                    status=status_code, content=result, content_type="application/json"
+                )
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+
+        return self.add_headers(response)
+
+    async def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        idempotency_key = self.get_idempotency_key(
+            request, data, query, variables, operation_name
+        )
+        if idempotency_key is not None:
+            return await sync_to_async(self.get_idempotent_response)(
+                request, data, query, variables, operation_name, id, idempotency_key
+            )
+
+        stream = self.get_stream(request, data, query, variables, operation_name, show_graphiql)
+        if stream is not None:
+            return await self.get_streamed_response(
+                request, data, variables, operation_name, id, stream
+            )
+
+        cache_key = await self.aget_response_cache_key(
+            request, data, query, variables, operation_name
+        )
+        cached = await self.aget_cached_response(request, cache_key)
+        if cached is not None:
+            return cached
+
+        execution_result = await self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        result, status_code = self.format_response(
+            request, execution_result, id, None, show_graphiql
+        )
+        if cache_key is not None and execution_result and not execution_result.errors:
+            await caching.aset_response(cache_key, result)
+        return result, status_code
+
+    # The cache is Redis or Memcached in production: the variants below await
+    # it instead of blocking the event loop.
+
+    async def aparse_body(self, request):
+        data = self.read_body(request)
+        wait = await throttling.athrottle(request, self.get_operation_types(request, data))
+        if wait:
+            raise self.too_many_requests(request, wait)
+        return data
+
+    async def aget_response_cache_key(self, request, data, query, variables, operation_name):
+        document = self.get_cacheable_document(request, data, query)
+        if document is None:
+            return None
+        return await caching.aresponse_key(
+            self.schema.graphql_schema, document, variables, operation_name
+        )
+
+    async def aget_cached_response(self, request, cache_key):
+        if cache_key is None:
+            return None
+        if self.not_modified(request, cache_key):
+            return "", 304
+        cached = await caching.aget_response(cache_key)
+        if cached is not None:
+            return cached, 200
+        return None
+
+    async def aget_read_alias(self, request, document, operation_ast, operation_name):
+        if not self.may_read_replica(operation_ast) or await replicas.awrote_recently(request):
+            return None
+        if await caching.awritten_recently(self.schema.graphql_schema, document, operation_name):
+            return None
+        return self.replica
+
+    @staticmethod
+    async def aend_operation(request, operation_ast):
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            await replicas.amark_written(request)
+
+    async def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        document, operation_ast, result = self.get_operation(
+            request, data, query, operation_name, show_graphiql
+        )
+        if document is None:
+            return result
+        if self.is_atomic_mutation(operation_ast):
+            return await sync_to_async(super().execute_graphql_request)(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        result_key = self.batch_result_key(document, operation_ast, variables, operation_name)
+        if result_key in self.batch_results:
+            return self.batch_results[result_key]
+        cost = self.get_query_cost(request, document, variables, operation_name)
+        if cost.errors:
+            return self.report(ExecutionResult(errors=cost.errors), cost)
+        self.start_operation(request, operation_ast)
+        read_alias = await self.aget_read_alias(request, document, operation_ast, operation_name)
+        started = time.perf_counter()
+        async with tracing.atrace(request) as tracer:
+            try:
+                with replicas.reading_from(read_alias):
+                    options = self.get_execution_options(request, variables, operation_name)
+                    result = execute(self.schema.graphql_schema, document, **options)
+                    if inspect.isawaitable(result):
+                        result = await result
+            except Exception as e:
+                return ExecutionResult(errors=[e])
+        await self.aend_operation(request, operation_ast)
+        self.observe_duration(operation_ast, started)
+        result = self.report(result, cost, tracer)
+        if result_key is not None and not result.errors:
+            self.batch_results[result_key] = result
+        return result
+
+    async def get_streamed_response(self, request, data, variables, operation_name, id, stream):
+        cost = stream.cost(self.get_query_cost(
+            request, stream.page_document(), variables, operation_name
+        ))
+        if cost.errors:
+            result = self.report(ExecutionResult(errors=cost.errors), cost)
+            return self.format_response(request, result, id, None, False)
+        started = time.perf_counter()
+        result = await self.execute_page(request, stream, variables, operation_name)
+        if not stream.streamable(result):
+            return self.format_response(request, self.report(result, cost), id, None, False)
+        self.streaming = self.stream_pages(request, stream, result, variables, operation_name, cost, started)
+        return None, 200
+
+    async def execute_page(self, request, stream, variables, operation_name):
+        request.loaders = None
+        read_alias = await self.aget_read_alias(
+            request, stream.document, stream.operation_ast, operation_name
+        )
+        try:
+            with replicas.reading_from(read_alias):
+                options = self.get_execution_options(request, variables, operation_name)
+                result = execute(self.schema.graphql_schema, stream.page_document(), **options)
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    async def stream_pages(self, request, stream, result, variables, operation_name, cost, started):
+        try:
+            while True:
+                yield stream.add(result)
+                if stream.done:
+                    break
+                result = await self.execute_page(request, stream, variables, operation_name)
+            self.observe_duration(stream.operation_ast, started)
+            yield self.end_stream(stream, cost)
+        finally:
+            self.release()
+
+
+def graphql_stats(request):
+    return JsonResponse({"documents": GraphQLView.document_cache.stats()})
+
+
+def prometheus_metrics(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,197 @@
+"""GraphQL subscriptions over WebSockets, as a plain ASGI application.
+
+Speaks the ``graphql-transport-ws`` protocol used by graphql-ws and Apollo
+Client: ``connection_init`` / ``connection_ack``, ``subscribe`` / ``next`` /
+``error`` / ``complete`` and ``ping`` / ``pong``. Documents come from the
+same ``DocumentCache`` as the HTTP view. Only subscription operations are
+accepted; queries and mutations belong on the HTTP endpoint, where they get
+the response cache and transactions.
+
+Every event re-resolves the selections of every subscription listening to
+it, so subscriptions are held to the client's cost budget like queries
+(``products.complexity``; the ``X-Api-Key`` comes from the
+``connection_init`` payload or the request headers), and a connection runs
+at most ``settings.GRAPHQL_SUBSCRIPTION_MAX_OPERATIONS`` of them at once.
+
+Mounted by ``server/asgi.py`` for WebSocket connections to ``/graphql/``.
+"""
+import asyncio
+import json
+
+from django.conf import settings
+from graphql import ExecutionResult, GraphQLError, OperationType, get_operation_ast, subscribe
+
+from . import complexity
+from .views import GraphQLView
+
+SUBPROTOCOL = 'graphql-transport-ws'
+
+
+class SubscriptionContext:
+    """``info.context`` of one subscription; resolvers only need ``loaders``."""
+
+    def __init__(self, scope, connection_params):
+        self.scope = scope
+        self.connection_params = connection_params
+        self.loaders = None
+
+
+class CloseConnection(Exception):
+    def __init__(self, code, reason):
+        self.code = code
+        self.reason = reason
+
+
+class GraphQLWebSocketApp:
+    def __init__(self, schema, path='/graphql/', connection_init_timeout=10):
+        self.schema = schema
+        self.path = path
+        self.connection_init_timeout = connection_init_timeout
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if scope['path'] != self.path or SUBPROTOCOL not in scope.get('subprotocols', ()):
+            await send({'type': 'websocket.close', 'code': 4400})
+            return
+        await send({'type': 'websocket.accept', 'subprotocol': SUBPROTOCOL})
+        await Connection(self, scope, receive, send).run()
+
+
+class Connection:
+    def __init__(self, app, scope, receive, send):
+        self.app = app
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self.connection_params = None
+        self.operations = {}
+
+    async def send(self, message):
+        await self._send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def run(self):
+        init_timeout = asyncio.get_running_loop().call_later(
+            self.app.connection_init_timeout, self.init_timed_out,
+        )
+        self.closed = asyncio.Event()
+        try:
+            while True:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message['type'] != 'websocket.receive':
+                    continue
+                try:
+                    await self.handle(message.get('text') or message.get('bytes'))
+                except CloseConnection as e:
+                    await self._send({'type': 'websocket.close', 'code': e.code, 'reason': e.reason})
+                    break
+                if self.connection_params is not None:
+                    init_timeout.cancel()
+                if self.closed.is_set():
+                    break
+        finally:
+            init_timeout.cancel()
+            for task in self.operations.values():
+                task.cancel()
+            await asyncio.gather(*self.operations.values(), return_exceptions=True)
+
+    def init_timed_out(self):
+        if self.connection_params is None:
+            asyncio.ensure_future(self._send({
+                'type': 'websocket.close', 'code': 4408, 'reason': 'Connection initialisation timeout',
+            }))
+            self.closed.set()
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text)
+            kind = message['type']
+        except (TypeError, ValueError, KeyError):
+            raise CloseConnection(4400, 'Invalid message')
+        if kind == 'connection_init':
+            if self.connection_params is not None:
+                raise CloseConnection(4429, 'Too many initialisation requests')
+            self.connection_params = message.get('payload') or {}
+            await self.send({'type': 'connection_ack'})
+        elif kind == 'ping':
+            await self.send({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif kind == 'subscribe':
+            if self.connection_params is None:
+                raise CloseConnection(4401, 'Unauthorized')
+            id = message.get('id')
+            if id in self.operations:
+                raise CloseConnection(4409, f'Subscriber for {id} already exists')
+            max_operations = getattr(settings, 'GRAPHQL_SUBSCRIPTION_MAX_OPERATIONS', 10)
+            if max_operations is not None and len(self.operations) >= max_operations:
+                error = GraphQLError(
+                    f'A connection may run at most {max_operations} subscriptions at once.',
+                    extensions={'code': 'TOO_MANY_SUBSCRIPTIONS'},
+                )
+                await self.send({'type': 'error', 'id': id, 'payload': [error.formatted]})
+                return
+            self.operations[id] = asyncio.ensure_future(self.run_operation(id, message.get('payload') or {}))
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            raise CloseConnection(4400, f'Unknown message type {kind!r}')
+
+    def get_api_key(self):
+        """``X-Api-Key`` of the ``connection_init`` payload, or else of the request headers."""
+        if isinstance(self.connection_params, dict) and self.connection_params.get(complexity.API_KEY_HEADER):
+            return str(self.connection_params[complexity.API_KEY_HEADER])
+        for name, value in self.scope.get('headers', ()):
+            if name.decode('latin-1').lower() == complexity.API_KEY_HEADER.lower():
+                return value.decode('latin-1')
+        return None
+
+    async def run_operation(self, id, payload):
+        try:
+            stream = await self.subscribe(payload)
+            if isinstance(stream, ExecutionResult):
+                await self.send({'type': 'error', 'id': id, 'payload': stream.formatted['errors']})
+                return
+            try:
+                async for result in stream:
+                    await self.send({'type': 'next', 'id': id, 'payload': result.formatted})
+            finally:
+                await stream.aclose()
+            await self.send({'type': 'complete', 'id': id})
+        finally:
+            if self.operations.get(id) is asyncio.current_task():
+                del self.operations[id]
+
+    async def subscribe(self, payload):
+        schema = self.app.schema.graphql_schema
+        query = payload.get('query')
+        if not isinstance(query, str):
+            return ExecutionResult(errors=[GraphQLError('Must provide query string.')])
+        document, errors = GraphQLView.document_cache.get(schema, query)
+        if errors:
+            return ExecutionResult(errors=errors)
+        operation_name = payload.get('operationName')
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            return ExecutionResult(errors=[GraphQLError(
+                'Only subscription operations are served over WebSocket, use HTTP for queries and mutations.'
+            )])
+        variables = payload.get('variables')
+        if variables is not None and not isinstance(variables, dict):
+            return ExecutionResult(errors=[GraphQLError('Variables must be an object.')])
+        budget = complexity.get_budget_for(self.get_api_key())
+        cost = complexity.query_cost(schema, document, operation_name, variables, budget)
+        if cost.errors:
+            return ExecutionResult(errors=cost.errors)
+        return await subscribe(
+            schema,
+            document,
+            context_value=SubscriptionContext(self.scope, self.connection_params),
+            variable_values=variables,
+            operation_name=operation_name,
+        )
@@ -0,0 +1,86 @@
+"""Order status transitions.
+
+``TRANSITIONS`` is the only way an order may move through
+``Order.STATUS_CHOICES``. ``change_status()`` applies one transition to any
+number of orders: it claims each transition with a conditional ``UPDATE``,
+moves stock through ``stock.change_status()`` and appends every change to the
+``OrderStatusChange`` log with a single ``bulk_create()``. ``post_save`` is
+sent for every order moved, with ``update_fields``.
+"""
+from collections import defaultdict
+
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from . import stock
+from .models import Order, OrderStatusChange
+
+# Translated status names, as shown to customers.
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+TRANSITIONS = {
+    'pending': frozenset({'accepted', 'canceled'}),
+    'accepted': frozenset({'prepare', 'canceled'}),
+    'prepare': frozenset({'created', 'canceled'}),
+    'created': frozenset({'delivery', 'completed', 'canceled'}),
+    'delivery': frozenset({'completed', 'canceled'}),
+    'completed': frozenset({'refunded'}),
+    # A canceled order can be reopened, which reserves its stock again.
+    'canceled': frozenset({'pending'}),
+    'refunded': frozenset(),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+class ConcurrentTransition(Exception):
+    def __init__(self):
+        super().__init__('Order status was changed concurrently, please retry.')
+
+
+def check_transition(from_status, to_status):
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown order status "{to_status}".')
+    if to_status not in TRANSITIONS[from_status]:
+        raise InvalidTransition(f'Cannot change order status from "{from_status}" to "{to_status}".')
+
+
+def change_status(orders, status):
+    """Move ``orders`` (already loaded) to ``status`` and update them in place.
+
+    Orders already in ``status`` are skipped. Raises ``InvalidTransition``
+    before writing anything, ``stock.InsufficientStock`` when reopening needs
+    stock that is gone and ``ConcurrentTransition`` when another request moved
+    one of the orders first. Must be called inside ``transaction.atomic()``.
+    """
+    orders = [order for order in orders if order.status != status]
+    by_status = defaultdict(list)
+    for order in orders:
+        check_transition(order.status, status)
+        by_status[order.status].append(order)
+    now = timezone.now()
+    for from_status, group in by_status.items():
+        # Claiming with the old status in the WHERE clause means two
+        # concurrent updates cannot both release (or reserve) the same stock.
+        claimed = Order.objects.filter(pk__in=[order.pk for order in group], status=from_status).update(
+            status=status, update_date=now,
+        )
+        if claimed != len(group):
+            raise ConcurrentTransition()
+    for order in orders:
+        stock.change_status(order, status)
+    OrderStatusChange.objects.bulk_create(
+        OrderStatusChange(order=order, from_status=order.status, to_status=status) for order in orders
+    )
+    for order in orders:
+        order.status = status
+        order.update_date = now
+        # The claim above is a queryset update; let receivers such as the
+        # subscription events see it like any other save of these fields.
+        post_save.send(
+            sender=Order, instance=order, created=False, raw=False,
+            using=order._state.db, update_fields=frozenset({'status', 'update_date'}),
+        )
+    return orders
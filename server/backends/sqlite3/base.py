@@ -0,0 +1,42 @@
+"""SQLite backend with the ``init_command`` and ``transaction_mode`` options of Django 5.1.
+
+``init_command`` is a ``;``-separated list of statements (typically PRAGMAs)
+run on every new connection. ``transaction_mode`` is the ``BEGIN`` variant of
+``transaction.atomic()``; ``"IMMEDIATE"`` takes the write lock up front so
+concurrent writers wait for ``busy_timeout`` instead of failing with
+"database is locked" when a read transaction upgrades to a write.
+
+Drop this backend for ``django.db.backends.sqlite3`` when upgrading to 5.1.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ("DEFERRED", "EXCLUSIVE", "IMMEDIATE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        transaction_mode = kwargs.pop("transaction_mode", None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES[{self.alias!r}]['OPTIONS']['transaction_mode'] "
+                f"is improperly configured to '{transaction_mode}'. Use one of "
+                f"{', '.join(repr(mode) for mode in TRANSACTION_MODES)}, or None."
+            )
+        self.transaction_mode = transaction_mode.upper() if transaction_mode else None
+        self.init_commands = kwargs.pop("init_command", "").split(";")
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for init_command in self.init_commands:
+            if init_command := init_command.strip():
+                conn.execute(init_command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute("BEGIN")
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
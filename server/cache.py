@@ -0,0 +1,27 @@
+"""Build ``CACHES["default"]`` of the production profile from ``CACHE_URL``.
+
+``redis://[:password@]host[:port][/db]`` (or ``rediss://``) uses Django's
+``RedisCache`` and requires redis-py; ``memcached://host[:port]`` uses
+``PyMemcacheCache`` and requires pymemcache. Several servers are separated
+by commas; for Redis the first one takes the writes.
+"""
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+}
+
+
+def cache_config(url):
+    locations = [location.strip() for location in url.split(",") if location.strip()]
+    schemes = {urlsplit(location).scheme for location in locations}
+    if len(schemes) != 1 or not schemes <= set(BACKENDS):
+        raise ValueError(
+            f"CACHE_URL must be {', '.join(f'{scheme}://' for scheme in BACKENDS)} URLs, not {url!r}."
+        )
+    scheme = schemes.pop()
+    if scheme == "memcached":
+        locations = [urlsplit(location).netloc for location in locations]
+    return {"BACKEND": BACKENDS[scheme], "LOCATION": locations}
@@ -0,0 +1,99 @@
+"""Build ``DATABASES["default"]`` from environment variables.
+
+``DATABASE_ENGINE`` picks the profile:
+
+``sqlite`` (default)
+    ``DATABASE_NAME`` is the file (``db.sqlite3`` in the project). Every
+    connection switches to WAL with ``synchronous=NORMAL`` and sets
+    ``busy_timeout`` and ``mmap_size`` (``SQLITE_JOURNAL_MODE``,
+    ``SQLITE_SYNCHRONOUS``, ``SQLITE_BUSY_TIMEOUT`` in ms, ``SQLITE_MMAP_SIZE``
+    in bytes); transactions start with ``BEGIN IMMEDIATE``
+    (``SQLITE_TRANSACTION_MODE``) so writers queue instead of deadlocking.
+
+``postgresql``
+    ``DATABASE_NAME``, ``DATABASE_USER``, ``DATABASE_PASSWORD``,
+    ``DATABASE_HOST`` and ``DATABASE_PORT``; requires psycopg. Connections
+    persist for ``DATABASE_CONN_MAX_AGE`` seconds per worker; set
+    ``DATABASE_POOLER=pgbouncer`` when connecting through PgBouncer in
+    transaction pooling mode, which cannot hold server-side cursors.
+
+Both honour ``DATABASE_CONN_MAX_AGE`` (seconds, ``none`` for unlimited) and
+``DATABASE_CONN_HEALTH_CHECKS``.
+
+``DATABASE_REPLICAS`` lists read replicas of that database, separated by
+commas: SQLite files, or PostgreSQL ``host[:port]`` reached with the same
+credentials. ``replica_configs()`` gives them the aliases ``replica_1``,
+``replica_2``, ...; they mirror ``default`` in tests.
+"""
+import copy
+import os
+
+ENGINES = {
+    "sqlite": "server.backends.sqlite3",
+    "postgresql": "django.db.backends.postgresql",
+}
+
+
+def _flag(value):
+    return value.lower() not in ("", "0", "false", "no", "off")
+
+
+def _conn_max_age(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def database_config(base_dir, environ=os.environ):
+    engine = environ.get("DATABASE_ENGINE", "sqlite")
+    if engine not in ENGINES:
+        raise ValueError(
+            f"DATABASE_ENGINE must be one of {', '.join(ENGINES)}, not {engine!r}."
+        )
+    config = {
+        "ENGINE": ENGINES[engine],
+        "CONN_MAX_AGE": _conn_max_age(environ.get("DATABASE_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": _flag(environ.get("DATABASE_CONN_HEALTH_CHECKS", "1")),
+    }
+    if engine == "sqlite":
+        config["NAME"] = environ.get("DATABASE_NAME") or base_dir / "db.sqlite3"
+        config["OPTIONS"] = sqlite_options(environ)
+    else:
+        config.update(
+            NAME=environ.get("DATABASE_NAME", "server"),
+            USER=environ.get("DATABASE_USER", ""),
+            PASSWORD=environ.get("DATABASE_PASSWORD", ""),
+            HOST=environ.get("DATABASE_HOST", ""),
+            PORT=environ.get("DATABASE_PORT", ""),
+            DISABLE_SERVER_SIDE_CURSORS=environ.get("DATABASE_POOLER") == "pgbouncer",
+        )
+    return config
+
+
+def replica_configs(base_dir, environ=os.environ):
+    primary = database_config(base_dir, environ)
+    names = [name.strip() for name in environ.get("DATABASE_REPLICAS", "").split(",") if name.strip()]
+    replicas = {}
+    for i, name in enumerate(names, 1):
+        config = copy.deepcopy(primary)
+        if config["ENGINE"] == ENGINES["sqlite"]:
+            config["NAME"] = name
+        else:
+            config["HOST"], _, port = name.partition(":")
+            config["PORT"] = port or config["PORT"]
+        config["TEST"] = {"MIRROR": "default"}
+        replicas[f"replica_{i}"] = config
+    return replicas
+
+
+def sqlite_options(environ=os.environ):
+    pragmas = {
+        "journal_mode": environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(environ.get("SQLITE_BUSY_TIMEOUT", "5000")),
+        "mmap_size": int(environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    }
+    return {
+        # sqlite3.connect() waits as long as the busy_timeout PRAGMA would.
+        "timeout": pragmas["busy_timeout"] / 1000,
+        "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in pragmas.items()),
+        "transaction_mode": environ.get("SQLITE_TRANSACTION_MODE", "IMMEDIATE") or None,
+    }
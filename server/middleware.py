@@ -0,0 +1,162 @@
+"""Middleware of the pages served to browsers, skipped for API paths.
+
+Requests to the paths starting with one of ``settings.API_PATH_PREFIXES``
+come from programs: they carry no session cookie, nothing there reads
+``request.user`` or messages, the GraphQL view is ``csrf_exempt`` and its
+JSON cannot be framed. The classes below are the Django middleware of the
+same names, passing those requests straight on; the admin keeps the full
+stack. They subclass Django's so that the admin's system checks still find
+them in ``MIDDLEWARE``.
+
+Their JSON responses, and only those, are compressed by ``CompressionMiddleware``.
+``WhiteNoiseMiddleware`` of the production profile is WhiteNoise's, made
+async-capable.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, csrf
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from whitenoise import middleware as whitenoise
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+# Brotli's default of 11 is meant for static files; at 5 it compresses
+# responses about as fast as gzip and smaller.
+BROTLI_QUALITY = 5
+
+
+def is_api_request(request):
+    return request.path_info.startswith(tuple(getattr(settings, "API_PATH_PREFIXES", ())))
+
+
+class SiteOnlyMixin:
+    def __call__(self, request):
+        if is_api_request(request):
+            # A coroutine under ASGI, awaited by the handler like super()'s.
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(SiteOnlyMixin, sessions.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(SiteOnlyMixin, csrf.CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(SiteOnlyMixin, auth.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(SiteOnlyMixin, messages.MessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(SiteOnlyMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
+
+
+class WhiteNoiseMiddleware(whitenoise.WhiteNoiseMiddleware):
+    """WhiteNoise's middleware, which is sync-only, made async-capable.
+
+    Under ASGI Django runs a sync-only middleware in a thread and the rest of
+    the chain through ``async_to_sync``, where the resolvers of the async
+    GraphQL view, which run in that same thread, deadlock. Here only the
+    static files go to a thread.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli or gzip, as the client accepts, for the JSON responses of API paths.
+
+    Brotli needs the brotli package, without which responses are gzipped.
+    Everything else is left alone: pages, the admin's and GraphiQL's HTML,
+    carry CSRF tokens or echo the request, which compression would expose
+    (BREACH), and WhiteNoise serves static files compressed ahead of time.
+    """
+
+    def process_response(self, request, response):
+        if not is_api_request(request) or not is_json(response):
+            return response
+        if brotli is None or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return super().process_response(request, response)
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = abrotli_sequence(response.streaming_content)
+            else:
+                response.streaming_content = brotli_sequence(response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+def is_json(response):
+    return response.get("Content-Type", "").partition(";")[0].strip().lower() == "application/json"
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def abrotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    async for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
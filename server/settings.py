@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 
+from .database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,20 +48,122 @@ GRAPHENE = {
     "SCHEMA": "products.schema.schema"
 }
 
+# Parsed and validated GraphQL documents kept per worker process.
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+
+# Cache alias for catalog query responses (None disables it) and their lifetime.
+GRAPHQL_RESPONSE_CACHE_ALIAS = "default"
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = 300
+
+# Largest cost and depth of an operation (see products/complexity.py) and the
+# assumed length of lists that take no "first" argument.
+GRAPHQL_QUERY_COST = {
+    "MAX_COST": 5000,
+    "MAX_DEPTH": 10,
+    "LIST_SIZE": 10,
+}
+# Overrides of GRAPHQL_QUERY_COST per client, keyed by the X-Api-Key header.
+GRAPHQL_CLIENT_BUDGETS = {}
+
+# Request header asking for a resolver trace in the response extensions (None
+# disables it) and the share of other operations traced for /metrics.
+GRAPHQL_TRACE_HEADER = "X-GraphQL-Trace"
+GRAPHQL_TRACE_SAMPLE_RATE = 0.01
+
+# Most operations accepted in one batched request (a JSON array of operations).
+GRAPHQL_BATCH_MAX_OPERATIONS = 10
+
+# Encode GraphQL responses with orjson (when installed) instead of json.
+GRAPHQL_FAST_JSON = False
+# Queries of more items of one connection than GRAPHQL_STREAM_PAGE_SIZE are
+# executed and streamed page by page, up to GRAPHQL_STREAM_MAX_ITEMS items
+# (see products/streaming.py); None disables streaming.
+GRAPHQL_STREAM_PAGE_SIZE = None
+GRAPHQL_STREAM_MAX_ITEMS = 100_000
+
+# Token buckets per client (see products/throttling.py): RATE tokens a second
+# (None disables rate limiting) up to BURST, WEIGHTS tokens per operation by
+# type, limits of the API keys in CLIENTS, and the header in which a proxy
+# in front appends the client's address.
+GRAPHQL_RATE_LIMIT = {
+    "RATE": None,
+    "BURST": 60,
+    "WEIGHTS": {"query": 1, "mutation": 5, "subscription": 1},
+    "CLIENTS": {},
+    "CLIENT_IP_HEADER": None,
+}
+# Where the buckets are kept; products.throttling.CacheStore shares them
+# between processes through a cache alias.
+GRAPHQL_RATE_LIMIT_STORE = {
+    "BACKEND": "products.throttling.InProcessStore",
+    "MAX_CLIENTS": 100_000,
+}
+# GraphQL requests a process executes at once before answering 503 (None for
+# no limit); only ASGI and threaded workers run several.
+GRAPHQL_MAX_CONCURRENT_REQUESTS = None
+
+# Request header carrying the idempotency key of a mutation (None disables it)
+# and how long keys and their responses are kept, in seconds.
+GRAPHQL_IDEMPOTENCY_HEADER = "Idempotency-Key"
+GRAPHQL_IDEMPOTENCY_TTL = 24 * 3600
+
+# Serve /graphql/ with the async view under ASGI, which WebSocket subscriptions
+# also need: the web process of the Procfile then runs uvicorn workers instead
+# of WSGI ones.
+GRAPHQL_ASYNC = os.environ.get("GRAPHQL_ASYNC", "") not in ("", "0", "false")
+
+# Pub/sub behind GraphQL subscriptions. The in-process broker only reaches
+# WebSocket clients of the process that wrote the order; point BACKEND at an
+# external broker when several processes serve the site.
+GRAPHQL_SUBSCRIPTION_BROKER = {
+    "BACKEND": "products.pubsub.InProcessBroker",
+    "QUEUE_SIZE": 1000,
+}
+# Subscriptions one WebSocket connection may run at once (None for no limit);
+# each is also held to the client's GRAPHQL_QUERY_COST budget.
+GRAPHQL_SUBSCRIPTION_MAX_OPERATIONS = 10
+
+# Background jobs (products/jobs.py): worker processes of run_workers, attempts
+# per job, retry backoff base and cap, worker lease and idle poll in seconds.
+JOBS = {
+    "CONCURRENCY": int(os.environ.get("JOB_CONCURRENCY", "2")),
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF": 2,
+    "MAX_BACKOFF": 600,
+    "LEASE": 300,
+    "POLL_INTERVAL": 1,
+}
+# Dotted paths to the callables receiving stock levels and order events from
+# the background jobs (products/tasks.py); None skips those jobs.
+STOCK_SYNC_BACKEND = None
+ANALYTICS_BACKEND = None
+
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "shop@localhost")
+
+# Dotted paths to the callables that number new orders.
+ORDER_NUMBER_GENERATOR = "products.numbering.uuid7"
+RECEIPT_NUMBER_GENERATOR = "products.numbering.random_receipt_number"
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173','https://develop--lustrous-seahorse-3ffd01.netlify.app'
 ]
 
+# The server.middleware classes are Django's, skipped for API_PATH_PREFIXES
+# (see server/middleware.py): only the admin needs sessions, CSRF and the rest.
+# Responses of API paths are compressed with brotli or gzip.
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "server.middleware.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "server.middleware.SessionMiddleware",
+    "server.middleware.CsrfViewMiddleware",
+    "server.middleware.AuthenticationMiddleware",
+    "server.middleware.MessageMiddleware",
+    "server.middleware.XFrameOptionsMiddleware",
 ]
+API_PATH_PREFIXES = ("/graphql/", "/metrics")
 
 ROOT_URLCONF = "server.urls"
 
@@ -84,11 +188,30 @@ WSGI_APPLICATION = "server.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Configured from DATABASE_* and SQLITE_* environment variables, see server/database.py.
 
 DATABASES = {
+    "default": database_config(BASE_DIR),
+    **replica_configs(BASE_DIR),
+}
+
+# GraphQL queries read from a replica when there are some, everything else
+# uses the primary (see products/replicas.py). Replicas are assumed to lag
+# DATABASE_REPLICA_LAG seconds behind at most: a client's queries read from
+# the primary for that long after its mutations.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_REPLICA_LAG = 5
+DATABASE_ROUTERS = ["products.replicas.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Point "default" at a shared backend (Redis, Memcached) when running several
+# workers; the production profile reads it from CACHE_URL.
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
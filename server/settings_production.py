@@ -0,0 +1,64 @@
+"""
+Production profile of the settings: ``DJANGO_SETTINGS_MODULE=server.settings_production``.
+
+Everything of ``server.settings`` with debugging off: with ``DEBUG = True``
+graphene-django adds its ``DjangoDebugMiddleware``, which records the SQL of
+every query and grows workers by about 0.7 KB per request, Django renders
+errors with tracebacks and templates are re-read on every render. ``DJANGO_SECRET_KEY`` is required,
+and so is ``DJANGO_ALLOWED_HOSTS``, a comma-separated list of host names.
+
+``CACHE_URL`` points the cache at Redis or Memcached (see
+``server/cache.py``), which every process shares. Without it, the response
+cache is off: a write in one process would not reach the versions of the
+catalog responses cached by the others. Read replicas need it too, for
+clients to read their own writes on every worker.
+
+Static files of the admin are served by WhiteNoise from ``STATIC_ROOT``
+(``manage.py collectstatic``, see Procfile) with hashed names, compressed
+copies and far-future cache headers, so browsers fetch each file once.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .cache import cache_config
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASE_REPLICAS, GRAPHQL_RATE_LIMIT, MIDDLEWARE
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ["DJANGO_ALLOWED_HOSTS"].split(",") if host.strip()]
+
+GRAPHQL_FAST_JSON = True
+
+if os.environ.get("CACHE_URL"):
+    CACHES = {"default": cache_config(os.environ["CACHE_URL"])}
+    GRAPHQL_RATE_LIMIT_STORE = {"BACKEND": "products.throttling.CacheStore"}
+elif DATABASE_REPLICAS:
+    raise ImproperlyConfigured("DATABASE_REPLICAS requires a shared cache, set CACHE_URL.")
+else:
+    GRAPHQL_RESPONSE_CACHE_ALIAS = None
+
+# Per client, and per worker process without CACHE_URL. The router in front
+# appends the client's address to X-Forwarded-For.
+GRAPHQL_RATE_LIMIT = {**GRAPHQL_RATE_LIMIT, "RATE": 10, "CLIENT_IP_HEADER": "X-Forwarded-For"}
+GRAPHQL_MAX_CONCURRENT_REQUESTS = 50
+
+# Right after SecurityMiddleware: static files skip everything else.
+MIDDLEWARE = [MIDDLEWARE[0], "server.middleware.WhiteNoiseMiddleware", *MIDDLEWARE[1:]]
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# The checks look for Django's own CSRF and clickjacking middleware by name;
+# server.middleware subclasses them.
+SILENCED_SYSTEM_CHECKS = ["security.W002", "security.W003"]
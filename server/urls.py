@@ -17,8 +17,11 @@ Including another URLconf
 from django.urls import include, path
 from django.contrib import admin
 
+from products.views import prometheus_metrics
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", prometheus_metrics),
     path('', include('products.urls')),
 ]